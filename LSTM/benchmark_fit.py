@@ -0,0 +1,135 @@
+# QWLSTMModel.fit 训练速度对比：基线提交（49192f0）中的训练循环、当前的逐步同步循环与 fast 模式，
+# 三者使用同一个随机森林的权重（基线为稠密权重矩阵，当前两种为等价的叶子编号矩阵），按线程数（1、4、16，不超过 CPU 核数）分别计时
+import os
+import time
+import numpy as np
+import torch
+from quantile_forest import RandomForestQuantileRegressor
+from common.QWLSTMModel import LSTMModel, QWLSTMModel, get_rfweight
+
+n = 3000  # 与训练集规模相当的模拟数据
+step = 30
+features = 5
+n_iter = 300
+batch_size = 100
+hidden_size = 16
+num_layers = 2
+
+
+def baseline_fit(model, x, y, weight, tau=0.5, batch_size=100, n_iter=500, tol=1e-5):
+    """基线提交中 QWLSTMModel.fit 的训练循环，除去打印外原样保留：每步从稠密权重矩阵中取出 batch 子块"""
+    x, y = x.to(model.device), y.to(model.device)
+
+    n = x.shape[0]
+    input_size = x.shape[2]
+
+    model.fnet = LSTMModel(
+        input_size=input_size,
+        hidden_size=model.hs,
+        num_layers=model.num_layers,
+        output_size=1,
+        dropout=model.dropout,
+    ).to(model.device)
+    optimizer = torch.optim.Adam(
+        [
+            {"params": model.fnet.parameters()},
+        ],
+        lr=1e-3,
+    )
+
+    model.loss_count = []
+    last_loss = np.inf
+
+    for i_iter in range(n_iter):
+
+        csample = np.random.permutation(n)[:batch_size]
+        tmp_x = x[csample].to(model.device)
+        tmp_y = y[csample].to(model.device)
+        tmp_w = (
+            torch.Tensor(weight[
+                np.tile(csample, (batch_size, 1)).T.ravel(),
+                np.tile(csample, (1, batch_size)),
+            ]
+            .reshape(batch_size, -1)
+            .T).to(model.device)
+        )
+        tmp_w = tmp_w if tau is None else tmp_w - torch.diag(torch.diag(tmp_w))
+        tmp_fx = model.fnet(tmp_x)
+
+        if tau is None:
+            loss = model.quantile_loss(tmp_y, tmp_fx.ravel(), model.q).mean()
+        else:
+            loss1 = model.quantile_loss(tmp_y, tmp_fx.ravel(), model.q).mean()
+            loss2 = (
+                torch.mean(
+                    model.quantile_loss(tmp_y, tmp_fx.ravel(), model.q) * tmp_w.T
+                )
+                * n
+                / (n - 1)
+            )
+            loss = tau * loss1 + (1 - tau) * loss2
+
+        model.loss_count.append(loss.data.cpu().tolist())
+
+        if (np.abs(last_loss - loss.data.cpu().numpy()) <= tol) & (i_iter >= 100):
+            break
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+        last_loss = loss.data.cpu().numpy()
+
+
+def iters_per_second(mode: str, x, y, weight, leaf):
+    """训练 n_iter 步（tol=0，不提前收敛）的速度
+
+    Args:
+        mode (str): "baseline"、"loop"（当前的逐步同步循环）或 "fast"
+
+    Returns:
+        float: 每秒迭代次数
+    """
+    torch.manual_seed(0)
+    np.random.seed(0)
+    model = QWLSTMModel(hs=hidden_size, num_layers=num_layers, device="cpu")
+
+    start = time.perf_counter()
+    if mode == "baseline":
+        baseline_fit(model, x, y, weight, tau=0.5, batch_size=batch_size, n_iter=n_iter, tol=0)
+    else:
+        model.fit(
+            x,
+            y,
+            leaf=leaf,
+            tau=0.5,
+            batch_size=batch_size,
+            n_iter=n_iter,
+            tol=0,
+            verbose=False,
+            fast=mode == "fast",
+            seed=0,
+        )
+
+    return n_iter / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    x = torch.tensor(rng.standard_normal((n, step, features)), dtype=torch.float32)
+    y = torch.tensor(rng.standard_normal(n), dtype=torch.float32)
+
+    flat = x.reshape(n, -1).numpy()
+    rf = RandomForestQuantileRegressor(n_estimators=50, max_depth=8, random_state=0).fit(flat, y.numpy())
+    leaf = rf.apply(flat)
+    weight, _ = get_rfweight(rf, flat, dense=True)  # 基线使用的稠密权重矩阵
+
+    print(f"cpu count: {os.cpu_count()}, default torch threads: {torch.get_num_threads()}")
+    print(f"{'threads':>8} | {'baseline (it/s)':>16} | {'loop (it/s)':>12} | {'fast (it/s)':>12} | {'speedup':>8}")
+    # 线程数超过 CPU 核数时计时没有意义，只测可用的线程数
+    for n_threads in sorted(t for t in {1, 4, 16, torch.get_num_threads()} if t <= (os.cpu_count() or 1)):
+        torch.set_num_threads(n_threads)
+        baseline, loop, fast = (iters_per_second(mode, x, y, weight, leaf) for mode in ("baseline", "loop", "fast"))
+        print(
+            f"{torch.get_num_threads():>8} | {baseline:>16.1f} | {loop:>12.1f} | {fast:>12.1f} | {fast / baseline:>7.2f}x"
+        )
@@ -0,0 +1,77 @@
+# 面板训练与逐资产训练的吞吐量对比：K 个资产各训练一个 QWLSTMModel，与一个带资产嵌入的模型在混合 batch 上训练
+# 两种方式处理的样本数相同：面板模型的迭代次数按 batch 大小折算为 K * n_iter * batch_size / panel_batch
+import time
+import numpy as np
+import torch
+from common.QWLSTMModel import QWLSTMModel
+
+n_per_asset = 1000  # 每个资产的训练样本数
+step = 30
+features = 5
+n_iter = 200
+batch_size = 100
+hidden_size = 16
+num_layers = 2
+panel_batches = (100, 400, 1600)  # 面板模型的 batch 大小
+
+
+def fit_seconds(x, y, sample_weight, batch_size, n_iter, n_assets=None):
+    """训练 n_iter 步（tol=0，不提前收敛）的耗时
+
+    Returns:
+        float: 秒
+    """
+    torch.manual_seed(0)
+    np.random.seed(0)
+    model = QWLSTMModel(hs=hidden_size, num_layers=num_layers, device="cpu", n_assets=n_assets)
+
+    start = time.perf_counter()
+    model.fit(
+        x,
+        y,
+        sample_weight=sample_weight,
+        tau=0.5,
+        batch_size=batch_size,
+        n_iter=n_iter,
+        tol=0,
+        verbose=False,
+        fast=True,
+        seed=0,
+    )
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    torch.set_num_threads(1)
+
+    header = " | ".join(f"{f'panel b={b} (s)':>17}" for b in panel_batches)
+    print(f"{'assets':>6} | {'per-asset (s)':>13} | {header} | {'best speedup':>12}")
+    for n_assets in (4, 16, 64):
+        x = rng.standard_normal((n_assets, n_per_asset, step, features)).astype(np.float32)
+        y = rng.standard_normal((n_assets, n_per_asset)).astype(np.float32)
+        sample_weight = rng.uniform(0, 5, (n_assets, n_per_asset))
+
+        per_asset = sum(
+            fit_seconds(torch.from_numpy(x[a]), torch.from_numpy(y[a]), sample_weight[a], batch_size, n_iter)
+            for a in range(n_assets)
+        )
+
+        # 面板输入：最后一个特征为资产编号
+        ids = np.broadcast_to(np.arange(n_assets, dtype=np.float32)[:, None, None, None], (n_assets, n_per_asset, step, 1))
+        x_panel = torch.from_numpy(np.concatenate([x, ids], axis=3).reshape(-1, step, features + 1))
+        panel = [
+            fit_seconds(
+                x_panel,
+                torch.from_numpy(y.ravel()),
+                sample_weight.ravel(),
+                b,
+                n_assets * n_iter * batch_size // b,
+                n_assets=n_assets,
+            )
+            for b in panel_batches
+        ]
+
+        cells = " | ".join(f"{seconds:>17.2f}" for seconds in panel)
+        print(f"{n_assets:>6} | {per_asset:>13.2f} | {cells} | {per_asset / min(panel):>11.2f}x")
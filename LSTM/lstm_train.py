@@ -1,15 +1,54 @@
-from dataloader import X_train, Y_train, X_test, Y_test, X_val, Y_val, device, flatten 
-from QWLSTMModel import QWLSTMModel, get_rfweight
+from common.dataloader import default_device, flatten, load_windows, MARKET, WindowDataset, window_dataset
+from common.QWLSTMModel import QWLSTMModel, rf_weight_kwargs, WEIGHTINGS
 from quantile_forest import RandomForestQuantileRegressor
+from common.rolling_forest import RollingQuantileForest
+from common.backtest import walk_forward, retrain_blocks, block_indices
+from common.parallel_tuner import parallel_maximize, batch_maximize
+from common.trial_cache import TrialCache, dataset_hash
+from common.rf_cache import ForestCache
+from common.asha import ASHAScheduler
+from common.population import MAX_HIDDEN_SIZE, QWLSTMPopulation
+from common.var_backtest import CoverageMonitor, kupiec_pof
+from common.checkpoint import save_checkpoint
 import numpy as np
 from bayes_opt import BayesianOptimization
 import json
 import torch
 import time
+from functools import partial, lru_cache
 
 # 定义全局变量 tau
 tau = 1
 quantile = 0.05  # 全局分位数
+# 数据集名称不再是全局变量：导入模块时不加载数据，market 显式传给 calculate_loss、bayesian_optimization 与 train_model_1，
+# 并行调优的工作进程通过绑定了 market 的目标函数拿到同一个数据集
+
+# 试验缓存的文件，取整后相同的超参数不再重复训练；设为 None 关闭
+trial_cache_path = "trial_cache.sqlite"
+
+# 随机森林缓存的目录，只改变 LSTM 参数的试验直接复用叶子编号矩阵；设为 None 关闭
+rf_cache_dir = "rf_cache"
+rf_seed = 0
+
+
+@lru_cache(maxsize=None)
+def _trial_cache(path: str):
+    """试验缓存，首次使用时才打开，导入模块不会创建文件；path 为 None 时返回 None"""
+    return None if path is None else TrialCache(path, max_entries=10000)
+
+
+@lru_cache(maxsize=None)
+def _rf_cache(cache_dir: str):
+    """随机森林缓存，首次使用时才创建；cache_dir 为 None 时返回 None"""
+    return None if cache_dir is None else ForestCache(cache_dir, max_bytes=512 * 2**20)
+
+
+@lru_cache(maxsize=None)
+def _dataset_hash(market: str):
+    # 窗口由特征数组、窗口长度与拆分下标唯一确定，不展开窗口计算指纹
+    dataset = window_dataset(market)
+    splits = dataset.split()
+    return dataset_hash(dataset.features, dataset.targets, np.asarray(dataset.step), splits["train"], splits["val"])
 
 def violation(Y_true, Y_predict):
     if isinstance(Y_true, torch.Tensor):
@@ -38,44 +77,82 @@ def target_loss(Y_true: np.ndarray, Y_predict: np.ndarray, quantile: float = qua
     return abs(proportion - quantile)
 
 
-def kupiec_test(violations, total_days, quantile, verbose: bool = True):
-    """Kupiec检验
+def kupiec_test(violations, total_days, quantile, verbose: bool = True, alpha: float = 0.05):
+    """Kupiec检验，统计量与 p 值见 var_backtest.kupiec_pof，适用于任意分位数
 
     Args:
         violations (int): 违约次数
         total_days (int): 总天数
-        significance_level (float): 显著性水平
+        quantile (float): 分位数
+        verbose (bool, optional): 是否打印检验结果. Defaults to True.
+        alpha (float, optional): 显著性水平. Defaults to 0.05.
 
     Returns:
         bool: 是否拒绝原假设
     """
+    statistic, p_value = kupiec_pof(violations, total_days, quantile)
+    result = bool(p_value < alpha)
 
-    confidence_intervals_map = {
-        0.05: 3.841,
-        0.1: 2.706,
-        0.025: 5.024,
-    }
+    if result:
+        text = f"kupiec result: Reject the null hypothesis. Default count: {violations}, LR: {statistic:.4f}, p-value: {p_value:.4f}"
+    else:
+        text = f"kupiec result: Not reject the null hypothesis. Default count: {violations}, LR: {statistic:.4f}, p-value: {p_value:.4f}"
+
+    if verbose:
+        print(text)
 
-    if quantile not in confidence_intervals_map:
-        raise ValueError("Invalid quantile value, must be 0.05, 0.1, or 0.025")
+    return result
 
-    p_value = quantile
-    kupiec_statistic = -2 * np.log(
-        ((1 - p_value) ** (total_days - violations)) * (p_value**violations)
+
+_INT_PARAMS = (
+    "hidden_size",
+    "num_layers",
+    "n_estimators",
+    "min_samples_leaf",
+    "min_samples_split",
+    "max_depth",
+    "batch_size",
+    "n_iter",
+)
+_RF_PARAMS = ("n_estimators", "min_samples_split", "min_samples_leaf", "max_depth")
+
+
+def _trial_key(params: dict, market: str, weighting: str = "leaf"):
+    """试验缓存的键，params 为取整后的超参数，两种权重计算方式的损失不同，分开缓存"""
+    # canonical_params 只接受数值，权重方式以其在 WEIGHTINGS 中的下标入键
+    return _trial_cache(trial_cache_path).key(
+        {**params, "tau": float(tau), "weighting": WEIGHTINGS.index(weighting)}, _dataset_hash(market), quantile
     )
 
-    result = kupiec_statistic > confidence_intervals_map[p_value]
 
-    if result < confidence_intervals_map[quantile]:
-        text = f"kupiec result: Reject the null hypothesis. Default count: {violations}"
-    
-    else:
-        text = f"not reject the null hypothesis, Default count: {violations}"
-    
-    if verbose:
-        print(text)
+def _rf_weights(rf_params: dict, market: str, weighting: str = "leaf"):
+    """训练集上随机森林的权重，作为 QWLSTMModel.fit 的参数
+
+    默认传入叶子编号矩阵，每个 batch 的权重列和精确计算；weighting="sample_weight" 时传入
+    rf_sample_weight 的期望近似。开启随机森林缓存时相同参数的试验共用一次拟合。
 
-    return result < confidence_intervals_map[quantile]  # 95%置信区间的临界值为3.84
+    Returns:
+        dict: {"leaf": ...} 或 {"sample_weight": ...}，见 rf_weight_kwargs
+    """
+    X_train, Y_train = load_windows(market)["X_train"], load_windows(market)["Y_train"]
+    rf_cache = _rf_cache(rf_cache_dir)
+    if rf_cache is not None:
+        key = rf_cache.key(rf_params, rf_seed, _dataset_hash(market))
+        entry = rf_cache.get(key)
+        if entry is None:  # 只有需要拟合时才展开训练集的窗口
+            entry = rf_cache.fit_forest(
+                rf_params, rf_seed, flatten(X_train.numpy()), Y_train.cpu().numpy(), _dataset_hash(market)
+            )
+        arrays, _ = entry
+        if weighting == "sample_weight":
+            return {"sample_weight": arrays["sample_weight"]}
+        return rf_weight_kwargs(arrays["leaf"], weighting)
+
+    X_flat = flatten(X_train.numpy())
+    rf = RandomForestQuantileRegressor(random_state=rf_seed, **rf_params)
+    rf.fit(X_flat, Y_train.cpu().numpy())
+
+    return rf_weight_kwargs(rf.apply(X_flat), weighting)
 
 
 def calculate_loss(
@@ -92,7 +169,18 @@ def calculate_loss(
     min_samples_split,
     min_samples_leaf,
     max_depth,
+    market: str = MARKET,
+    weighting: str = "leaf",
+    asha: ASHAScheduler = None,
 ):
+    """贝叶斯优化的目标函数：训练一个试验并返回负的验证集目标损失
+
+    market 为数据集名称，见 dataloader.load_windows；weighting 为随机森林权重的计算方式，见 _rf_weights；"sample_weight" 为期望近似，损失与精确路径不同。
+
+    asha 为本次调优的逐次减半调度器，设置后试验按递增的迭代预算训练，验证损失落后的试验提前终止；
+    None 表示训练完整的 n_iter。被提前终止的试验只训练了部分迭代，其验证损失不能与完整训练的试验比较，
+    返回值改为该级已登记的最大验证损失（见 ASHAScheduler.worst），不会优于同级的任何试验。
+    """
     hidden_size = int(hidden_size)
     num_layers = int(num_layers)
     n_estimators = int(n_estimators)
@@ -101,8 +189,33 @@ def calculate_loss(
     max_depth = int(max_depth)
     batch_size = int(batch_size)
     n_iter = int(n_iter)
+    windows = load_windows(market)
+    X_train, Y_train, X_val, Y_val = windows["X_train"], windows["Y_train"], windows["X_val"], windows["Y_val"]
+
+    trial_cache = _trial_cache(trial_cache_path)
+    if trial_cache is not None:
+        key = _trial_key(
+            dict(
+                dropout=dropout,
+                hidden_size=hidden_size,
+                n_iter=n_iter,
+                lr=lr,
+                batch_size=batch_size,
+                tol=tol,
+                num_layers=num_layers,
+                n_estimators=n_estimators,
+                min_samples_split=min_samples_split,
+                min_samples_leaf=min_samples_leaf,
+                max_depth=max_depth,
+            ),
+            market,
+            weighting,
+        )
+        cached = trial_cache.get(key)
+        if cached is not None:
+            return cached
 
-    rf = RandomForestQuantileRegressor(
+    rf_params = dict(
         n_estimators=n_estimators,
         min_samples_split=min_samples_split,
         min_samples_leaf=min_samples_leaf,
@@ -111,34 +224,148 @@ def calculate_loss(
     qwlstm_model = QWLSTMModel(
         hs=hidden_size, quantile=quantile, dropout=dropout, num_layers=num_layers
     )
+    rf_weights = _rf_weights(rf_params, market, weighting)
 
-    rf.fit(flatten(X_train).cpu(), flatten(Y_train).cpu())
-    mrfw, mrfwn = get_rfweight(rf, flatten(X_train).cpu())
+    budgets = asha.budgets(n_iter) if asha is not None else [n_iter]
+    pruned = None  # 提前终止时为终止所在的级别
+    for rung, budget in enumerate(budgets):
+        qwlstm_model.fit(  # 使用训练集调优超参数（70%）
+            X_train,
+            Y_train,
+            tau=tau,  # 使用全局变量 tau
+            d=False,
+            batch_size=batch_size,
+            n_iter=budget,
+            lr=lr,
+            tol=tol,
+            verbose=False,
+            resume=True,  # 从上一级停下的迭代次数继续训练
+            **rf_weights,
+        )
 
-    qwlstm_model.fit(  # 使用训练集调优超参数（70%）
-        X_train,
-        Y_train,
-        mrfw,
-        tau=tau,  # 使用全局变量 tau
-        d=False,
-        batch_size=batch_size,
-        n_iter=n_iter,
-        lr=lr,
-        tol=tol,
-        verbose=False,
-    )
+        # 预测结果
+        Y_pred = qwlstm_model.predict(X_val)
 
-    # 预测结果
-    Y_pred = qwlstm_model.predict(X_val)
+        if rung == len(budgets) - 1 or qwlstm_model.converged_:
+            break
+        if not asha.report(rung, target_loss(Y_val.cpu().numpy(), Y_pred, quantile=quantile)):
+            pruned = rung  # 验证损失落后，提前终止
+            break
 
     # kupiec检验
     yp_big_num = violation(Y_val, Y_pred)
     kupiec_test(yp_big_num, len(Y_pred), quantile=quantile)
 
-    return -target_loss(Y_val.cpu().numpy(), Y_pred, quantile=quantile)
+    if pruned is not None:  # 部分训练的损失作惩罚处理，且取决于调度顺序，不写入缓存
+        return -asha.worst(pruned)
+
+    loss = -target_loss(Y_val.cpu().numpy(), Y_pred, quantile=quantile)
+    if trial_cache is not None:
+        trial_cache.put(key, loss)
+
+    return loss
+
+
+def calculate_loss_population(suggestions: list, market: str = MARKET):
+    """同时评估一组建议点：隐藏层大小与层数相同的试验堆叠成一个 QWLSTMPopulation 一起训练
+
+    隐藏层不小于 population.MAX_HIDDEN_SIZE 时堆叠训练反而更慢，这些试验改为逐个调用 calculate_loss，
+    随机森林权重同样使用 sample_weight 近似，与堆叠训练的试验可比。
+
+    Args:
+        suggestions (list): 参数字典列表，参数同 calculate_loss
+        market (str, optional): 数据集名称. Defaults to MARKET.
+
+    Returns:
+        list: 与 suggestions 一一对应的目标值
+    """
+    trials = [{k: int(v) if k in _INT_PARAMS else v for k, v in params.items()} for params in suggestions]
+    windows = load_windows(market)
+    X_train, Y_train, X_val, Y_val = windows["X_train"], windows["Y_train"], windows["X_val"], windows["Y_val"]
+    trial_cache = _trial_cache(trial_cache_path)
+    targets = [None] * len(trials)
+    keys = [None] * len(trials)
+
+    groups = {}  # (hidden_size, num_layers) -> 试验下标
+    for j, params in enumerate(trials):
+        if trial_cache is not None:
+            keys[j] = _trial_key(params, market, "sample_weight")
+            targets[j] = trial_cache.get(keys[j])
+        if targets[j] is None:
+            groups.setdefault((params["hidden_size"], params["num_layers"]), []).append(j)
+
+    for (hidden_size, num_layers), members in groups.items():
+        if hidden_size >= MAX_HIDDEN_SIZE:
+            for j in members:
+                targets[j] = calculate_loss(**trials[j], market=market, weighting="sample_weight")
+            continue
+
+        group = [trials[j] for j in members]
+
+        population = QWLSTMPopulation(
+            len(group),
+            hs=hidden_size,
+            quantile=quantile,
+            dropout=[params["dropout"] for params in group],
+            num_layers=num_layers,
+            device=default_device(),
+        )
+        population.fit(
+            X_train,
+            Y_train,
+            lr=[params["lr"] for params in group],
+            batch_size=[params["batch_size"] for params in group],
+            n_iter=[params["n_iter"] for params in group],
+            tol=[params["tol"] for params in group],
+            tau=tau,
+            sample_weight=np.stack(  # 分组训练只支持 rf_sample_weight 的期望近似
+                [_rf_weights({k: params[k] for k in _RF_PARAMS}, market, "sample_weight")["sample_weight"] for params in group]
+            ),
+            verbose=False,
+        )
+
+        for j, Y_pred in zip(members, population.predict(X_val)):
+            # kupiec检验
+            yp_big_num = violation(Y_val, Y_pred)
+            kupiec_test(yp_big_num, len(Y_pred), quantile=quantile)
+
+            targets[j] = -target_loss(Y_val.cpu().numpy(), Y_pred, quantile=quantile)
+            if trial_cache is not None:
+                trial_cache.put(keys[j], targets[j])
+
+    return targets
+
+
+def bayesian_optimization(
+    _iter: int = 500,
+    n_workers: int = None,
+    batch_size: int = None,
+    strategy: str = "constant_liar",
+    early_stopping: bool = False,
+    population: int = None,
+    market: str = MARKET,
+    weighting: str = "leaf",
+):
+    """贝叶斯优化超参数，最优参数保存到 best_params.txt
 
+    Args:
+        _iter (int, optional): 贝叶斯优化的评估次数. Defaults to 500.
+        n_workers (int, optional): 并行进程数，设置后每轮取 batch_size 个建议点同时评估. Defaults to None.
+        batch_size (int, optional): 每轮的建议点数量. Defaults to n_workers.
+        strategy (str, optional): 批量建议策略，"constant_liar" 或 "kriging_believer". Defaults to "constant_liar".
+        early_stopping (bool, optional): 是否用 ASHA 提前终止验证损失落后的试验，每次调用新建一个调度器并绑定到目标函数，
+            结束后删除它的记录. Defaults to False.
+        population (int, optional): 每轮同时训练的建议点数量，设置后由 calculate_loss_population 评估（不使用 ASHA，
+            随机森林权重固定为 sample_weight 近似）；该轮第一个建议点的 hidden_size 小于 MAX_HIDDEN_SIZE 时同一轮共用
+            hidden_size 与 num_layers，堆叠成一个批量模型训练，否则各建议点保留自己的结构并逐个训练. Defaults to None.
+        market (str, optional): 数据集名称，绑定到目标函数后交给工作进程. Defaults to MARKET.
+        weighting (str, optional): 随机森林权重的计算方式，"leaf" 为精确的 batch 权重列和，
+            "sample_weight" 为期望近似（更省内存，但损失与精确路径不同），见 rf_weight_kwargs. Defaults to "leaf".
+    """
+    # 每次调优新建调度器，随目标函数传给工作进程（spawn 启动的进程不继承父进程的全局变量）
+    asha = ASHAScheduler(min_iter=100, max_iter=2000, eta=3) if early_stopping and population is None else None
+    objective = partial(calculate_loss, market=market, weighting=weighting, asha=asha)
 
-def bayesian_optimization(_iter: int = 500):
     pbounds = {
         "dropout": (0.0, 0.5),
         "hidden_size": (4, 128),
@@ -153,9 +380,39 @@ def bayesian_optimization(_iter: int = 500):
         "max_depth": (5, 30),
     }
 
-    optimizer = BayesianOptimization(f=calculate_loss, pbounds=pbounds, random_state=1)
+    try:
+        if population is not None:
+            optimizer = batch_maximize(
+                partial(calculate_loss_population, market=market),
+                pbounds,
+                init_points=30,
+                n_iter=_iter,
+                batch_size=population,
+                strategy=strategy,
+                random_state=1,
+                shared=("hidden_size", "num_layers"),
+                # 隐藏层不小于 MAX_HIDDEN_SIZE 时逐个训练，不需要共用结构，建议点保留各自的 hidden_size 与 num_layers
+                share_if=lambda params: int(params["hidden_size"]) < MAX_HIDDEN_SIZE,
+            )
+        elif n_workers is not None:
+            optimizer = parallel_maximize(
+                objective,
+                pbounds,
+                init_points=30,
+                n_iter=_iter,
+                batch_size=batch_size,
+                n_workers=n_workers,
+                strategy=strategy,
+                random_state=1,
+            )
+        else:
+            optimizer = BayesianOptimization(f=objective, pbounds=pbounds, random_state=1)
+
+            optimizer.maximize(init_points=30, n_iter=_iter)  # 优化完成
+    finally:
+        if asha is not None:
+            asha.remove()
 
-    optimizer.maximize(init_points=30, n_iter=_iter)  # 优化完成
     best_params = optimizer.max["params"]
     print(optimizer.max)
         # 使用时间戳为文件命名，避免覆盖
@@ -190,77 +447,314 @@ def load_best_params():
     return {**best_params_inted, **best_params_float}
 
 
-def train_model_1():  # 滚动向前预测训练
-    try:
-        best_params = load_best_params()
-    except FileNotFoundError:
-        print("best_params.txt not found. Please run bayesian_optimization() first.")
-        return
+def _forecast_window(
+    X, Y, block, seed, best_params, input_size, step=30, levels=quantile, crossing=0.0, weighting="leaf"
+):
+    """并行引擎中一块窗口的训练与预测，块之间互不依赖
 
-    # 处理训练数据
-    X = torch.cat((X_train, X_val, X_test), dim=0)
-    Y = torch.cat((Y_train, Y_val, Y_test), dim=0)
-    input_size = int(X.shape[0] * 0.8)
-    total_size = X.shape[0]
+    在第 block.start 个滚动窗口上训练一次，块内第 i 步的查询样本为窗口之后的第 i + input_size 个样本，
+    一次前向完成整块的预测。
+
+    Args:
+        X (np.ndarray): 特征数组（共享内存中的只读数组），样本为其上的滑动窗口，见 WindowDataset
+        Y (np.ndarray): 标签数组
+        block (range): 本块的步下标，见 backtest.retrain_blocks
+        seed (int): 块的种子
+        best_params (dict): 最优超参数
+        input_size (int): 滚动窗口包含的样本数
+        step (int, optional): 样本的时间步数. Defaults to 30.
+        levels (float | list, optional): 分位数，为列表时训练多分位数模型. Defaults to quantile.
+        crossing (float, optional): 分位数交叉惩罚系数. Defaults to 0.0.
+        weighting (str, optional): 随机森林权重的计算方式，见 rf_weight_kwargs. Defaults to "leaf".
+
+    Returns:
+        np.ndarray: 预测值，shape (len(block),)，多分位数时 shape (len(block), 分位数个数)
+    """
+    np.random.seed(seed % 2**32)
+    torch.manual_seed(seed)
+
+    dataset = WindowDataset(X, Y, step)
+    train, queries = block_indices(block, input_size)
+    _X_train = dataset.view(train)  # LSTM 训练时按 batch 取出窗口
+    _Y_train = torch.from_numpy(dataset.y(train))
+    X_flat = flatten(dataset.x(train))  # 随机森林需要展开的输入
 
-    # 创建模型
     rf = RandomForestQuantileRegressor(
         n_estimators=best_params["n_estimators"],
         min_samples_split=best_params["min_samples_split"],
         min_samples_leaf=best_params["min_samples_leaf"],
         max_depth=best_params["max_depth"],
+        random_state=seed % 2**32,
     )
+    rf.fit(X_flat, _Y_train.numpy())
+    rf_weights = rf_weight_kwargs(rf.apply(X_flat), weighting)
+    del X_flat
+
     qwlstm_model = QWLSTMModel(
         hs=best_params["hidden_size"],
-        quantile=quantile,
+        quantile=levels,
         dropout=best_params["dropout"],
         num_layers=best_params["num_layers"],
+        device="cpu",
+        crossing=crossing,
+    )
+    qwlstm_model.fit(
+        _X_train,
+        _Y_train,
+        tau=tau,
+        d=False,
+        batch_size=best_params["batch_size"],
+        n_iter=best_params["n_iter"],
+        lr=best_params["lr"],
+        tol=best_params["tol"],
+        verbose=False,
+        **rf_weights,
     )
 
-    # 开始训练
-    Y_pred = np.ndarray((total_size - input_size))  # 20%的预测值
-    for i in range(0, total_size - input_size):
+    with torch.no_grad():
+        y = qwlstm_model.predict(torch.from_numpy(dataset.x(queries)))
+
+    return y
+
+
+def train_model_1(  # 滚动向前预测训练
+    rolling_forest: bool = False,
+    n_new: int = 10,
+    max_age: int = None,
+    warm_start_iter: int = None,
+    retrain_every: int = None,
+    n_workers: int = None,
+    seed: int = 0,
+    quantiles: list = None,
+    crossing: float = 0.0,
+    abort_alpha: float = None,
+    checkpoint: str = None,
+    block_size: int = 1,
+    market: str = MARKET,
+    weighting: str = "leaf",
+    online_initial: int = None,
+    refit_every: int = 250,
+):
+    """滚动向前预测
 
-        slice_start = i
-        slice_end = i + input_size
+    样本按时间顺序排列，第 i 步在样本 [i, i + input_size) 上训练，预测紧随窗口之后的第 i + input_size 个样本。
 
-        _X_train = X[slice_start:slice_end]
-        _Y_train = Y[slice_start:slice_end]
+    Args:
+        rolling_forest (bool, optional): 使用滚动随机森林，每步只生成 n_new 棵新树而不是完整重训. Defaults to False.
+        n_new (int, optional): 滚动模式下每步新生成的树的数量. Defaults to 10.
+        max_age (int, optional): 滚动模式下树的最大存活步数. Defaults to None.
+        warm_start_iter (int, optional): 热启动微调的迭代次数，设置后除第一个窗口外沿用上一窗口的
+            fnet 与优化器状态，只在平移后的窗口上微调 warm_start_iter 次. Defaults to None.
+        retrain_every (int, optional): 热启动模式下每隔多少步完整重训一次，None 表示不重训. Defaults to None.
+        n_workers (int, optional): 并行进程数，设置后各窗口独立训练并分块交给进程池，
+            不能与热启动或滚动随机森林同时使用. Defaults to None.
+        seed (int, optional): 并行模式下的全局种子. Defaults to 0.
+        quantiles (list, optional): 多个分位数，如 [0.025, 0.05, 0.1]，设置后一个共用 LSTM 的模型
+            同时预测所有分位数，并逐个分位数给出损失与 Kupiec 检验；None 时只预测全局分位数 quantile. Defaults to None.
+        crossing (float, optional): 多分位数时分位数交叉的惩罚系数. Defaults to 0.0.
+        abort_alpha (float, optional): 逐步监控覆盖率（CoverageMonitor），某个分位数剩余的步数已无法让最终的
+            Kupiec 检验在该显著性水平下通过时提前终止，只评估已完成的步数；None 表示不提前终止，仅用于串行模式. Defaults to None.
+        checkpoint (str, optional): 检查点目录，设置后保存最后一个窗口的模型、归一化器、GARCH 参数与随机森林，
+            见 checkpoint.save_checkpoint；仅用于串行模式. Defaults to None.
+        block_size (int, optional): 每隔多少步重新训练一次，块内各步沿用块首窗口训练的模型，
+            查询样本一次批量前向，见 backtest.retrain_blocks；热启动与 retrain_every 按块首的步下标计算. Defaults to 1.
+        market (str, optional): 数据集名称. Defaults to MARKET.
+        weighting (str, optional): 随机森林权重的计算方式，"leaf" 为精确的 batch 权重列和，
+            "sample_weight" 为期望近似，见 rf_weight_kwargs. Defaults to "leaf".
+        online_initial (int, optional): 设置后波动率特征由在线 GARCH 逐条递推（前 online_initial 个观测用于初始估计），
+            每个窗口的特征都不使用未来数据；None 时在全部样本上拟合 GARCH，波动率特征含有未来信息. Defaults to None.
+        refit_every (int, optional): 在线 GARCH 重新估计参数的间隔. Defaults to 250.
+    """
+    levels = quantile if quantiles is None else list(quantiles)
 
-        rf.fit(flatten(_X_train).cpu(), flatten(_Y_train).cpu())
-        mrfw, mrfwn = get_rfweight(rf, flatten(_X_train).cpu())
+    if n_workers is not None and (rolling_forest or warm_start_iter is not None):
+        raise ValueError("n_workers requires independent windows, disable rolling_forest and warm_start_iter")
+    if n_workers is not None and abort_alpha is not None:
+        raise ValueError("abort_alpha monitors the serial loop, it cannot be used with n_workers")
+    if n_workers is not None and checkpoint is not None:
+        raise ValueError("checkpoint saves the model of the serial loop, it cannot be used with n_workers")
 
-        qwlstm_model.fit(  # 使用训练集调优超参数（70%）
-            _X_train,
-            _Y_train,
-            mrfw,
-            tau=tau,  # 使用全局变量 tau
-            d=False,
-            batch_size=best_params["batch_size"],
-            n_iter=best_params["n_iter"],
-            lr=best_params["lr"],
-            tol=best_params["tol"],
-            verbose=False,
-        )
+    try:
+        best_params = load_best_params()
+    except FileNotFoundError:
+        print("best_params.txt not found. Please run bayesian_optimization() first.")
+        return
 
-        with torch.no_grad():
-            y = qwlstm_model.predict(X[-1].unsqueeze(0))  # 预测最后一个值
+    # 处理训练数据：滚动预测按时间顺序使用全部窗口（不用 7:2:1 的随机拆分），每一步只取出当前窗口的样本
+    dataset = window_dataset(market, online_initial=online_initial, refit_every=refit_every)
+    total_size = len(dataset)
+    input_size = int(total_size * 0.8)
+    Y_true = dataset.y(np.arange(input_size, total_size))
 
-        Y_pred[i] = y[0]
-        print(
-            f"{i} times prediction finished!"
+    # 创建模型
+    rf_params = dict(
+        n_estimators=best_params["n_estimators"],
+        min_samples_split=best_params["min_samples_split"],
+        min_samples_leaf=best_params["min_samples_leaf"],
+        max_depth=best_params["max_depth"],
+    )
+    if rolling_forest:
+        rf = RollingQuantileForest(n_new=n_new, max_age=max_age, **rf_params)
+    else:
+        rf = RandomForestQuantileRegressor(**rf_params)
+    qwlstm_model = QWLSTMModel(
+        hs=best_params["hidden_size"],
+        quantile=levels,
+        dropout=best_params["dropout"],
+        num_layers=best_params["num_layers"],
+        crossing=crossing,
+    )
+
+    # 开始训练
+    Y_pred = np.ndarray((total_size - input_size,) + np.shape(levels))  # 20%的预测值
+    monitors = [
+        CoverageMonitor(float(q), horizon=total_size - input_size, abort_alpha=abort_alpha) for q in np.atleast_1d(levels)
+    ]
+    if n_workers is not None:
+        Y_pred = walk_forward(
+            partial(
+                _forecast_window,
+                best_params=best_params,
+                input_size=input_size,
+                step=dataset.step,
+                levels=levels,
+                crossing=crossing,
+                weighting=weighting,
+            ),
+            dataset.features,
+            dataset.targets,
+            total_size - input_size,
+            n_workers=n_workers,
+            seed=seed,
+            block_size=block_size,
         )
+    else:
+        device = default_device()
+        for block in retrain_blocks(total_size - input_size, block_size):
+
+            i = block.start
+            train, queries = block_indices(block, input_size)
+
+            _X_train = dataset.view(train, device)  # LSTM 训练时按 batch 取出窗口
+            _Y_train = torch.from_numpy(dataset.y(train)).to(device)
+
+            X_flat = flatten(dataset.x(train))  # 随机森林需要展开的输入，用完即释放
+            if rolling_forest:
+                rf.update(X_flat, dataset.y(train))
+            else:
+                rf.fit(X_flat, dataset.y(train))
+            rf_weights = rf_weight_kwargs(rf.apply(X_flat), weighting)
+            del X_flat
+
+            # 第一个窗口、未开启热启动或到达重训间隔时完整训练，否则只做微调
+            full_fit = (
+                warm_start_iter is None
+                or i == 0
+                or (retrain_every is not None and i % retrain_every == 0)
+            )
+
+            qwlstm_model.fit(  # 使用训练集调优超参数（70%）
+                _X_train,
+                _Y_train,
+                tau=tau,  # 使用全局变量 tau
+                d=False,
+                batch_size=best_params["batch_size"],
+                n_iter=best_params["n_iter"] if full_fit else warm_start_iter,
+                lr=best_params["lr"],
+                tol=best_params["tol"],
+                verbose=False,
+                warm_start=not full_fit,
+                **rf_weights,
+            )
+
+            # 块内各步的查询样本为各自训练窗口之后的样本，一次前向完成
+            with torch.no_grad():
+                y = qwlstm_model.predict(torch.from_numpy(dataset.x(queries)).to(device))
+
+            Y_pred[block.start : block.stop] = y
+            for k, y_k in zip(block, y):
+                for monitor, y_pred in zip(monitors, np.atleast_1d(y_k)):
+                    monitor.update(Y_true[k], y_pred)
+            print(
+                f"{block.stop - 1} times prediction finished! violations: "
+                + ", ".join(f"{m.violations}/{m.n} (rolling {m.rolling_rate:.3f})" for m in monitors)
+            )
+
+            failed = [m.quantile for m in monitors if m.unrecoverable]
+            if failed:
+                print(f"coverage for quantile {failed} can no longer pass the Kupiec test, stop at step {block.stop - 1}")
+                Y_pred = Y_pred[: block.stop]
+                break
 
     # 计算损失
     print("model training finished!")
-    loss = target_loss(Y[input_size:], Y_pred, quantile=quantile)
-    print("model last loss: ", loss)
-
-    # 计算Kupiec检验
-    yp_big_num = violation(Y[input_size:], Y_pred)
-    kupiec_test(yp_big_num, len(Y_pred), quantile=quantile)
-    print(kupiec_test(yp_big_num, len(Y_pred), quantile=quantile))
+    if checkpoint is not None:
+        from common.garch import OnlineGarch
+        from common.market import load_market
+
+        data = load_market(market, online_initial, refit_every)
+        if online_initial is None:
+            garch = OnlineGarch(refit_every=None)
+            garch.fit(data["log_return"])  # 与 load_market 相同的全样本 GARCH(1,1)，保存参数与下一期的条件方差
+        else:
+            # 与特征相同的在线递推，保存最后一个观测之后的状态
+            garch = OnlineGarch(refit_every=refit_every)
+            garch.fit(data["log_return"][:online_initial])
+            for r in data["log_return"][online_initial:]:
+                garch.update(r)
+        save_checkpoint(
+            checkpoint,
+            qwlstm_model,
+            scaler_x=data["scaler_x"],
+            scaler_y=data["scaler_y"],
+            garch=garch,
+            forest=rf,
+            metadata={"market": market, "best_params": best_params, "tau": tau},
+        )
+        print(f"checkpoint saved to {checkpoint}")
+    if rolling_forest:
+        print(rf.report())
+    Y_pred = Y_pred.reshape(len(Y_pred), -1)
+    Y_true = Y_true[: len(Y_pred)]
+    for j, q in enumerate(np.atleast_1d(levels)):
+        q = float(q)
+        if quantiles is not None:
+            print(f"quantile: {q}")
+
+        loss = target_loss(Y_true, Y_pred[:, j], quantile=q)
+        print("model last loss: ", loss)
+
+        # 计算Kupiec检验
+        yp_big_num = violation(Y_true, Y_pred[:, j])
+        kupiec_test(yp_big_num, len(Y_pred), quantile=q)
 
 if __name__ == "__main__":
-    bayesian_optimization(100)
-    train_model_1()
+    import argparse
+
+    # 先解析命令行，再按 --market 加载数据
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--market", default=MARKET, choices=["sp500", "shangzheng"])
+    parser.add_argument("--checkpoint", default=None, help="directory to save the final model")
+    parser.add_argument("--block-size", type=int, default=1, help="retrain every this many walk-forward steps")
+    parser.add_argument(
+        "--online-garch",
+        type=int,
+        default=None,
+        help="initial sample size of the online GARCH used for the walk-forward features (default: full-sample GARCH)",
+    )
+    parser.add_argument(
+        "--weighting",
+        default="leaf",
+        choices=WEIGHTINGS,
+        help="forest weights: exact per-batch leaf counts, or the sample_weight expectation approximation",
+    )
+    args = parser.parse_args()
+
+    bayesian_optimization(100, market=args.market, weighting=args.weighting)
+    train_model_1(
+        checkpoint=args.checkpoint,
+        block_size=args.block_size,
+        market=args.market,
+        weighting=args.weighting,
+        online_initial=args.online_garch,
+    )
@@ -1,4 +1,5 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import torch
 import json
 import time
@@ -6,7 +7,13 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from bayes_opt import BayesianOptimization
 from quantile_forest import RandomForestQuantileRegressor
-from data1 import X, Y  
+from common.rolling_forest import RollingQuantileForest
+from common.backtest import walk_forward, retrain_blocks, block_indices
+from common.parallel_tuner import parallel_maximize
+from common.trial_cache import TrialCache, dataset_hash
+from common.var_backtest import kupiec_pof
+from functools import partial, lru_cache
+from common.market import load_market
 # 固定使用 CPU
 device = torch.device("cpu")
 print("Using device:", device)
@@ -16,49 +23,77 @@ def sliding_window(X: np.ndarray, Y: np.ndarray, step: int = 30):
     """
     使用滑动窗口将原始时间序列数据转换为监督学习样本，
     每个样本包含连续的 step 个时刻的数据，目标取第 step+1 个时刻的值。
+    窗口为 X 上的只读视图（sliding_window_view），不复制数据。
     """
     if len(X) != len(Y):
         raise IndexError("X 和 Y 的长度不一致！")
-    x_windows, y_windows = [], []
-    for i in range(len(X) - step):
-        x_windows.append(X[i:i + step, :])
-        # 这里假设 Y 为二维数组，取第一列作为目标值（例如：价格等）
-        y_windows.append(Y[i + step, 0])
-    return np.array(x_windows), np.array(y_windows)
+    x_windows = sliding_window_view(X, step, axis=0)[:-1].swapaxes(1, 2)
+    # 这里假设 Y 为二维数组，取第一列作为目标值（例如：价格等）
+    y_windows = Y[step:, 0]
+    return x_windows, y_windows
 
 def flatten(X: np.ndarray):
     """
     将每个样本的多维数据展平为一维特征向量，
     最终输出形状为 (n_samples, n_features)
+    连续存储时返回视图，窗口视图只在这里复制一次成连续数组
     """
     return X.reshape(X.shape[0], -1)
 
-# 使用滑动窗口构造特征
-X_window, Y_window = sliding_window(X, Y, step=30)
+MARKET = "shangzheng"  # 默认数据集
 
-# 数据标准化：先将数据展平成二维，然后对每个特征进行标准化
-X_window_flat = flatten(X_window)
-scaler = StandardScaler()
-X_window_scaled = scaler.fit_transform(X_window_flat)
 
-# 两次拆分，得到 训练集、测试集、验证集（
-X_train_np, X_temp_np, Y_train_np, Y_temp_np = train_test_split(X_window_scaled, Y_window, test_size=0.3, random_state=42)
-X_test_np, X_val_np, Y_test_np, Y_val_np = train_test_split(X_temp_np, Y_temp_np, test_size=1/3, random_state=42)
+@lru_cache(maxsize=None)
+def prepare_data(market: str = MARKET):
+    """
+    构造滑动窗口、标准化并拆分数据集，首次调用时才加载数据，结果按 market 缓存；
+    导入模块时不加载数据，market 显式传给 calculate_loss、bayesian_optimization 与 train_model_1
+    返回 X_train、Y_train、X_val、Y_val、X_test、Y_test、数据指纹 data_hash，
+    以及按时间顺序排列的全部样本 X、Y（滚动向前预测使用）
+    """
+    data = load_market(market)
+
+    # 使用滑动窗口构造特征
+    X_window, Y_window = sliding_window(data["X"], data["Y"], step=30)
+
+    # 数据标准化：先将数据展平成二维，然后对每个特征进行标准化
+    X_window_flat = flatten(X_window)
+    scaler = StandardScaler()
+    X_window_scaled = scaler.fit_transform(X_window_flat)
 
-# 若后续需要torch tensor，可以转换，不过 QRF 模型直接接受 numpy 数组
-X_train = X_train_np.copy()
-Y_train = Y_train_np.copy()
-X_val   = X_val_np.copy()
-Y_val   = Y_val_np.copy()
-X_test  = X_test_np.copy()
-Y_test  = Y_test_np.copy()
+    # 两次拆分，得到 训练集、测试集、验证集（
+    X_train_np, X_temp_np, Y_train_np, Y_temp_np = train_test_split(X_window_scaled, Y_window, test_size=0.3, random_state=42)
+    X_test_np, X_val_np, Y_test_np, Y_val_np = train_test_split(X_temp_np, Y_temp_np, test_size=1/3, random_state=42)
 
-print("数据预处理完成：训练集、验证集、测试集尺寸分别为",
-      X_train.shape, X_val.shape, X_test.shape)
+    # 若后续需要torch tensor，可以转换，不过 QRF 模型直接接受 numpy 数组
+    # train_test_split 已经返回新数组，无需再复制
+    print("数据预处理完成：训练集、验证集、测试集尺寸分别为",
+          X_train_np.shape, X_val_np.shape, X_test_np.shape)
+
+    return {
+        "X_train": X_train_np,
+        "Y_train": Y_train_np,
+        "X_val": X_val_np,
+        "Y_val": Y_val_np,
+        "X_test": X_test_np,
+        "Y_test": Y_test_np,
+        "data_hash": dataset_hash(X_train_np, Y_train_np, X_val_np, Y_val_np),
+        "X": X_window_scaled,
+        "Y": np.asarray(Y_window),
+    }
 
 
 quantile = 0.05  # 全局分位数
 
+# 试验缓存的文件，取整后相同的超参数不再重复训练；设为 None 关闭
+trial_cache_path = "trial_cache.sqlite"
+
+
+@lru_cache(maxsize=None)
+def _trial_cache(path: str):
+    """试验缓存，首次使用时才打开，导入模块不会创建文件；path 为 None 时返回 None"""
+    return None if path is None else TrialCache(path, max_entries=10000)
+
 def violation(Y_true, Y_predict):
     """
     计算预测值低于真实值的个数
@@ -78,39 +113,51 @@ def target_loss(Y_true: np.ndarray, Y_predict: np.ndarray, quantile: float = qua
     proportion = yp_big_num / len(Y_true)
     return abs(proportion - quantile)
 
-def kupiec_test(violations, total_days, quantile, verbose: bool = True):
+def kupiec_test(violations, total_days, quantile, verbose: bool = True, alpha: float = 0.05):
     """
     Kupiec 检验，用于衡量风险度量模型（预测值低于实际值）的合理性
+    统计量与 p 值见 var_backtest.kupiec_pof，适用于任意分位数；返回是否拒绝原假设
     """
-    confidence_intervals_map = {
-        0.05: 3.841,
-        0.1: 2.706,
-        0.025: 5.024,
-    }
-    if quantile not in confidence_intervals_map:
-        raise ValueError("Invalid quantile value, must be 0.05, 0.1, or 0.025")
-    p_value = quantile
-    kupiec_statistic = -2 * np.log(((1 - p_value) ** (total_days - violations)) * (p_value ** violations))
-    result = kupiec_statistic > confidence_intervals_map[p_value]
-    test = f"kupiec 检验：{'不拒绝' if result else '拒绝'}原假设, 违约次数: {violations}"
-    print(kupiec_statistic)
+    statistic, p_value = kupiec_pof(violations, total_days, quantile)
+    result = bool(p_value < alpha)
+    test = f"kupiec 检验：{'拒绝' if result else '不拒绝'}原假设, 违约次数: {violations}, LR: {statistic:.4f}, p 值: {p_value:.4f}"
     if verbose:
         print(test)
     return result
 
 
-
-def calculate_loss(n_estimators, min_samples_split, min_samples_leaf, max_depth):
+def calculate_loss(n_estimators, min_samples_split, min_samples_leaf, max_depth, market: str = MARKET):
     """
     贝叶斯优化目标函数：
-    构建随机森林分位回归模型，对训练集进行拟合，
+    构建随机森林分位回归模型，对 market 的训练集进行拟合，
     然后在验证集上预测指定分位数，计算目标损失
     """
+    data = prepare_data(market)
+    X_train, Y_train, X_val, Y_val = data["X_train"], data["Y_train"], data["X_val"], data["Y_val"]
+
     # 参数转换
     n_estimators = int(n_estimators)
     min_samples_split = int(min_samples_split)
     min_samples_leaf = int(min_samples_leaf)
     max_depth = int(max_depth)
+
+    # 命中缓存时直接返回
+    trial_cache = _trial_cache(trial_cache_path)
+    if trial_cache is not None:
+        key = trial_cache.key(
+            dict(
+                n_estimators=n_estimators,
+                min_samples_split=min_samples_split,
+                min_samples_leaf=min_samples_leaf,
+                max_depth=max_depth,
+            ),
+            data["data_hash"],
+            quantile,
+        )
+        cached = trial_cache.get(key)
+        if cached is not None:
+            print(f"Loss: {cached} (cached)")
+            return cached
     
     # 构建模型
     rf = RandomForestQuantileRegressor(
@@ -134,20 +181,44 @@ def calculate_loss(n_estimators, min_samples_split, min_samples_leaf, max_depth)
     loss = -target_loss(Y_val, Y_pred, quantile=quantile)
     print(f"Loss: {loss} (n_estimators: {n_estimators}, min_samples_split: {min_samples_split}, "
           f"min_samples_leaf: {min_samples_leaf}, max_depth: {max_depth})")
+    if trial_cache is not None:
+        trial_cache.put(key, loss)
     return loss
 
-def bayesian_optimization(_iter: int = 100):
+def bayesian_optimization(
+    _iter: int = 100,
+    n_workers: int = None,
+    batch_size: int = None,
+    strategy: str = "constant_liar",
+    market: str = MARKET,
+):
     """
     使用贝叶斯优化调节随机森林的参数，保存最优参数到文件
+    n_workers 不为 None 时每轮取 batch_size 个建议点在多个进程中同时评估，
+    strategy 为批量建议策略（"constant_liar" 或 "kriging_believer"）
+    market 为数据集名称，绑定到目标函数后交给工作进程
     """
+    objective = partial(calculate_loss, market=market)
     pbounds = {
         "n_estimators": (50, 200),
         "min_samples_split": (2, 20),
         "min_samples_leaf": (1, 15),
         "max_depth": (3, 20),
     }
-    optimizer = BayesianOptimization(f=calculate_loss, pbounds=pbounds, random_state=1)
-    optimizer.maximize(init_points=30, n_iter=_iter)  # 参数搜索
+    if n_workers is not None:
+        optimizer = parallel_maximize(
+            objective,
+            pbounds,
+            init_points=30,
+            n_iter=_iter,
+            batch_size=batch_size,
+            n_workers=n_workers,
+            strategy=strategy,
+            random_state=1,
+        )
+    else:
+        optimizer = BayesianOptimization(f=objective, pbounds=pbounds, random_state=1)
+        optimizer.maximize(init_points=30, n_iter=_iter)  # 参数搜索
     best_params = optimizer.max["params"]
     print("最优参数：", optimizer.max)
     # 使用时间戳命名防止覆盖
@@ -167,52 +238,100 @@ def load_best_params():
         "max_depth": int(best_params["max_depth"]),
     }
 
-def train_model_1():
+def _forecast_window(X, Y, block, seed, best_params, input_size):
+    """
+    并行引擎中一块窗口的训练与预测：
+    用第 block.start 个窗口训练随机森林，一次 predict 预测块内各步窗口后一个时刻
+    """
+    train, queries = block_indices(block, input_size)
+    rf = RandomForestQuantileRegressor(
+        n_estimators=best_params["n_estimators"],
+        min_samples_split=best_params["min_samples_split"],
+        min_samples_leaf=best_params["min_samples_leaf"],
+        max_depth=best_params["max_depth"],
+        random_state=seed % 2**32,
+    )
+    rf.fit(X[train], Y[train].ravel())
+    y = rf.predict(X[queries], quantiles=[quantile])
+    return np.ravel(y)
+
+def train_model_1(
+    rolling_forest: bool = False,
+    n_new: int = 10,
+    max_age: int = None,
+    n_workers: int = None,
+    seed: int = 0,
+    block_size: int = 1,
+    market: str = MARKET,
+):
     """
     滚动向前预测训练：
     根据加载最优参数后，在训练集、验证集、测试集上进行滚动预测
+    rolling_forest 为 True 时使用滚动随机森林，每步淘汰最老的树并只生成 n_new 棵新树，
+    max_age 限制树的最大存活步数
+    n_workers 不为 None 时各窗口独立训练，分块交给进程池并行（不能与滚动随机森林同时使用），
+    seed 为并行模式下的全局种子
+    block_size 为重新训练的间隔步数，块内各步沿用块首窗口的随机森林，查询样本一次 predict 完成
+    market 为数据集名称
     """
+    if n_workers is not None and rolling_forest:
+        raise ValueError("n_workers requires independent windows, disable rolling_forest")
     try:
         best_params = load_best_params()
     except FileNotFoundError:
         print("best_params.txt 未找到，请先运行 bayesian_optimization()。")
         return
     
-    # 合并全部数据（注意这里用的是已标准化且展平后的 numpy 数组）
-    X_total = np.concatenate([X_train, X_val, X_test], axis=0)
-    Y_total = np.concatenate([Y_train, Y_val, Y_test], axis=0)
+    # 按时间顺序排列的全部样本（已标准化且展平的 numpy 数组），不用随机拆分后的训练集、验证集、测试集
+    data = prepare_data(market)
+    X_total, Y_total = data["X"], data["Y"]
     
     total_size = X_total.shape[0]
     input_size = int(total_size * 0.8)  # 例如 80% 用作训练
     
     Y_pred = np.empty(total_size - input_size)
+    if rolling_forest:
+        rf = RollingQuantileForest(n_new=n_new, max_age=max_age, **best_params)
     
-    for i in range(total_size - input_size):
-        slice_start = i
-        slice_end = i + input_size
+    if n_workers is not None:
+        Y_pred = walk_forward(
+            partial(_forecast_window, best_params=best_params, input_size=input_size),
+            X_total,
+            Y_total,
+            total_size - input_size,
+            n_workers=n_workers,
+            seed=seed,
+            block_size=block_size,
+        )
+    else:
+        for block in retrain_blocks(total_size - input_size, block_size):
+            train, queries = block_indices(block, input_size)
         
-        _X_train = X_total[slice_start:slice_end]
-        _Y_train = Y_total[slice_start:slice_end]
+            _X_train = X_total[train]
+            _Y_train = Y_total[train]
         
-        rf = RandomForestQuantileRegressor(
-            n_estimators=best_params["n_estimators"],
-            min_samples_split=best_params["min_samples_split"],
-            min_samples_leaf=best_params["min_samples_leaf"],
-            max_depth=best_params["max_depth"],
-        )
-        # 模型训练时注意将目标值转为1d数组
-        rf.fit(_X_train, _Y_train.ravel())
+            if rolling_forest:
+                rf.update(_X_train, _Y_train.ravel())
+            else:
+                rf = RandomForestQuantileRegressor(
+                    n_estimators=best_params["n_estimators"],
+                    min_samples_split=best_params["min_samples_split"],
+                    min_samples_leaf=best_params["min_samples_leaf"],
+                    max_depth=best_params["max_depth"],
+                )
+                # 模型训练时注意将目标值转为1d数组
+                rf.fit(_X_train, _Y_train.ravel())
         
-        # 预测下一个时刻的值：这里用最后一个样本作为预测输入
-        # 保证输入数据为二维数组（1, n_features）
-        x_input = X_total[slice_end].reshape(1, -1)
-        y = rf.predict(x_input, quantiles=[quantile])
-        if isinstance(y, np.ndarray) and y.ndim == 2:
-            y = y[:, 0]
-        Y_pred[i] = y[0]
-        print(f"第 {i+1} 次预测完成!")
+            # 预测下一个时刻的值：块内第 k 步的输入为其训练窗口之后的样本 X_total[k + input_size]，
+            # 整块的输入（len(block), n_features）一次预测
+            x_input = X_total[queries]
+            y = rf.predict(x_input, quantiles=[quantile])
+            Y_pred[block.start : block.stop] = np.ravel(y)
+            print(f"第 {block.stop} 次预测完成!")
     
     print("滚动预测训练完成!")
+    if rolling_forest:
+        print(rf.report())
     loss = target_loss(Y_total[input_size:], Y_pred, quantile=quantile)
     print("最终损失:", loss)
     
@@ -223,7 +342,14 @@ def train_model_1():
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--market", default=MARKET, choices=["sp500", "shangzheng"])
+    parser.add_argument("--block-size", type=int, default=1, help="retrain every this many walk-forward steps")
+    args = parser.parse_args()
+
     # 首先进行贝叶斯优化，找出最优参数
-    bayesian_optimization(_iter=100)
+    bayesian_optimization(_iter=100, market=args.market)
     # 根据最优参数进行滚动预测训练
-    train_model_1()
+    train_model_1(block_size=args.block_size, market=args.market)
@@ -0,0 +1,675 @@
+# Quantile Regresson Forest Weight Long Short Term Memory（QWLSTM）
+# 分位数回归森林加权长短期记忆网络模型 实现
+import numpy as np
+import torch
+import torch.nn as nn
+from scipy import sparse
+import warnings
+from .dataloader import default_device
+
+warnings.filterwarnings("ignore")
+
+
+class LSTMModel(nn.Module):
+
+    def __init__(
+        self,
+        input_size: int,
+        hidden_size: int,
+        num_layers: int,
+        output_size: int,
+        dropout: float,
+        n_assets: int = None,
+        embed_dim: int = 4,
+    ):
+        """lstm模型实现
+
+        Args:
+            input_size (int): 输入大小
+            hidden_size (int): 隐藏层大小
+            num_layers (int): 层数
+            output_size (int): 输出大小，多分位数模型中每个分位数对应一个输出
+            dropout (float): 关闭神经元的概率
+            n_assets (int, optional): 面板模式的资产数。设置后输入的最后一个特征为资产编号，
+                替换为可学习的资产嵌入后再输入 LSTM. Defaults to None.
+            embed_dim (int, optional): 资产嵌入的维数. Defaults to 4.
+        """
+        super().__init__()
+        self.input_size = input_size
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+        self.n_assets = n_assets
+
+        lstm_input_size = input_size if n_assets is None else input_size - 1 + embed_dim
+        self.lstm = nn.LSTM(  # lstm
+            lstm_input_size, hidden_size, num_layers, batch_first=True, dropout=dropout
+        )
+
+        self.fc = nn.Linear(hidden_size, output_size)  # 线性层
+
+        if n_assets is not None:
+            self.embedding = nn.Embedding(n_assets, embed_dim)  # 资产嵌入
+
+    def forward(self, x):
+        if self.n_assets is not None:
+            # 资产编号在各时间步相同，取第一个时间步的编号，嵌入向量拼接到每个时间步
+            emb = self.embedding(x[:, 0, -1].long())
+            x = torch.cat([x[..., :-1], emb.unsqueeze(1).expand(-1, x.size(1), -1)], dim=-1)
+
+        # 初始化 LSTM 隐藏状态和细胞状态
+        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
+        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
+
+        # 通过 LSTM 层
+        out, _ = self.lstm(x, (h0, c0))
+
+        # 取最后一个时间步的输出
+        out = self.fc(out[:, -1, :])
+        return out
+
+
+def leaf_keys(leaf):
+    """每棵树的叶子编号加上偏移，变为全局唯一的叶子编号
+
+    Args:
+        leaf (np.ndarray): rf.apply(x) 的结果，shape (n, ntrees)
+
+    Returns:
+        np.ndarray: int64，shape (n, ntrees)，不同树的叶子编号互不相同
+    """
+    leaf = np.asarray(leaf)
+    leaf = leaf.reshape(len(leaf), -1)
+
+    return leaf.astype(np.int64) + np.arange(leaf.shape[1], dtype=np.int64) * (int(leaf.max()) + 1)
+
+
+def leaf_indicator(leaf):
+    """按叶子编号对样本分组，构造样本-叶子指示矩阵
+
+    每棵树的叶子编号加上偏移后拼成全局编号，一次排序（np.unique）完成分组，
+    不需要逐样本 np.where。
+
+    Args:
+        leaf (np.ndarray): rf.apply(x) 的结果，shape (n, ntrees)
+
+    Returns:
+        tuple: (M, counts)。M 为 CSR 矩阵，shape (n, 叶子总数)，每行恰有 ntrees 个 1；
+            counts[k] 为全局第 k 个叶子中的样本数
+    """
+    keys = leaf_keys(leaf)
+    n, ntrees = keys.shape
+
+    _, inverse, counts = np.unique(keys.ravel(), return_inverse=True, return_counts=True)
+
+    M = sparse.csr_matrix(
+        (np.ones(n * ntrees), inverse.ravel(), np.arange(0, n * ntrees + 1, ntrees)),
+        shape=(n, len(counts)),
+    )
+
+    return M, counts
+
+
+def rf_graph(x, dense=True):
+    """单棵树的叶子共现矩阵
+
+    Args:
+        x (np.ndarray): 单棵树上每个样本所在的叶子编号，shape (n,)
+        dense (bool, optional): 是否返回稠密矩阵. Defaults to True.
+
+    Returns:
+        tuple: (G, G_norm)，G[i, j] = 1 表示 i、j 落在同一叶子，G_norm 按 i 所在叶子的样本数归一化
+    """
+    M, counts = leaf_indicator(np.asarray(x).reshape(-1, 1))
+
+    G = (M @ M.T).tocsr()
+    G_norm = (M.multiply(1.0 / counts) @ M.T).tocsr()
+
+    if dense:
+        return G.toarray(), G_norm.toarray()
+
+    return G, G_norm
+
+
+def get_rfweight(rf, x, dense=False, max_bytes=2**30, chunk_bytes=64 * 2**20):
+    """随机森林权重矩阵
+
+    同一叶子的样本两两相连，对所有树取平均。稀疏实现的耗时与内存只和
+    叶子内样本对的数量有关，而不是 ntrees * n^2。
+
+    非零元个数约为 n 乘以每个样本在各棵树中的同叶子样本（去重）数，树较浅、叶子较大时接近 n^2：
+    如 n = 50000、max_depth = 8 时需要数十 GB，max_depth = None、min_samples_leaf = 5 时也有约 1700 万个非零元。
+    因此按行分块计算，每块的乘积不超过 chunk_bytes，结果超过 max_bytes 时抛出 MemoryError；
+    此时应改用 fit(leaf=rf.apply(x)) 或 fit(sample_weight=rf_sample_weight(leaf))，不需要构造整个矩阵。
+
+    Args:
+        rf: 已训练的随机森林（需要实现 apply 方法）
+        x (np.ndarray): 训练集输入，shape (n, features)
+        dense (bool, optional): 是否返回稠密矩阵. Defaults to False.
+        max_bytes (int, optional): 两个结果矩阵合计的内存上限（字节），None 表示不限制. Defaults to 1GB.
+        chunk_bytes (int, optional): 每块乘积的内存上限（字节），按每行非零元个数的上界估计. Defaults to 64MB.
+
+    Returns:
+        tuple: (G_unnorm, G_norm)，默认为 scipy.sparse.csr_matrix，shape (n, n)
+    """
+    leaf = rf.apply(x)
+    ntrees = leaf.shape[1]
+
+    M, counts = leaf_indicator(leaf)
+    n = M.shape[0]
+
+    if dense and max_bytes is not None and 2 * n * n * 8 > max_bytes:
+        raise MemoryError(f"Dense RF weights for n = {n} need {2 * n * n * 8} bytes, more than max_bytes = {max_bytes}")
+
+    MT = M.T.tocsr()
+    M_norm = M.multiply(1.0 / counts).tocsr()
+
+    # 每行非零元个数的上界为该样本所在叶子的样本数之和（每个非零元约 12 字节），按上界把行分成若干块
+    cum_bytes = np.cumsum(counts[M.indices].reshape(n, -1).sum(axis=1) * 12)
+
+    blocks, blocks_norm = [], []
+    nbytes = 0
+    start = 0
+    while start < n:
+        offset = cum_bytes[start - 1] if start > 0 else 0
+        stop = max(int(np.searchsorted(cum_bytes, offset + chunk_bytes, side="right")), start + 1)
+
+        G = (M[start:stop] @ MT).tocsr()
+        G_norm = (M_norm[start:stop] @ MT).tocsr()
+        G.data /= ntrees
+        G_norm.data /= ntrees
+
+        nbytes += G.data.nbytes + G.indices.nbytes + G_norm.data.nbytes + G_norm.indices.nbytes
+        if max_bytes is not None and nbytes > max_bytes:
+            raise MemoryError(
+                f"RF weights for n = {n} need more than max_bytes = {max_bytes} bytes; "
+                "pass leaf=rf.apply(x) or sample_weight=rf_sample_weight(leaf) to fit instead"
+            )
+
+        blocks.append(G)
+        blocks_norm.append(G_norm)
+        start = stop
+
+    # 拼接后立即释放分块，峰值约为结果的 1.5 倍
+    G_unnorm = sparse.vstack(blocks, format="csr")
+    blocks.clear()
+    G_norm = sparse.vstack(blocks_norm, format="csr")
+    blocks_norm.clear()
+
+    if dense:
+        return G_unnorm.toarray(), G_norm.toarray()
+
+    return G_unnorm, G_norm
+
+
+def rf_sample_weight(leaf, normalize=False):
+    """每个训练样本的权重列和（不含对角线），由叶子样本数直接算出
+
+    s[j] = sum_{i != j} W[i, j]。未归一化时为 j 所在叶子样本数的树平均减 1，
+    归一化时为 1 减去 j 所在叶子样本数倒数的树平均。
+
+    fit(sample_weight=...) 用它按比例估计 batch 子块的列和，是期望意义下的近似，
+    精确的 batch 损失见 fit(leaf=...)。
+
+    Args:
+        leaf (np.ndarray): rf.apply(x) 的结果，shape (n, ntrees)
+        normalize (bool, optional): 对应 get_rfweight 的归一化权重. Defaults to False.
+
+    Returns:
+        np.ndarray: shape (n,)
+    """
+    M, counts = leaf_indicator(leaf)
+    leaf_counts = counts[M.indices].reshape(M.shape[0], -1)
+
+    if normalize:
+        return 1.0 - (1.0 / leaf_counts).mean(axis=1)
+
+    return leaf_counts.mean(axis=1) - 1.0
+
+
+WEIGHTINGS = ("leaf", "sample_weight")
+
+
+def rf_weight_kwargs(leaf, weighting: str = "leaf"):
+    """QWLSTMModel.fit 的随机森林权重参数
+
+    Args:
+        leaf (np.ndarray): rf.apply(x) 的结果，shape (n, ntrees)
+        weighting (str, optional): "leaf" 为精确的 batch 权重列和；"sample_weight" 为 rf_sample_weight 的期望近似. Defaults to "leaf".
+
+    Returns:
+        dict: {"leaf": leaf} 或 {"sample_weight": rf_sample_weight(leaf)}
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Invalid weighting {weighting!r}, must be one of {WEIGHTINGS}")
+
+    if weighting == "leaf":
+        return {"leaf": leaf}
+
+    return {"sample_weight": rf_sample_weight(leaf)}
+
+
+def weighted_quantile_loss(losses, col_weight, n):
+    """随机森林加权的分位数损失
+
+    mean(losses * W_b) * n / (n - 1) 按列求和后等于 sum_j losses_j * c_j / b^2 * n / (n - 1)，
+    其中 c_j 为 batch 权重子块 W_b（去掉对角线）第 j 列的列和，只需 O(b) 内存。
+
+    Args:
+        losses (torch.Tensor): 每个样本的分位数损失，shape (b,)
+        col_weight (torch.Tensor): 每个样本的权重列和 c_j，shape (b,)
+        n (int): 训练集大小
+
+    Returns:
+        torch.Tensor: 标量损失
+    """
+    b = losses.shape[0]
+
+    return (losses * col_weight).sum() / (b * b) * n / (n - 1)
+
+
+def get_derivative_matrix(A, B, device=None):
+
+    device = default_device() if device is None else device
+    n = A.shape[0]
+    p = A.shape[1]
+
+    C = torch.zeros(n, n * p).to(device)
+
+    row_idx = torch.arange(n).repeat((p, 1)).T.reshape(-1)
+    col_idx = torch.arange(n * p)
+
+    C[row_idx, col_idx] = A.reshape(-1)
+
+    mB = torch.tile(B.T, (n, 1)) - torch.tile(B.reshape(-1, 1), (1, n))
+    mB = mB.to(device)
+
+    return C @ mB
+
+
+def weight_block(weight, idx):
+    """取出权重矩阵的 idx x idx 子块，兼容稠密与稀疏（CSR）权重
+
+    Args:
+        weight (np.ndarray | scipy.sparse.spmatrix): 权重矩阵，shape (n, n)
+        idx (np.ndarray | torch.Tensor): 样本下标，张量（如 fast 模式的 batch 下标）先拷回主机
+
+    Returns:
+        np.ndarray: weight[idx][:, idx]
+    """
+    if isinstance(idx, torch.Tensor):
+        idx = idx.cpu().numpy()
+
+    if sparse.issparse(weight):
+        return weight[idx][:, idx].toarray()
+
+    return weight[np.ix_(idx, idx)]
+
+
+def leaf_block(leaf, idx):
+    """由叶子编号矩阵直接计算权重矩阵的 idx x idx 子块
+
+    与 get_rfweight 的未归一化权重相同：两样本在各棵树中落在同一叶子的比例。
+    只比较 batch 内样本的叶子编号，耗时为 O(batch_size^2 * ntrees)，与 n 无关。
+
+    Args:
+        leaf (torch.Tensor): rf.apply(x) 的结果，shape (n, ntrees)
+        idx (np.ndarray): 样本下标
+
+    Returns:
+        torch.Tensor: shape (len(idx), len(idx))
+    """
+    tmp_leaf = leaf[torch.as_tensor(idx, device=leaf.device)]
+
+    return (tmp_leaf.unsqueeze(1) == tmp_leaf.unsqueeze(0)).float().mean(dim=-1)
+
+
+def leaf_colsum(keys, idx):
+    """由全局叶子编号直接计算权重子块（去掉对角线）的列和，不构造子块
+
+    batch 中第 j 个样本的列和为各棵树中与它同叶子的 batch 样本数的平均减 1，
+    与 leaf_block 子块的列和精确相等；一次 torch.unique 完成计数，耗时为 O(batch_size * ntrees)。
+
+    Args:
+        keys (torch.Tensor): leaf_keys 的结果，shape (n, ntrees)
+        idx (np.ndarray | torch.Tensor): 样本下标
+
+    Returns:
+        torch.Tensor: shape (len(idx),)
+    """
+    tmp_keys = keys[torch.as_tensor(idx, device=keys.device)]
+    _, inverse, counts = torch.unique(tmp_keys, return_inverse=True, return_counts=True)
+
+    return counts[inverse].float().mean(dim=1) - 1.0
+
+
+class QWLSTMModel:
+
+    def __init__(
+        self,
+        hs=64,
+        quantile: float = 0.05,
+        dropout: float = 0.1,
+        num_layers: int = 3,
+        device=None,
+        crossing: float = 0.0,
+        n_assets: int = None,
+        embed_dim: int = 4,
+    ):
+        """
+
+        Args:
+            hs (int, optional): 隐藏层. Defaults to 64.
+            quantile (float | list, optional): 分位数。为列表时所有分位数共用一个 LSTM，
+                每个分位数一个输出，损失为各分位数的分位数损失之和. Defaults to 0.05.
+            dropout (float, optional): 随机关闭神经元. Defaults to .1
+            num_layers (int, optional): lstm隐藏层数量. Defaults to 3
+            device (str, optional): 是否使用gpu加速. Defaults to default_device()（有 GPU 时为 cuda）.
+            crossing (float, optional): 多分位数时分位数交叉的惩罚系数，
+                惩罚项为相邻分位数 relu(f_低 - f_高) 的均值之和. Defaults to 0.0.
+            n_assets (int, optional): 面板模式的资产数，设置后一个模型在多个资产上训练，
+                输入的最后一个特征为资产编号（见 dataloader.panel_windows）. Defaults to None.
+            embed_dim (int, optional): 面板模式下资产嵌入的维数. Defaults to 4.
+        """
+        self.hs = hs
+        self.device = default_device() if device is None else device
+        self.quantiles = np.atleast_1d(quantile).astype(float)
+        self.multi = np.ndim(quantile) > 0
+        self.q = 1 - self.quantiles if self.multi else 1 - quantile
+        self.crossing = crossing
+        self.dropout = dropout
+        self.num_layers = num_layers
+        self.n_assets = n_assets
+        self.embed_dim = embed_dim
+
+    def fit(
+        self,
+        x,
+        y,
+        weight=None,
+        tau=0.5,
+        d=False,
+        batch_size=100,
+        n_iter=500,
+        lr=1e-3,
+        tol=1e-5,
+        verbose=True,
+        leaf=None,
+        sample_weight=None,
+        warm_start=False,
+        resume=False,
+        fast=False,
+        check_every=50,
+        seed=None,
+    ):
+        """
+
+        Args:
+            x (torch.Tensor | dataloader.WindowView): 输入，shape (n, 时间步, 特征数)，窗口视图按 batch 取出；面板模式下最后一个特征为资产编号
+            y (torch.Tensor): 标签，shape (n,)
+            weight (np.ndarray | scipy.sparse.spmatrix, optional): 随机森林权重矩阵 (n, n). Defaults to None.
+            tau (float, optional): 普通分位数损失所占比例. Defaults to 0.5.
+            batch_size (int, optional): 批大小. Defaults to 100.
+            n_iter (int, optional): 迭代次数. Defaults to 500.
+            lr (float, optional): 学习率. Defaults to 1e-3.
+            tol (float, optional): 收敛阈值. Defaults to 1e-5.
+            verbose (bool, optional): 是否打印收敛信息. Defaults to True.
+            leaf (np.ndarray, optional): rf.apply(x) 的叶子编号矩阵 (n, ntrees)。
+                传入时不再需要 weight，每个 batch 权重子块的列和由叶子编号直接计算（leaf_colsum），
+                损失与传入 weight 时精确相等. Defaults to None.
+            sample_weight (np.ndarray, optional): rf_sample_weight 预先算好的每个样本的权重列和 (n,)。
+                近似：用其期望 (b - 1) / (n - 1) * sample_weight 代替 batch 子块的列和，
+                对随机 batch 取期望时与精确损失相同，但每个 batch 的损失不同；需要精确损失时使用 leaf. Defaults to None.
+            warm_start (bool, optional): 沿用上一次 fit 的 fnet 与优化器状态继续训练（滚动窗口微调），
+                没有可沿用的模型时与 False 相同. Defaults to False.
+            resume (bool, optional): 从上一次 fit 停下的迭代次数 self.n_iter_ 继续训练到 n_iter，
+                沿用 fnet、优化器状态与 loss_count；已收敛时直接返回，没有可沿用的模型时与 False 相同. Defaults to False.
+            fast (bool, optional): 不与主机同步的训练方式：用 torch 随机数生成器逐轮打乱后按顺序切片取 batch，
+                损失记录在预先分配的张量中，每 check_every 步才检查一次收敛。收敛判据与逐步检查相同，
+                但检查前已走完的至多 check_every - 1 步不会撤销。稀疏 weight 的子块在主机上取出，
+                每步仍需把 batch 下标拷回主机. Defaults to False.
+            check_every (int, optional): fast 模式下检查收敛的间隔步数. Defaults to 50.
+            seed (int, optional): fast 模式下随机数生成器的种子，None 时由 np.random 生成. Defaults to None.
+        """
+        x, y = x.to(self.device), y.to(self.device)
+        q = torch.as_tensor(self.q, dtype=torch.float32, device=self.device) if self.multi else self.q
+
+        if leaf is not None:
+            leaf = torch.as_tensor(leaf_keys(leaf), device=self.device)
+
+        if sample_weight is not None:
+            sample_weight = torch.as_tensor(
+                np.asarray(sample_weight), dtype=torch.float32, device=self.device
+            )
+
+        n = x.shape[0]
+        p = x.shape[1]
+        input_size = x.shape[2]
+
+        resume = resume and getattr(self, "fnet", None) is not None and self.fnet.input_size == input_size
+        if resume and self.converged_:
+            return
+
+        if (warm_start or resume) and getattr(self, "fnet", None) is not None and self.fnet.input_size == input_size:
+            optimizer = self.optimizer
+            for group in optimizer.param_groups:
+                group["lr"] = lr
+        else:
+            self.fnet = LSTMModel(
+                input_size=input_size,
+                hidden_size=self.hs,
+                num_layers=self.num_layers,
+                output_size=len(self.quantiles),
+                dropout=self.dropout,
+                n_assets=self.n_assets,
+                embed_dim=self.embed_dim,
+            ).to(self.device)
+            optimizer = torch.optim.Adam(
+                [
+                    {"params": self.fnet.parameters()},
+                ],
+                lr=lr,
+            )
+            self.optimizer = optimizer
+
+        if resume:
+            start = self.n_iter_
+            last_loss = self.loss_count[-1] if self.loss_count else np.inf
+        else:
+            start = 0
+            self.loss_count = []
+            last_loss = np.inf
+        flag = 0
+        self.converged_ = False
+
+        if fast:
+            flag = self._fit_fast(
+                x, y, optimizer, start, last_loss, n_iter, batch_size, q, tau, tol, check_every, seed, verbose,
+                weight, leaf, sample_weight,
+            )
+        else:
+            for i_iter in range(start, n_iter):
+
+                csample = np.random.permutation(n)[:batch_size]
+                loss = self._batch_loss(x[csample], y[csample], csample, n, q, tau, weight, leaf, sample_weight)
+
+                self.loss_count.append(loss.data.cpu().tolist())
+
+                if (np.abs(last_loss - loss.data.cpu().numpy()) <= tol) & (i_iter >= 100):
+
+                    if verbose:
+
+                        print(
+                            "Algorithm converges for RWN model at iter {}, loss: {}.".format(
+                                i_iter, self.loss_count[-1]
+                            )
+                        )
+
+                    flag = 1
+                    self.converged_ = True
+                    break
+
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+
+                last_loss = loss.data.cpu().numpy()
+                self.n_iter_ = i_iter + 1  # 已完成的迭代次数
+
+        if (flag == 0) & verbose:
+
+            print(
+                "Algorithm may not converge for RWN model, loss: {}.".format(
+                    self.loss_count[-1]
+                )
+            )
+
+    def _batch_loss(self, tmp_x, tmp_y, idx, n, q, tau, weight=None, leaf=None, sample_weight=None):
+        """一个 batch 的损失，tau 为 None 时只有普通分位数损失
+
+        Args:
+            tmp_x (torch.Tensor): batch 输入
+            tmp_y (torch.Tensor): batch 标签
+            idx (np.ndarray | torch.Tensor): batch 的样本下标
+            n (int): 训练集样本数
+            q (float | torch.Tensor): 1 - 分位数，多分位数时为 shape (k,) 的张量
+            tau (float): 普通分位数损失所占比例
+            weight (np.ndarray | scipy.sparse.spmatrix | torch.Tensor, optional): 权重矩阵. Defaults to None.
+            leaf (torch.Tensor, optional): 全局叶子编号（leaf_keys）. Defaults to None.
+            sample_weight (torch.Tensor, optional): 每个样本的权重列和. Defaults to None.
+
+        Returns:
+            torch.Tensor: 标量损失
+        """
+        tmp_fx = self.fnet(tmp_x)
+        if self.multi:
+            tmp_loss = self.quantile_loss(tmp_y.unsqueeze(1), tmp_fx, q).sum(dim=1)  # 各分位数损失之和
+        else:
+            tmp_loss = self.quantile_loss(tmp_y, tmp_fx.ravel(), q)
+
+        if tau is None:
+            return tmp_loss.mean() + self._crossing_penalty(tmp_fx)
+
+        b = len(idx)
+        if sample_weight is not None:  # 期望近似
+            tmp_c = sample_weight[torch.as_tensor(idx, device=self.device)] * (b - 1) / (n - 1)
+        elif leaf is not None:
+            tmp_c = leaf_colsum(leaf, idx)
+        else:
+            if isinstance(weight, torch.Tensor):
+                tmp_w = weight[idx][:, idx]
+            else:
+                tmp_w = torch.Tensor(weight_block(weight, idx)).to(self.device)
+            tmp_c = tmp_w.sum(dim=0) - torch.diag(tmp_w)  # 去掉对角线后的列和
+
+        loss1 = tmp_loss.mean()
+        loss2 = weighted_quantile_loss(tmp_loss, tmp_c, n)
+
+        return tau * loss1 + (1 - tau) * loss2 + self._crossing_penalty(tmp_fx)
+
+    def _crossing_penalty(self, fx):
+
+        if not self.multi or self.crossing == 0:
+            return 0.0
+
+        order = np.argsort(self.quantiles)
+        low, high = fx[:, order[:-1]], fx[:, order[1:]]
+
+        return self.crossing * torch.relu(low - high).mean(dim=0).sum()
+
+    def _fit_fast(
+        self, x, y, optimizer, start, last_loss, n_iter, batch_size, q, tau, tol, check_every, seed, verbose,
+        weight, leaf, sample_weight,
+    ):
+        """fit 的 fast 模式：训练循环中只有每 check_every 步一次的收敛检查需要与主机同步
+
+        Returns:
+            int: 是否收敛（1 / 0）
+        """
+        n = x.shape[0]
+        b = min(batch_size, n)
+
+        if seed is None:
+            seed = np.random.randint(np.iinfo(np.int32).max)
+        generator = torch.Generator(device=self.device)
+        generator.manual_seed(int(seed))
+
+        if isinstance(weight, np.ndarray):  # 稠密权重一次性放到设备上，之后直接按下标取子块
+            weight = torch.as_tensor(weight, dtype=torch.float32, device=self.device)
+        elif sparse.issparse(weight):  # 稀疏权重（get_rfweight 的默认结果）留在主机上，转为 CSR 后按行取子块
+            weight = weight.tocsr()
+
+        losses = torch.empty(max(n_iter - start, 0), device=self.device)
+        prev = torch.tensor(float(last_loss), device=self.device)  # 上一次检查窗口的最后一个损失
+        perm = torch.randperm(n, generator=generator, device=self.device)
+        pos = 0
+        checked = 0  # 已检查过的损失个数
+        flag = 0
+
+        for k, i_iter in enumerate(range(start, n_iter)):
+
+            if pos + b > n:  # 一轮取完后重新打乱
+                perm = torch.randperm(n, generator=generator, device=self.device)
+                pos = 0
+            idx = perm[pos : pos + b]
+            pos += b
+
+            loss = self._batch_loss(x[idx], y[idx], idx, n, q, tau, weight, leaf, sample_weight)
+            losses[k] = loss.detach()
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            if (k + 1) % check_every == 0 or i_iter == n_iter - 1:
+                window = losses[checked : k + 1]
+                diff = (window - torch.cat([prev.view(1), window[:-1]])).abs()
+                iters = torch.arange(start + checked, i_iter + 1, device=self.device)
+                hit = torch.nonzero((diff <= tol) & (iters >= 100))
+                prev = window[-1]
+                checked = k + 1
+
+                if len(hit) > 0:
+                    j = int(hit[0])
+                    if verbose:
+                        print(
+                            "Algorithm converges for RWN model at iter {}, loss: {}.".format(
+                                i_iter + 1 - len(window) + j, float(window[j])
+                            )
+                        )
+                    flag = 1
+                    self.converged_ = True
+                    break
+
+        self.loss_count.extend(losses[:checked].tolist())
+        self.n_iter_ = start + checked
+
+        return flag
+
+    def predict(self, x_new):
+
+        x_new = x_new.to(self.device)
+        if not isinstance(x_new, torch.Tensor):  # 窗口视图（dataloader.WindowView）在预测时一次取出
+            x_new = x_new[:]
+        x_new = x_new.reshape(-1, 1) if x_new.ndim == 1 else x_new
+
+        self.fnet.to(self.device)
+
+        with torch.no_grad():
+            y_pred = self.fnet(x_new)
+
+        if self.multi:
+            return y_pred.cpu().numpy()  # shape (m, 分位数个数)
+
+        return y_pred.cpu().numpy().ravel()
+
+    def predict_derivative(self, x_new):
+
+        x_new = x_new.to(self.device)
+        x_new = x_new.reshape(-1, 1) if x_new.ndim == 1 else x_new
+
+        return self.dnet.cpu()(x_new).data.numpy()
+
+    def quantile_loss(self, y_pred, y_true, q):
+        errors = y_true - y_pred.detach()
+        max_errors = torch.max(q * errors, (q - 1) * errors)
+        return max_errors
@@ -0,0 +1,6 @@
+# 各实验脚本（LSTM/lstm_train.py、QRF/qrf改进.py、experiment）共用的模块：
+# - 数据读取与预处理：market、ingest、feature_store、garch、data、data1、dataloader、dataloader1
+# - QWLSTM 模型：QWLSTMModel、population、panel、checkpoint
+# - 滚动预测与回测：backtest、rolling_forest、var_backtest
+# - 调参：parallel_tuner、trial_cache、rf_cache、asha
+# 在仓库根目录下运行脚本，如 python -m LSTM.lstm_train，使 common 可以导入
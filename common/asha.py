@@ -0,0 +1,110 @@
+# 异步逐次减半（ASHA）：贝叶斯优化的试验按递增的迭代预算分级训练，表现落后的试验提前终止
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+
+class ASHAScheduler:
+
+    def __init__(self, min_iter: int = 100, max_iter: int = 2000, eta: int = 3, path: str = None):
+        """异步逐次减半调度器
+
+        试验在预算 min_iter, min_iter*eta, min_iter*eta^2, ... 处各有一级（rung），
+        到达某一级时与所有已到达该级的试验比较验证损失，只有排在前 1/eta 的试验才继续训练。
+        不需要等待同一级的其它试验，先到的试验按当时已有的结果判断。
+
+        各级结果保存在 SQLite 中，并行贝叶斯优化的多个工作进程共用同一份记录：
+        调度器只保存路径，可以随目标函数（functools.partial）传给工作进程。每次调优应新建一个调度器，
+        结束后调用 remove 删除记录，避免下一次调优沿用上一次的结果。
+
+        Args:
+            min_iter (int, optional): 第一级的迭代次数. Defaults to 100.
+            max_iter (int, optional): 最大迭代次数，预算不超过该值. Defaults to 2000.
+            eta (int, optional): 每级保留的比例为 1/eta，预算按 eta 倍增长. Defaults to 3.
+            path (str, optional): 数据库文件路径，None 时使用临时文件. Defaults to None.
+        """
+        if eta < 2:
+            raise ValueError("eta must be at least 2")
+
+        self.min_iter = min_iter
+        self.max_iter = max_iter
+        self.eta = eta
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="asha_", suffix=".sqlite")
+            os.close(fd)
+        self.path = path
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rungs (rung INTEGER, loss REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS rungs_rung ON rungs (rung)")
+
+    def _connect(self):
+
+        return sqlite3.connect(self.path, timeout=30)
+
+    def budgets(self, n_iter: int):
+        """一个试验的各级预算
+
+        Args:
+            n_iter (int): 该试验的完整迭代次数
+
+        Returns:
+            list: 递增的迭代次数，最后一项为 min(n_iter, max_iter)
+        """
+        n_iter = min(int(n_iter), self.max_iter)
+
+        budgets = []
+        budget = self.min_iter
+        while budget < n_iter:
+            budgets.append(budget)
+            budget *= self.eta
+        budgets.append(n_iter)
+
+        return budgets
+
+    def report(self, rung: int, loss: float):
+        """登记试验在第 rung 级的验证损失，并判断是否继续训练
+
+        按 (损失, 登记顺序) 排名，损失相同时先登记的试验靠前，每级晋级的试验不超过已登记数量的 1/eta。
+
+        Args:
+            rung (int): 级别，从 0 开始
+            loss (float): 验证损失，越小越好
+
+        Returns:
+            bool: True 表示晋级（继续训练），False 表示终止
+        """
+        loss = float(loss)
+        with closing(self._connect()) as conn, conn:
+            trial = conn.execute("INSERT INTO rungs (rung, loss) VALUES (?, ?)", (rung, loss)).lastrowid
+            total, rank = conn.execute(
+                "SELECT COUNT(*), SUM(loss < ? OR (loss = ? AND rowid < ?)) FROM rungs WHERE rung = ?",
+                (loss, loss, trial, rung),
+            ).fetchone()
+
+        # 不足 eta 个结果时只有目前最好的试验晋级
+        k = max(total // self.eta, 1)
+
+        return rank < k
+
+    def worst(self, rung: int):
+        """第 rung 级已登记的最大验证损失，没有记录时为 None
+
+        Args:
+            rung (int): 级别
+
+        Returns:
+            float: 最大验证损失
+        """
+        with closing(self._connect()) as conn:
+            (loss,) = conn.execute("SELECT MAX(loss) FROM rungs WHERE rung = ?", (rung,)).fetchone()
+
+        return loss
+
+    def remove(self):
+        """删除保存各级结果的数据库文件，调优结束后调用"""
+        for path in (self.path, self.path + "-journal"):
+            if os.path.exists(path):
+                os.remove(path)
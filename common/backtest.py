@@ -0,0 +1,169 @@
+# 滚动向前预测的并行引擎：把窗口分块交给进程池，数据通过共享内存传给工作进程
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import torch
+from threadpoolctl import threadpool_limits
+
+_shared = {}  # 工作进程中挂载的共享数组
+
+
+def limit_threads(n_threads: int = 1):
+    """限制当前进程中 torch 与 sklearn/BLAS/OpenMP 的线程数，避免多进程时线程过量争抢
+
+    Args:
+        n_threads (int, optional): 线程数. Defaults to 1.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(n_threads)
+
+    torch.set_num_threads(n_threads)
+    threadpool_limits(n_threads)
+
+
+def window_seed(seed: int, i: int):
+    """第 i 个窗口的随机种子，只由 seed 与 i 决定，与分块方式和工作进程无关
+
+    Args:
+        seed (int): 全局种子
+        i (int): 窗口下标
+
+    Returns:
+        int: 窗口种子
+    """
+    return int(np.random.SeedSequence([seed, i]).generate_state(1)[0])
+
+
+def share_array(arr: np.ndarray):
+    """把数组复制到一块共享内存中
+
+    Args:
+        arr (np.ndarray): 数组
+
+    Returns:
+        tuple: (SharedMemory, (name, shape, dtype))，后者用于在工作进程中挂载
+    """
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _init_worker(specs, n_threads):
+
+    limit_threads(n_threads)
+
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        arr.flags.writeable = False
+        _shared[key] = (shm, arr)
+
+
+def retrain_blocks(n_steps: int, block_size: int = 1):
+    """把滚动预测的各步按重新训练的间隔分块
+
+    第 i 步的训练窗口为样本 [i, i + input_size)，查询样本为紧随其后的第 i + input_size 个样本。
+    块 [s, e) 只在第 s 步训练一次，块内各步的查询样本 s + input_size, ..., e - 1 + input_size
+    都在训练窗口之后，一次批量前向（或一次 rf.predict）完成预测。
+
+    Args:
+        n_steps (int): 滚动预测的步数
+        block_size (int, optional): 每块的步数，1 表示每步重新训练. Defaults to 1.
+
+    Returns:
+        list: 每块的步下标 range
+    """
+    return [range(s, min(s + block_size, n_steps)) for s in range(0, n_steps, block_size)]
+
+
+def block_indices(block: range, input_size: int):
+    """一块的训练窗口与查询样本的下标，样本按时间顺序排列
+
+    Args:
+        block (range): 一块的步下标，见 retrain_blocks
+        input_size (int): 滚动窗口包含的样本数
+
+    Returns:
+        tuple: (train, queries)，train 为 [block.start, block.start + input_size)，
+            queries 为 [block.start + input_size, block.stop + input_size)，即块内第 k 步预测的样本
+    """
+    train = np.arange(block.start, block.start + input_size)
+    queries = np.arange(block.start + input_size, block.stop + input_size)
+
+    return train, queries
+
+
+def _run_chunk(step_fn, blocks, seed):
+
+    X = _shared["X"][1]
+    Y = _shared["Y"][1]
+
+    return [(block, step_fn(X, Y, block, window_seed(seed, block.start))) for block in blocks]
+
+
+def walk_forward(
+    step_fn,
+    X: np.ndarray,
+    Y: np.ndarray,
+    n_steps: int,
+    n_workers: int = None,
+    chunk_size: int = None,
+    seed: int = 0,
+    n_threads: int = None,
+    block_size: int = 1,
+):
+    """并行滚动向前预测
+
+    各窗口之间相互独立（不热启动）时，按 retrain_blocks 分块，再把若干块交给 ProcessPoolExecutor，
+    结果按下标放回。
+
+    Args:
+        step_fn (callable): step_fn(X, Y, block, seed) -> np.ndarray，block 为一块的步下标 range，
+            在第 block.start 步的窗口上训练一次并批量预测块内各步，返回 shape (len(block),) 或 (len(block), k)；
+            必须是模块级函数（或其 functools.partial）以便传给工作进程
+        X (np.ndarray): 全部输入，以只读共享内存的形式传给工作进程
+        Y (np.ndarray): 全部标签，同上
+        n_steps (int): 窗口数量
+        n_workers (int, optional): 进程数. Defaults to os.cpu_count().
+        chunk_size (int, optional): 每次提交给进程池的块数. Defaults to 每个进程约 4 次.
+        seed (int, optional): 全局种子，块的种子由 window_seed(seed, block.start) 得到. Defaults to 0.
+        n_threads (int, optional): 每个进程的线程数. Defaults to cpu_count // n_workers.
+        block_size (int, optional): 每块的步数，见 retrain_blocks. Defaults to 1.
+
+    Returns:
+        np.ndarray: shape (n_steps,)，step_fn 返回数组（如多个分位数）时为 (n_steps, k)
+    """
+    blocks = retrain_blocks(n_steps, block_size)
+    n_workers = n_workers or os.cpu_count()
+    chunk_size = chunk_size or max(1, math.ceil(len(blocks) / (n_workers * 4)))
+    n_threads = n_threads or max(1, os.cpu_count() // n_workers)
+
+    chunks = [blocks[s : s + chunk_size] for s in range(0, len(blocks), chunk_size)]
+
+    shm_x, spec_x = share_array(X)
+    shm_y, spec_y = share_array(Y)
+
+    Y_pred = None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=({"X": spec_x, "Y": spec_y}, n_threads),
+        ) as executor:
+            futures = [executor.submit(_run_chunk, step_fn, chunk, seed) for chunk in chunks]
+            for k, future in enumerate(futures):
+                for block, y in future.result():
+                    if Y_pred is None:
+                        Y_pred = np.empty((n_steps,) + np.shape(y)[1:])
+                    Y_pred[block.start : block.stop] = y
+                print(f"{k + 1}/{len(chunks)} chunks finished!")
+    finally:
+        for shm in (shm_x, shm_y):
+            shm.close()
+            shm.unlink()
+
+    return np.empty(0) if Y_pred is None else Y_pred
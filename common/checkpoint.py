@@ -0,0 +1,195 @@
+# 模型检查点：一个目录中保存 fnet 参数、优化器状态、QWLSTMModel 配置、归一化器、GARCH 参数与可选的随机森林（或其叶子编号矩阵），
+# 预测进程直接加载即可预测，不必重新拟合 GARCH、归一化、随机森林与 LSTM；大数组以内存映射方式读取
+import json
+import os
+import numpy as np
+import torch
+from .QWLSTMModel import LSTMModel, QWLSTMModel
+from .feature_store import scaler_arrays, load_scaler
+
+FORMAT = "qwlstm-checkpoint"
+VERSION = 1  # 格式变化时递增，load_checkpoint 拒绝读取更高版本的检查点
+
+
+def save_checkpoint(
+    path: str,
+    model: QWLSTMModel,
+    scaler_x=None,
+    scaler_y=None,
+    garch=None,
+    forest=None,
+    leaf=None,
+    metadata: dict = None,
+):
+    """保存检查点
+
+    目录中的文件：meta.json（格式、版本、模型配置、GARCH 参数）、fnet.pt（state_dict）、
+    optimizer.pt（Adam 的 state_dict，加载后 warm_start 沿用动量继续训练）、
+    scalers.npz、leaf.npy、forest.joblib，后三个按需写入。meta.json 最后写入，
+    存在即表示检查点完整；重复保存到同一目录时以 meta.json 中登记的文件为准。
+
+    Args:
+        path (str): 检查点目录
+        model (QWLSTMModel): 已训练的模型
+        scaler_x (MinMaxScaler, optional): 特征的归一化器. Defaults to None.
+        scaler_y (MinMaxScaler, optional): 标签的归一化器. Defaults to None.
+        garch (OnlineGarch | dict, optional): GARCH 模型（保存 state()）或参数字典. Defaults to None.
+        forest (RandomForestQuantileRegressor, optional): 随机森林，用 joblib 保存. Defaults to None.
+        leaf (np.ndarray, optional): 叶子编号矩阵 rf.apply(x). Defaults to None.
+        metadata (dict, optional): 其他信息（数据集、超参数等），需可 JSON 序列化. Defaults to None.
+    """
+    if getattr(model, "fnet", None) is None:
+        raise ValueError("model must be fitted before saving a checkpoint")
+
+    os.makedirs(path, exist_ok=True)
+    files = ["fnet.pt"]
+
+    torch.save({name: t.detach().cpu() for name, t in model.fnet.state_dict().items()}, os.path.join(path, "fnet.pt"))
+
+    optimizer = getattr(model, "optimizer", None)
+    if optimizer is not None:
+        torch.save(_to_cpu(optimizer.state_dict()), os.path.join(path, "optimizer.pt"))
+        files.append("optimizer.pt")
+
+    arrays = {}
+    for name, scaler in (("scaler_x", scaler_x), ("scaler_y", scaler_y)):
+        if scaler is not None:
+            arrays.update(scaler_arrays(name, scaler))
+    if arrays:
+        np.savez(os.path.join(path, "scalers.npz"), **arrays)
+        files.append("scalers.npz")
+
+    if leaf is not None:
+        np.save(os.path.join(path, "leaf.npy"), np.asarray(leaf))
+        files.append("leaf.npy")
+
+    if forest is not None:
+        import joblib
+
+        joblib.dump(forest, os.path.join(path, "forest.joblib"))
+        files.append("forest.joblib")
+
+    meta = {
+        "format": FORMAT,
+        "version": VERSION,
+        "config": {
+            "hs": model.hs,
+            "quantile": model.quantiles.tolist() if model.multi else float(model.quantiles[0]),
+            "dropout": model.dropout,
+            "num_layers": model.num_layers,
+            "crossing": model.crossing,
+            "n_assets": model.n_assets,
+            "embed_dim": model.embed_dim,
+            "input_size": model.fnet.input_size,
+        },
+        "garch": garch.state() if hasattr(garch, "state") else garch,
+        "files": files,
+        "metadata": metadata or {},
+    }
+
+    tmp = os.path.join(path, f"meta.json.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def _to_cpu(state):
+    # 优化器 state_dict 中的张量移到 cpu，其余内容不变
+    if isinstance(state, torch.Tensor):
+        return state.detach().cpu()
+    if isinstance(state, dict):
+        return {key: _to_cpu(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(_to_cpu(value) for value in state)
+
+    return state
+
+
+def load_checkpoint(path: str, device="cpu", mmap: bool = True, load_forest: bool = True):
+    """加载检查点
+
+    fnet 的参数以内存映射方式读取（torch.load(mmap=True)）并直接作为模型参数，
+    模型先在 meta 设备上构造，不做随机初始化；叶子编号矩阵与随机森林中的数组同样以内存映射方式读取。
+
+    Args:
+        path (str): 检查点目录
+        device (str, optional): 模型所在设备. Defaults to "cpu".
+        mmap (bool, optional): 是否以内存映射方式读取. Defaults to True.
+        load_forest (bool, optional): 是否加载随机森林. Defaults to True.
+
+    Returns:
+        dict: model（可直接 predict，也可以 warm_start 继续训练，保存了优化器状态时沿用 Adam 的动量）、scaler_x、scaler_y、
+            garch（参数字典，可用 garch.OnlineGarch.from_state 恢复）、forest、leaf、metadata，没有保存的项为 None
+    """
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+
+    if meta.get("format") != FORMAT:
+        raise ValueError(f"{path!r} is not a {FORMAT}")
+    if meta["version"] > VERSION:
+        raise ValueError(f"Checkpoint version {meta['version']} is newer than the supported version {VERSION}")
+
+    config = meta["config"]
+    files = set(meta["files"])
+
+    model = QWLSTMModel(
+        hs=config["hs"],
+        quantile=config["quantile"],
+        dropout=config["dropout"],
+        num_layers=config["num_layers"],
+        device=device,
+        crossing=config["crossing"],
+        n_assets=config["n_assets"],
+        embed_dim=config["embed_dim"],
+    )
+    with torch.device("meta"):
+        model.fnet = LSTMModel(
+            config["input_size"],
+            config["hs"],
+            config["num_layers"],
+            len(model.quantiles),
+            config["dropout"],
+            n_assets=config["n_assets"],
+            embed_dim=config["embed_dim"],
+        )
+    state = torch.load(os.path.join(path, "fnet.pt"), map_location="cpu", mmap=mmap, weights_only=True)
+    model.fnet.load_state_dict(state, assign=True)
+    model.fnet.to(model.device)
+
+    # 与 fit 之后的状态一致，便于 warm_start / resume 继续训练；没有保存优化器状态的检查点从新的 Adam 开始
+    model.optimizer = torch.optim.Adam(model.fnet.parameters())
+    if "optimizer.pt" in files:
+        model.optimizer.load_state_dict(
+            torch.load(os.path.join(path, "optimizer.pt"), map_location=model.device, weights_only=True)
+        )
+    model.loss_count = []
+    model.n_iter_ = 0
+    model.converged_ = False
+
+    result = {
+        "model": model,
+        "scaler_x": None,
+        "scaler_y": None,
+        "garch": meta["garch"],
+        "forest": None,
+        "leaf": None,
+        "metadata": meta["metadata"],
+    }
+
+    if "scalers.npz" in files:
+        with np.load(os.path.join(path, "scalers.npz")) as f:
+            arrays = {name: f[name] for name in f.files}
+        for name in ("scaler_x", "scaler_y"):
+            if f"{name}_min_" in arrays:
+                result[name] = load_scaler(arrays, name)
+
+    if "leaf.npy" in files:
+        result["leaf"] = np.load(os.path.join(path, "leaf.npy"), mmap_mode="r" if mmap else None)
+
+    if load_forest and "forest.joblib" in files:
+        import joblib
+
+        # quantile_forest 要求可写的数组，使用写时复制的内存映射
+        result["forest"] = joblib.load(os.path.join(path, "forest.joblib"), mmap_mode="c" if mmap else None)
+
+    return result
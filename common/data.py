@@ -0,0 +1,13 @@
+# 加载数据到内存当中，并做第一步处理
+# 兼容旧的 from common.data import X, Y：首次访问时才调用 load_market("sp500")，导入模块本身不读取数据
+from .market import load_market
+
+_NAMES = ("X", "Y", "log_return", "volatility", "scaler_x", "scaler_y")
+
+
+def __getattr__(name):
+
+    if name not in _NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return load_market("sp500")[name]
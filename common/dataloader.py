@@ -0,0 +1,366 @@
+# 将数据进一步处理
+# 导入模块时不读取数据；load_windows 调用时才加载并缓存，
+# 旧的 from common.dataloader import X_train, ..., device 在首次访问时才触发加载
+import hashlib
+import os
+from functools import lru_cache
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import torch
+from .market import load_market
+
+MARKET = "sp500"  # 模块级旧接口使用的数据集
+_SPLITS = ("X_train", "Y_train", "X_test", "Y_test", "X_val", "Y_val")
+
+
+@lru_cache(maxsize=None)
+def default_device():
+    """默认设备：有 GPU 时用 cuda，否则用 cpu，首次调用时打印设备信息
+
+    Returns:
+        torch.device: 设备
+    """
+    print("CUDA Available:", torch.cuda.is_available())
+    if torch.cuda.is_available():
+        print("GPU Name:", torch.cuda.get_device_name(0))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print("Using device:", device)
+
+    return device
+
+
+def sliding_window(X: np.ndarray, Y: np.ndarray, step: int = 30):
+    """滑动窗口，第 i 个样本为 X[i:i + step]，目标为 Y[i + step, 0]
+
+    基于 sliding_window_view，窗口之间共享 X 的内存，不复制数据。
+
+    Args:
+        X (np.ndarray): 特征，shape (T, features)
+        Y (np.ndarray): 标签，shape (T, 1)
+        step (int, optional): 窗口长度. Defaults to 30.
+
+    Returns:
+        tuple: x 为只读视图，shape (T - step, step, features)；y 为对齐的标签，shape (T - step,)
+    """
+    if len(X) != len(Y):
+        raise IndexError
+    x = sliding_window_view(X, step, axis=0)[:-1].swapaxes(1, 2)
+    y = Y[step:, 0]
+
+    return x, y
+
+def flatten(X: np.ndarray):
+    """将第二个维度和第三个维度进行压缩，用于随机森林
+
+    连续存储的数组或张量直接返回视图；滑动窗口视图无法原地展平，
+    只有这时才复制出随机森林需要的连续数组。
+
+    Args:
+        X (np.ndarray): 模型输入
+
+    Returns:
+        np.ndarray: 展平后的数组
+    """
+    return X.reshape(X.shape[0], -1)
+
+
+def split_dataset(x, y):
+    """两次拆分，获得 训练集、测试集、验证集 7:2:1
+
+    Args:
+        x (np.ndarray): 滑动窗口样本
+        y (np.ndarray): 对齐的标签
+
+    Returns:
+        dict: X_train, Y_train, X_test, Y_test, X_val, Y_val
+    """
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_temp, Y_train, Y_temp = train_test_split(x, y, test_size=0.3, random_state=42)
+    X_test, X_val, Y_test, Y_val = train_test_split(X_temp, Y_temp, test_size=1/3, random_state=42)
+
+    return dict(X_train=X_train, Y_train=Y_train, X_test=X_test, Y_test=Y_test, X_val=X_val, Y_val=Y_val)
+
+
+class WindowDataset:
+
+    def __init__(self, features: np.ndarray, targets: np.ndarray, step: int = 30):
+        """滑动窗口数据集
+
+        所有窗口都是同一个特征数组上的跨步视图，训练集、验证集、测试集只保存窗口下标，
+        共用同一份存储；只有 x、y 取出一组窗口时才复制这些窗口。
+
+        Args:
+            features (np.ndarray): 特征，shape (T, features)，可以是内存映射或共享内存上的只读数组
+            targets (np.ndarray): 标签，shape (T,)
+            step (int, optional): 窗口长度. Defaults to 30.
+        """
+        self.step = step
+        self.features = features
+        self.targets = targets
+        # 第 i 个窗口为 features[i:i + step]，目标为 targets[i + step]，同 sliding_window
+        self.windows = sliding_window_view(self.features, step, axis=0)[:-1].swapaxes(1, 2)
+
+    def __len__(self):
+
+        return len(self.windows)
+
+    @classmethod
+    def open(cls, path: str, step: int = 30):
+        """以内存映射方式打开 save 写入的特征数组，按需从磁盘读取
+
+        Args:
+            path (str): .npy 文件路径
+            step (int, optional): 窗口长度. Defaults to 30.
+
+        Returns:
+            WindowDataset: 数据集
+        """
+        data = np.load(path, mmap_mode="r")  # 最后一列为标签
+
+        return cls(data[:, :-1], data[:, -1], step)
+
+    @staticmethod
+    def save(path: str, X: np.ndarray, Y: np.ndarray):
+        """把特征与标签合并为一个 float32 数组写入 .npy，先写临时文件再改名
+
+        Args:
+            path (str): .npy 文件路径
+            X (np.ndarray): 特征，shape (T, features)
+            Y (np.ndarray): 标签，shape (T, 1)
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        # 直接写入内存映射的 .npy，不在内存中拼接出合并后的副本
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(X), np.shape(X)[1] + 1))
+        out[:, :-1] = X
+        out[:, -1] = np.ravel(Y)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+
+    def x(self, idx):
+        """取出一组窗口
+
+        Args:
+            idx (np.ndarray | slice): 窗口下标
+
+        Returns:
+            np.ndarray: 新的连续 float32 数组，shape (len(idx), step, features)
+        """
+        return np.array(self.windows[idx], dtype=np.float32, order="C")
+
+    def y(self, idx):
+        """取出一组窗口的目标
+
+        Args:
+            idx (np.ndarray | slice): 窗口下标
+
+        Returns:
+            np.ndarray: 新的 float32 数组，shape (len(idx),)
+        """
+        return np.array(self.targets[self.step:][idx], dtype=np.float32)
+
+    def view(self, idx, device=None):
+        """一组窗口的惰性视图，训练时只复制每个 batch 的窗口
+
+        Args:
+            idx (np.ndarray): 窗口下标
+            device (torch.device, optional): 取出的张量所在设备. Defaults to "cpu".
+
+        Returns:
+            WindowView: 视图
+        """
+        return WindowView(self, idx, device)
+
+    def split(self):
+        """7:2:1 拆分的窗口下标，与 split_dataset 拆分窗口数组的结果一一对应
+
+        Returns:
+            dict: train、test、val 的下标
+        """
+        index = np.arange(len(self))
+        splits = split_dataset(index, index)
+
+        return {name: splits[f"Y_{name}"] for name in ("train", "test", "val")}
+
+
+class WindowView:
+
+    def __init__(self, dataset: WindowDataset, idx: np.ndarray, device=None):
+        """WindowDataset 中一组窗口的惰性视图，可代替 (n, step, features) 的输入张量传给 QWLSTMModel.fit
+
+        只保存窗口下标，按下标取值时才从数据集复制对应的窗口，得到 float32 张量；
+        训练时每个 batch 只复制 batch 内的窗口，不会一次展开全部 step 倍的样本。
+
+        Args:
+            dataset (WindowDataset): 数据集
+            idx (np.ndarray): 窗口下标
+            device (torch.device, optional): 取出的张量所在设备. Defaults to "cpu".
+        """
+        self.dataset = dataset
+        self.idx = np.asarray(idx)
+        self.device = torch.device("cpu") if device is None else torch.device(device)
+
+    @property
+    def shape(self):
+
+        return (len(self.idx), self.dataset.step, self.dataset.features.shape[1])
+
+    @property
+    def ndim(self):
+
+        return 3
+
+    def __len__(self):
+
+        return len(self.idx)
+
+    def to(self, device):
+        """同一组窗口，取出的张量位于 device
+
+        Returns:
+            WindowView: 新的视图
+        """
+        return WindowView(self.dataset, self.idx, device)
+
+    def __getitem__(self, key):
+        """取出视图中的部分窗口
+
+        Args:
+            key (np.ndarray | torch.Tensor | slice | int): 视图内的下标，可以是多维下标，
+                如 QWLSTMPopulation 的 (K, batch)
+
+        Returns:
+            torch.Tensor: shape key.shape + (step, features)
+        """
+        if isinstance(key, torch.Tensor):
+            key = key.cpu().numpy()
+
+        return torch.from_numpy(self.dataset.x(self.idx[key])).to(self.device)
+
+    def numpy(self):
+        """全部窗口的连续数组，用于随机森林等需要完整输入的场合
+
+        Returns:
+            np.ndarray: shape (len(self), step, features)
+        """
+        return self.dataset.x(self.idx)
+
+
+@lru_cache(maxsize=None)
+def window_dataset(
+    market: str = MARKET,
+    step: int = 30,
+    cache_dir: str = "window_store",
+    online_initial: int = None,
+    refit_every: int = 250,
+    chunk_rows: int = 2**16,
+):
+    """市场数据的滑动窗口数据集，特征数组写入 cache_dir 后以内存映射方式打开
+
+    文件名包含在线 GARCH 的配置与数组内容的摘要，数据或预处理变化时写入新文件；不同窗口长度共用同一个文件。
+
+    Args:
+        market (str, optional): 数据集名称，见 market.load_market. Defaults to MARKET.
+        step (int, optional): 窗口长度. Defaults to 30.
+        cache_dir (str, optional): 特征数组所在目录. Defaults to "window_store".
+        online_initial (int, optional): 设置后波动率由在线 GARCH 逐条递推，不使用未来数据，
+            见 market.load_market；None 时在全部样本上拟合 GARCH. Defaults to None.
+        refit_every (int, optional): 在线 GARCH 重新估计参数的间隔. Defaults to 250.
+        chunk_rows (int, optional): 计算摘要时每次读取的行数. Defaults to 2**16.
+
+    Returns:
+        WindowDataset: 数据集
+    """
+    # 不经过 load_market 的进程内缓存：写完窗口文件后特征数组即可释放，之后只通过内存映射读取
+    data = load_market.__wrapped__(market, online_initial, refit_every)
+
+    # 分块计算摘要，不复制整个数组
+    h = hashlib.sha1()
+    for array in (data["X"], data["Y"]):
+        for start in range(0, len(array), chunk_rows):
+            h.update(np.ascontiguousarray(array[start : start + chunk_rows], dtype=np.float32))
+
+    garch = "full" if online_initial is None else f"online{online_initial}-{refit_every}"
+    path = os.path.join(cache_dir, f"{market}-{garch}-{h.hexdigest()[:16]}.npy")
+    if not os.path.exists(path):
+        WindowDataset.save(path, data["X"], data["Y"])
+
+    return WindowDataset.open(path, step)
+
+
+@lru_cache(maxsize=None)
+def load_windows(market: str = MARKET, step: int = 30, device=None, online_initial: int = None, refit_every: int = 250):
+    """滑动窗口样本与 7:2:1 拆分，首次调用时才加载数据，结果缓存
+
+    Args:
+        market (str, optional): 数据集名称，见 market.load_market. Defaults to MARKET.
+        step (int, optional): 窗口长度. Defaults to 30.
+        device (torch.device, optional): 张量所在设备. Defaults to default_device().
+        online_initial (int, optional): 在线 GARCH 的初始样本数，见 window_dataset. Defaults to None.
+        refit_every (int, optional): 在线 GARCH 重新估计参数的间隔. Defaults to 250.
+
+    Returns:
+        dict: X_train, X_test, X_val 为窗口视图（WindowView，训练时按 batch 取出窗口），
+            Y_train, Y_test, Y_val 为张量
+    """
+    device = default_device() if device is None else device
+    dataset = window_dataset(market, step, online_initial=online_initial, refit_every=refit_every)
+
+    windows = {}
+    for name, idx in dataset.split().items():
+        windows[f"X_{name}"] = dataset.view(idx, device)
+        windows[f"Y_{name}"] = torch.from_numpy(dataset.y(idx)).to(device)
+
+    return windows
+
+
+@lru_cache(maxsize=None)
+def panel_windows(markets: tuple, step: int = 30, device=None):
+    """面板数据：每个资产单独构造滑动窗口并 7:2:1 拆分，再按集合合并
+
+    窗口不会跨越两个资产。每个样本在最后追加一个特征，为资产编号（在 markets 中的下标），
+    各时间步相同，供 QWLSTMModel(n_assets=len(markets)) 的资产嵌入使用；训练时随机抽取的 batch 混合了各个资产。
+    各资产的特征数必须相同，新的资产可以加入 market.MARKETS（source 可以是绝对路径）。
+
+    Args:
+        markets (tuple): 资产（数据集）名称
+        step (int, optional): 窗口长度. Defaults to 30.
+        device (torch.device, optional): 张量所在设备. Defaults to default_device().
+
+    Returns:
+        dict: X_train, Y_train, A_train, X_test, Y_test, A_test, X_val, Y_val, A_val 张量，A_* 为资产编号
+    """
+    device = default_device() if device is None else device
+    datasets = [window_dataset(market, step) for market in markets]
+
+    if len({dataset.features.shape[1] for dataset in datasets}) > 1:
+        raise ValueError("All markets in a panel must have the same number of features")
+
+    parts = {}
+    for a, dataset in enumerate(datasets):
+        for name, idx in dataset.split().items():
+            x = dataset.x(idx)
+            x = np.concatenate([x, np.full(x.shape[:2] + (1,), a, dtype=np.float32)], axis=2)
+            parts.setdefault(name, []).append((x, dataset.y(idx), np.full(len(idx), a)))
+
+    tensors = {}
+    for name, chunks in parts.items():
+        xs, ys, assets = zip(*chunks)
+        tensors[f"X_{name}"] = torch.from_numpy(np.concatenate(xs)).to(device)
+        tensors[f"Y_{name}"] = torch.from_numpy(np.concatenate(ys)).to(device)
+        tensors[f"A_{name}"] = torch.from_numpy(np.concatenate(assets)).to(device)
+
+    return tensors
+
+
+def __getattr__(name):
+
+    if name == "device":
+        return default_device()
+    if name in _SPLITS:
+        value = load_windows(MARKET)[name]
+        return value[:] if isinstance(value, WindowView) else value  # 旧接口返回完整的张量
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
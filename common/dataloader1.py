@@ -0,0 +1,16 @@
+# 将数据进一步处理（上证指数），接口与 dataloader 相同
+from .dataloader import sliding_window, flatten, default_device, load_windows, WindowView
+
+MARKET = "shangzheng"  # 模块级旧接口使用的数据集
+_SPLITS = ("X_train", "Y_train", "X_test", "Y_test", "X_val", "Y_val")
+
+
+def __getattr__(name):
+
+    if name == "device":
+        return default_device()
+    if name in _SPLITS:
+        value = load_windows(MARKET)[name]
+        return value[:] if isinstance(value, WindowView) else value  # 旧接口返回完整的张量
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
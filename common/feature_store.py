@@ -0,0 +1,118 @@
+# 特征仓库：对数收益率、GARCH 波动率、归一化后的 X/Y 与归一化参数保存为 .npz，
+# 源数据文件与预处理配置都不变时直接读取，不再重新拟合 GARCH 与归一化
+import hashlib
+import json
+import os
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+_SCALER_ATTRS = ("min_", "scale_", "data_min_", "data_max_", "data_range_", "n_samples_seen_", "feature_range")
+
+
+def file_hash(path: str, chunk_size: int = 2**20):
+    """文件内容的 sha1 摘要
+
+    Args:
+        path (str): 文件路径
+        chunk_size (int, optional): 每次读取的字节数. Defaults to 1MB.
+
+    Returns:
+        str: sha1 摘要
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def scaler_arrays(name: str, scaler: MinMaxScaler):
+    """把已拟合的 MinMaxScaler 的参数转为数组，用于写入特征仓库
+
+    Args:
+        name (str): 名称前缀，如 "scaler_x"
+        scaler (MinMaxScaler): 已拟合的归一化器
+
+    Returns:
+        dict: {f"{name}_{属性}": 数组}
+    """
+    return {f"{name}_{attr}": np.asarray(getattr(scaler, attr)) for attr in _SCALER_ATTRS}
+
+
+def load_scaler(arrays: dict, name: str):
+    """由 scaler_arrays 保存的参数恢复 MinMaxScaler，transform 与 inverse_transform 的结果与原归一化器相同
+
+    Args:
+        arrays (dict): 特征仓库中的数组
+        name (str): 名称前缀
+
+    Returns:
+        MinMaxScaler: 归一化器
+    """
+    scaler = MinMaxScaler(feature_range=tuple(arrays[f"{name}_feature_range"].tolist()))
+    for attr in _SCALER_ATTRS[:-1]:
+        value = arrays[f"{name}_{attr}"]
+        setattr(scaler, attr, value if value.ndim else value.item())
+    scaler.n_features_in_ = len(scaler.min_)
+
+    return scaler
+
+
+class FeatureStore:
+
+    def __init__(self, cache_dir: str = "feature_store"):
+        """预处理特征的磁盘缓存，每个键对应 cache_dir 下的一个 .npz 文件
+
+        Args:
+            cache_dir (str, optional): 缓存目录. Defaults to "feature_store".
+        """
+        self.cache_dir = cache_dir
+
+    def key(self, source: str, config: dict):
+        """缓存键：源数据文件内容与预处理配置
+
+        Args:
+            source (str): 源数据文件路径
+            config (dict): 预处理配置（列名、GARCH 阶数、归一化范围等），需可 JSON 序列化
+
+        Returns:
+            str: sha1 摘要
+        """
+        payload = json.dumps([file_hash(source), config], sort_keys=True)
+
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _path(self, key):
+
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key: str):
+        """读取特征
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            dict: {名称: 数组}，未命中时为 None
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as f:
+            return {name: f[name] for name in f.files}
+
+    def save(self, key: str, arrays: dict):
+        """写入特征，先写临时文件再改名，读到的文件总是完整的
+
+        Args:
+            key (str): 缓存键
+            arrays (dict): {名称: 数组}
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
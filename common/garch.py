@@ -0,0 +1,138 @@
+# 在线 GARCH(1,1)：按计划重新估计参数，其余时间只用条件方差递推式逐条更新波动率
+import numpy as np
+from arch import arch_model
+
+
+class OnlineGarch:
+
+    def __init__(self, refit_every: int = 250, window: int = None):
+        """在线 GARCH(1,1) 波动率
+
+        参数由 arch_model(returns, vol='Garch', p=1, q=1) 估计，之后每来一个收益率只做一次
+        sigma2[t+1] = omega + alpha * (r[t] - mu)^2 + beta * sigma2[t] 的 O(1) 递推，
+        每 refit_every 个新观测才重新估计一次参数。t 时刻的波动率只用到 t-1 及以前的数据。
+
+        Args:
+            refit_every (int, optional): 每隔多少个新观测重新估计参数，None 表示不重新估计. Defaults to 250.
+            window (int, optional): 重新估计时使用的最近观测数，None 表示使用全部历史. Defaults to None.
+        """
+        self.refit_every = refit_every
+        self.window = window
+
+    def _estimate(self, returns):
+
+        results = arch_model(returns, vol="Garch", p=1, q=1).fit(disp="off")
+        self.params_ = {
+            "mu": float(results.params["mu"]),
+            "omega": float(results.params["omega"]),
+            "alpha": float(results.params["alpha[1]"]),
+            "beta": float(results.params["beta[1]"]),
+        }
+        self.n_since_fit_ = 0
+
+        sigma = np.asarray(results.conditional_volatility)
+        self._sigma2 = self._next(returns[-1], sigma[-1] ** 2)  # 下一期的条件方差
+
+        return sigma
+
+    def _next(self, r, sigma2):
+
+        p = self.params_
+        eps = r - p["mu"]
+
+        return p["omega"] + p["alpha"] * eps * eps + p["beta"] * sigma2
+
+    def fit(self, returns):
+        """在初始样本上估计参数
+
+        Args:
+            returns (np.ndarray): 收益率，shape (n,)
+
+        Returns:
+            np.ndarray: 初始样本的条件波动率（样本内），shape (n,)
+        """
+        returns = np.asarray(returns, dtype=float).ravel()
+        self.history_ = list(returns)
+
+        return self._estimate(returns)
+
+    def update(self, r: float):
+        """登记一个新的收益率，到达重新估计的间隔时重新估计参数
+
+        Args:
+            r (float): 新的收益率 r[t]
+
+        Returns:
+            float: r[t] 的条件波动率 sigma[t]，只依赖 t-1 及以前的数据
+        """
+        r = float(r)
+        sigma = np.sqrt(self._sigma2)
+
+        self._sigma2 = self._next(r, self._sigma2)
+        self.history_.append(r)
+        self.n_since_fit_ += 1
+
+        if self.refit_every is not None and self.n_since_fit_ >= self.refit_every:
+            history = self.history_[-self.window :] if self.window else self.history_
+            self._estimate(np.asarray(history))
+
+        return sigma
+
+    def forecast(self):
+        """下一期的条件波动率
+
+        Returns:
+            float: sigma[t+1]
+        """
+        return float(np.sqrt(self._sigma2))
+
+    def state(self):
+        """继续递推所需的状态：参数与下一期的条件方差，可 JSON 序列化（用于模型检查点）
+
+        Returns:
+            dict: mu、omega、alpha、beta、sigma2
+        """
+        return {**self.params_, "sigma2": float(self._sigma2)}
+
+    @classmethod
+    def from_state(cls, state: dict, refit_every: int = None, window: int = None):
+        """由 state 恢复，可以直接 update 与 forecast，不再重新估计参数
+
+        恢复后没有历史收益率，设置 refit_every 时只用恢复之后的观测重新估计。
+
+        Args:
+            state (dict): state() 的结果
+            refit_every (int, optional): 同 __init__. Defaults to None.
+            window (int, optional): 同 __init__. Defaults to None.
+
+        Returns:
+            OnlineGarch: 恢复的模型
+        """
+        garch = cls(refit_every=refit_every, window=window)
+        garch.params_ = {name: float(state[name]) for name in ("mu", "omega", "alpha", "beta")}
+        garch._sigma2 = float(state["sigma2"])
+        garch.history_ = []
+        garch.n_since_fit_ = 0
+
+        return garch
+
+
+def online_volatility(returns, initial: int, refit_every: int = 250, window: int = None):
+    """不使用未来数据的波动率序列：前 initial 个观测上估计参数，之后逐条递推
+
+    Args:
+        returns (np.ndarray): 收益率，shape (n,)
+        initial (int): 初始估计的样本数
+        refit_every (int, optional): 同 OnlineGarch. Defaults to 250.
+        window (int, optional): 同 OnlineGarch. Defaults to None.
+
+    Returns:
+        np.ndarray: 条件波动率，shape (n,)；前 initial 个为样本内估计
+    """
+    returns = np.asarray(returns, dtype=float).ravel()
+
+    garch = OnlineGarch(refit_every=refit_every, window=window)
+    head = garch.fit(returns[:initial])
+    tail = [garch.update(r) for r in returns[initial:]]
+
+    return np.concatenate([head, tail])
@@ -0,0 +1,72 @@
+# 原始数据的列式缓存：首次读取 Excel/CSV 时只取需要的列，转为定长数组写入 .npz，之后直接读取缓存；
+# 源文件的修改时间变化后比对内容摘要，内容也变化时自动重建
+import hashlib
+import json
+import os
+import numpy as np
+from .feature_store import file_hash
+
+
+def _read_source(path: str, columns: list):
+
+    import pandas as pd
+
+    if path.endswith((".xlsx", ".xls")):
+        return pd.read_excel(path, engine="openpyxl", usecols=columns)
+
+    return pd.read_csv(path, usecols=columns)
+
+
+def read_columns(path: str, columns: dict, dtypes: dict = None, cache_dir: str = "ingest_cache"):
+    """读取数据文件中的指定列，优先使用列式缓存
+
+    Args:
+        path (str): 源数据文件，.csv 或 .xlsx
+        columns (dict): {源文件列名: 新列名}，只读取这些列
+        dtypes (dict, optional): {新列名: dtype}，未指定的列为 float32. Defaults to None.
+        cache_dir (str, optional): 缓存目录. Defaults to "ingest_cache".
+
+    Returns:
+        pd.DataFrame: 列顺序与 columns 相同
+    """
+    import pandas as pd
+
+    dtypes = {name: np.dtype(dtypes.get(name, np.float32) if dtypes else np.float32).str for name in columns.values()}
+
+    # 缓存文件名包含列的选择与类型，不同的读取方式互不覆盖
+    config = json.dumps([columns, dtypes], sort_keys=True)
+    name = f"{os.path.basename(path)}.{hashlib.sha1(config.encode()).hexdigest()[:12]}.npz"
+    cache = os.path.join(cache_dir, name)
+
+    stat = os.stat(path)
+    arrays = None
+    if os.path.exists(cache):
+        with np.load(cache) as f:
+            arrays = {key: f[key] for key in f.files}
+
+        # 修改时间与大小不变时直接使用；否则比对内容摘要，只是被 touch 过的文件不必重建
+        if (int(arrays["_mtime_ns"]), int(arrays["_size"])) != (stat.st_mtime_ns, stat.st_size):
+            if str(arrays["_sha1"]) == file_hash(path):
+                arrays["_mtime_ns"], arrays["_size"] = np.int64(stat.st_mtime_ns), np.int64(stat.st_size)
+                _save(cache, arrays)
+            else:
+                arrays = None
+
+    if arrays is None:
+        data = _read_source(path, list(columns)).rename(columns=columns)
+        arrays = {new: data[new].to_numpy(dtype=dtypes[new]) for new in columns.values()}
+        arrays["_mtime_ns"], arrays["_size"] = np.int64(stat.st_mtime_ns), np.int64(stat.st_size)
+        arrays["_sha1"] = np.array(file_hash(path))
+        _save(cache, arrays)
+
+    return pd.DataFrame({new: arrays[new] for new in columns.values()})
+
+
+def _save(path: str, arrays: dict):
+
+    # 先写临时文件再改名，读到的文件总是完整的
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
@@ -0,0 +1,178 @@
+# 市场数据集：按名称加载，调用时才读取文件并做第一步处理（对数收益率、GARCH 波动率、归一化），
+# 原始列经 ingest 的列式缓存读取，结果在进程内缓存，并写入特征仓库
+import os
+from functools import lru_cache
+import numpy as np
+
+# 数据文件所在目录（仓库根目录下的 data），source 为绝对路径时不受影响
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+MARKETS = {
+    "sp500": {
+        "source": "sp500_history.csv",
+        "x_columns": ["Open", "High", "Low", "Volume"],
+        "y_column": "Close",
+    },
+    "shangzheng": {
+        "source": "shangzheng.xlsx",
+        "columns": {
+            "涨跌幅(%)_ChgPct": "chgpct",
+            "成交量_TrdVol": "trade",
+            "成交金额(元)_TrdSum": "trdsum",
+            "收盘价(元/点)_ClPr": "close",
+        },
+        "x_columns": ["chgpct", "trade", "trdsum"],
+        "y_column": "close",
+    },
+}
+
+
+def read_market(name: str):
+    """读取原始数据并计算对数收益率
+
+    Args:
+        name (str): 数据集名称
+
+    Returns:
+        dict: X 为原始特征 (pd.DataFrame)，Y 为对数收益率 (pd.DataFrame)，已丢弃第一行对齐
+    """
+    if name not in MARKETS:
+        raise ValueError(f"Unknown market {name!r}, must be one of {sorted(MARKETS)}")
+
+    from .ingest import read_columns
+
+    market = MARKETS[name]
+    columns = market.get("columns") or {c: c for c in market["x_columns"] + [market["y_column"]]}
+    # 特征列以 float32 缓存；收盘价保留 float64，对数收益率不受精度影响
+    data = read_columns(os.path.join(DATA_DIR, market["source"]), columns, dtypes={market["y_column"]: np.float64})
+    X = data[market["x_columns"]]
+    Y = data[[market["y_column"]]]
+
+    y_log = np.log(Y / Y.shift(1))
+    Y = y_log.dropna()
+
+    # 丢弃 X 的第一行，使其长度与收益率一致
+    X = X.iloc[1:].copy()
+
+    return {"X": X, "Y": Y}
+
+
+def fit_volatility(Y, garch: dict = None, online_garch: dict = None):
+    """GARCH 条件波动率
+
+    Args:
+        Y (pd.DataFrame): 对数收益率
+        garch (dict, optional): arch_model 参数. Defaults to {"vol": "Garch", "p": 1, "q": 1}.
+        online_garch (dict, optional): 设置后用 garch.online_volatility 逐条递推，
+            如 {"initial": 1000, "refit_every": 250}. Defaults to None.
+
+    Returns:
+        np.ndarray: 条件波动率，shape (T,)
+    """
+    if online_garch is not None:
+        from .garch import online_volatility
+
+        return online_volatility(Y.values, **online_garch)
+
+    from arch import arch_model
+
+    model = arch_model(Y, **(garch or {"vol": "Garch", "p": 1, "q": 1}))
+    results = model.fit()
+
+    return results.conditional_volatility.values
+
+
+def scale_features(X, Y, volatility, feature_range=(0, 1)):
+    """把波动率加入特征作为新的一列，并分别对 X、Y 归一化
+
+    Args:
+        X (pd.DataFrame): 原始特征
+        Y (pd.DataFrame): 对数收益率
+        volatility (np.ndarray): 条件波动率
+        feature_range (tuple, optional): 归一化范围. Defaults to (0, 1).
+
+    Returns:
+        dict: X、Y、log_return、volatility、scaler_x、scaler_y，同 load_market
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    X = X.copy()
+    X["Volatility"] = volatility
+
+    scaler_x = MinMaxScaler(feature_range=tuple(feature_range))
+    scaler_y = MinMaxScaler(feature_range=tuple(feature_range))
+
+    return {
+        "X": scaler_x.fit_transform(X),
+        "Y": scaler_y.fit_transform(Y),
+        "log_return": Y.values.ravel(),
+        "volatility": volatility,
+        "scaler_x": scaler_x,
+        "scaler_y": scaler_y,
+    }
+
+
+@lru_cache(maxsize=None)
+def load_market(name: str = "sp500", online_initial: int = None, refit_every: int = 250):
+    """加载市场数据，首次调用时才读取文件与预处理，之后直接返回缓存的结果
+
+    Args:
+        name (str, optional): 数据集名称，"sp500" 或 "shangzheng". Defaults to "sp500".
+        online_initial (int, optional): 设置后用在线 GARCH 逐条递推波动率（见 garch.online_volatility），
+            前 online_initial 个观测用于初始估计；None 时在全部样本上拟合 GARCH. Defaults to None.
+        refit_every (int, optional): 在线 GARCH 重新估计参数的间隔. Defaults to 250.
+
+    Returns:
+        dict: X 为归一化后的特征 (T, features)，Y 为归一化后的对数收益率 (T, 1)，
+            另有 log_return、volatility、scaler_x、scaler_y
+    """
+    from .feature_store import FeatureStore, scaler_arrays, load_scaler
+
+    if name not in MARKETS:
+        raise ValueError(f"Unknown market {name!r}, must be one of {sorted(MARKETS)}")
+
+    market = MARKETS[name]
+    source = os.path.join(DATA_DIR, market["source"])
+    config = {
+        "x_columns": market["x_columns"],
+        "y_column": market["y_column"],
+        "dtype": "float32",
+        "garch": {"vol": "Garch", "p": 1, "q": 1},
+        "online_garch": None if online_initial is None else {"initial": online_initial, "refit_every": refit_every},
+        "feature_range": [0, 1],
+    }
+    if "columns" in market:
+        config["columns"] = market["columns"]
+
+    # 源数据与预处理配置都没有变化时直接读取特征仓库，不再拟合 GARCH 与归一化
+    store = FeatureStore("feature_store")
+    key = store.key(source, config)
+    features = store.load(key)
+
+    if features is not None:
+        return {
+            "X": features["X"],
+            "Y": features["Y"],
+            "log_return": features["log_return"],
+            "volatility": features["volatility"],
+            "scaler_x": load_scaler(features, "scaler_x"),
+            "scaler_y": load_scaler(features, "scaler_y"),
+        }
+
+    raw = read_market(name)
+    volatility = fit_volatility(raw["Y"], config["garch"], config["online_garch"])
+    data = scale_features(raw["X"], raw["Y"], volatility, config["feature_range"])
+
+    store.save(
+        key,
+        {
+            "log_return": data["log_return"],
+            "volatility": data["volatility"],
+            "X": data["X"],
+            "Y": data["Y"],
+            **scaler_arrays("scaler_x", data["scaler_x"]),
+            **scaler_arrays("scaler_y", data["scaler_y"]),
+        },
+    )
+
+    return data
@@ -0,0 +1,167 @@
+# 面板训练：多个资产共用一个 QWLSTMModel（资产嵌入），batch 混合各个资产；
+# 随机森林可以在整个面板上拟合，也可以按资产分别拟合，权重同样支持精确的叶子编号与期望近似
+import numpy as np
+import torch
+from quantile_forest import RandomForestQuantileRegressor
+from .QWLSTMModel import QWLSTMModel, rf_sample_weight, rf_weight_kwargs
+from .dataloader import flatten, panel_windows
+
+
+def panel_leaf(x, y, assets, rf_params: dict, per_asset: bool = False, seed: int = 0):
+    """面板样本的随机森林叶子编号矩阵，用于 rf_weight_kwargs
+
+    按资产计算时每个资产单独拟合一个随机森林，各资产的叶子编号加上不同的偏移，
+    不同资产的样本不会落在同一个叶子中，权重矩阵为分块对角矩阵，每个样本的列和只在本资产内计算。
+
+    Args:
+        x (np.ndarray): 展平后的输入，shape (n, features)，包含资产编号列
+        y (np.ndarray): 标签，shape (n,)
+        assets (np.ndarray): 资产编号，shape (n,)
+        rf_params (dict): RandomForestQuantileRegressor 的参数
+        per_asset (bool, optional): 每个资产单独拟合随机森林，否则在整个面板上拟合一个. Defaults to False.
+        seed (int, optional): 随机森林的随机种子. Defaults to 0.
+
+    Returns:
+        np.ndarray: int64，shape (n, n_estimators)
+    """
+    if not per_asset:
+        rf = RandomForestQuantileRegressor(random_state=seed, **rf_params)
+        rf.fit(x, y)
+        return rf.apply(x).astype(np.int64)
+
+    leaves = {}
+    for a in np.unique(assets):
+        mask = assets == a
+        rf = RandomForestQuantileRegressor(random_state=seed, **rf_params)
+        rf.fit(x[mask], y[mask])
+        leaves[a] = rf.apply(x[mask]).astype(np.int64)
+
+    offset = max(int(leaf.max()) for leaf in leaves.values()) + 1
+    leaf = np.empty((len(x), next(iter(leaves.values())).shape[1]), dtype=np.int64)
+    for a, asset_leaf in leaves.items():
+        leaf[assets == a] = asset_leaf + a * offset
+
+    return leaf
+
+
+def panel_sample_weight(x, y, assets, rf_params: dict, per_asset: bool = False, seed: int = 0):
+    """面板样本的随机森林权重列和，用于 QWLSTMModel.fit(sample_weight=...)
+
+    fit 中按整个面板的样本数折算 batch 内的期望列和，按资产计算（分块对角）与整个面板计算都适用。
+
+    Args:
+        x (np.ndarray): 展平后的输入，shape (n, features)，包含资产编号列
+        y (np.ndarray): 标签，shape (n,)
+        assets (np.ndarray): 资产编号，shape (n,)
+        rf_params (dict): RandomForestQuantileRegressor 的参数
+        per_asset (bool, optional): 每个资产单独拟合随机森林，见 panel_leaf. Defaults to False.
+        seed (int, optional): 随机森林的随机种子. Defaults to 0.
+
+    Returns:
+        np.ndarray: shape (n,)
+    """
+    return rf_sample_weight(panel_leaf(x, y, assets, rf_params, per_asset, seed))
+
+
+def violations_by_asset(y_true, y_pred, assets, quantile: float):
+    """逐个资产的违约次数与目标损失 |违约率 - 分位数|
+
+    Args:
+        y_true (np.ndarray): 实际值，shape (n,)
+        y_pred (np.ndarray): 预测值，shape (n,)
+        assets (np.ndarray): 资产编号，shape (n,)
+        quantile (float): 分位数
+
+    Returns:
+        dict: {资产编号: {"violations", "n", "rate", "loss"}}
+    """
+    y_true, y_pred, assets = (np.asarray(arr).ravel() for arr in (y_true, y_pred, assets))
+    hits = np.bincount(assets, weights=y_true < y_pred)
+    counts = np.bincount(assets)
+
+    report = {}
+    for a in np.flatnonzero(counts):
+        rate = hits[a] / counts[a]
+        report[int(a)] = {"violations": int(hits[a]), "n": int(counts[a]), "rate": rate, "loss": abs(rate - quantile)}
+
+    return report
+
+
+def train_panel(
+    markets,
+    params: dict,
+    quantile: float = 0.05,
+    tau: float = 1.0,
+    per_asset_rf: bool = False,
+    weighting: str = "leaf",
+    embed_dim: int = 4,
+    seed: int = 0,
+    verbose: bool = True,
+):
+    """在多个资产上训练一个 QWLSTMModel，并逐个资产在测试集上评估
+
+    Args:
+        markets (list): 资产（数据集）名称，见 dataloader.panel_windows
+        params (dict): 超参数，格式同 best_params.txt（不含 tau）
+        quantile (float, optional): 分位数. Defaults to 0.05.
+        tau (float, optional): 普通分位数损失所占比例，其余为随机森林加权的损失，同 lstm_train.tau. Defaults to 1.0.
+        per_asset_rf (bool, optional): 随机森林权重按资产分别计算. Defaults to False.
+        weighting (str, optional): 随机森林权重的计算方式，"leaf" 为精确的 batch 权重列和，
+            "sample_weight" 为期望近似，见 rf_weight_kwargs. Defaults to "leaf".
+        embed_dim (int, optional): 资产嵌入的维数. Defaults to 4.
+        seed (int, optional): 随机种子. Defaults to 0.
+        verbose (bool, optional): 是否打印每个资产的结果. Defaults to True.
+
+    Returns:
+        tuple: (model, report)，report 同 violations_by_asset，以资产名称为键
+    """
+    markets = tuple(markets)
+    windows = panel_windows(markets)
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+
+    X_train, Y_train = windows["X_train"], windows["Y_train"]
+    leaf = panel_leaf(
+        flatten(X_train).cpu().numpy(),
+        Y_train.cpu().numpy(),
+        windows["A_train"].cpu().numpy(),
+        dict(
+            n_estimators=params["n_estimators"],
+            min_samples_split=params["min_samples_split"],
+            min_samples_leaf=params["min_samples_leaf"],
+            max_depth=params["max_depth"],
+        ),
+        per_asset=per_asset_rf,
+        seed=seed,
+    )
+
+    model = QWLSTMModel(
+        hs=params["hidden_size"],
+        quantile=quantile,
+        dropout=params["dropout"],
+        num_layers=params["num_layers"],
+        n_assets=len(markets),
+        embed_dim=embed_dim,
+    )
+    model.fit(
+        X_train,
+        Y_train,
+        tau=tau,
+        batch_size=params["batch_size"],
+        n_iter=params["n_iter"],
+        lr=params["lr"],
+        tol=params["tol"],
+        verbose=verbose,
+        **rf_weight_kwargs(leaf, weighting),
+    )
+
+    y_pred = model.predict(windows["X_test"])
+    report = violations_by_asset(windows["Y_test"].cpu().numpy(), y_pred, windows["A_test"].cpu().numpy(), quantile)
+    report = {markets[a]: res for a, res in report.items()}
+
+    if verbose:
+        for market, res in report.items():
+            print(f"{market}: violations {res['violations']}/{res['n']}, rate {res['rate']:.4f}, loss {res['loss']:.4f}")
+
+    return model, report
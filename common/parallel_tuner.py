@@ -0,0 +1,185 @@
+# 批量并行贝叶斯优化：每轮取 k 个建议点，在多个进程中同时评估，或一次交给批量目标函数
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+from bayes_opt import BayesianOptimization
+from .backtest import limit_threads
+
+try:  # bayes-opt < 2.0 需要显式传入采集函数
+    from bayes_opt import UtilityFunction
+except ImportError:
+    UtilityFunction = None
+
+
+def _new_optimizer(pbounds, random_state):
+
+    try:
+        return BayesianOptimization(
+            f=None, pbounds=pbounds, random_state=random_state, verbose=0, allow_duplicate_points=True
+        )
+    except TypeError:  # bayes-opt < 1.4 没有 allow_duplicate_points
+        return BayesianOptimization(f=None, pbounds=pbounds, random_state=random_state, verbose=0)
+
+
+def _suggest(optimizer):
+
+    if UtilityFunction is not None:
+        return optimizer.suggest(UtilityFunction(kind="ucb", kappa=2.576, xi=0.0))
+
+    return optimizer.suggest()
+
+
+def suggest_batch(optimizer, batch_size: int, strategy: str = "constant_liar", random_state=None):
+    """一次给出 batch_size 个建议点
+
+    在一个临时优化器上重放已有的观测，每给出一个建议点就先登记一个“谎言”目标值，
+    使下一个建议点避开它附近的区域。
+
+    Args:
+        optimizer (BayesianOptimization): 已登记真实观测的优化器
+        batch_size (int): 建议点数量
+        strategy (str, optional): "constant_liar"：谎言取已观测的最小目标值；
+            "kriging_believer"：谎言取高斯过程在该点的预测均值. Defaults to "constant_liar".
+        random_state (optional): 临时优化器的随机种子. Defaults to None.
+
+    Returns:
+        list: 参数字典列表
+    """
+    if strategy not in ("constant_liar", "kriging_believer"):
+        raise ValueError("Invalid strategy, must be constant_liar or kriging_believer")
+
+    pbounds = {key: tuple(bound) for key, bound in zip(optimizer.space.keys, optimizer.space.bounds)}
+    liar = _new_optimizer(pbounds, random_state)
+    for res in optimizer.res:
+        liar.register(params=res["params"], target=res["target"])
+
+    lie = min(res["target"] for res in optimizer.res)
+
+    batch = []
+    for _ in range(batch_size):
+        params = _suggest(liar)
+        if strategy == "kriging_believer":
+            x = liar.space.params_to_array(params).reshape(1, -1)
+            lie = float(np.ravel(liar._gp.predict(x))[0])
+        liar.register(params=params, target=lie)
+        batch.append(params)
+
+    return batch
+
+
+def _random_batch(optimizer, batch_size):
+
+    batch = []
+    for _ in range(batch_size):
+        x = np.atleast_2d(optimizer.space.random_sample())[0]
+        batch.append(optimizer.space.array_to_params(x))
+
+    return batch
+
+
+def parallel_maximize(
+    f,
+    pbounds: dict,
+    init_points: int = 30,
+    n_iter: int = 100,
+    batch_size: int = None,
+    n_workers: int = None,
+    strategy: str = "constant_liar",
+    random_state: int = 1,
+    n_threads: int = None,
+):
+    """批量并行的贝叶斯优化，与 BayesianOptimization.maximize 的评估次数相同
+
+    Args:
+        f (callable): 目标函数 f(**params) -> float，必须是模块级函数（或其 functools.partial）以便传给工作进程
+        pbounds (dict): 参数范围
+        init_points (int, optional): 随机初始点数量. Defaults to 30.
+        n_iter (int, optional): 贝叶斯优化的评估次数. Defaults to 100.
+        batch_size (int, optional): 每轮同时评估的建议点数量. Defaults to n_workers.
+        n_workers (int, optional): 进程数. Defaults to os.cpu_count().
+        strategy (str, optional): 批量建议策略，见 suggest_batch. Defaults to "constant_liar".
+        random_state (int, optional): 随机种子. Defaults to 1.
+        n_threads (int, optional): 每个进程的线程数. Defaults to cpu_count // n_workers.
+
+    Returns:
+        BayesianOptimization: 登记了全部观测的优化器，最优结果见 optimizer.max
+    """
+    n_workers = n_workers or os.cpu_count()
+    batch_size = batch_size or n_workers
+    n_threads = n_threads or max(1, os.cpu_count() // n_workers)
+
+    optimizer = _new_optimizer(pbounds, random_state)
+    rng = np.random.RandomState(random_state)
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=limit_threads, initargs=(n_threads,)
+    ) as executor:
+
+        n_done = 0
+        total = init_points + n_iter
+        while n_done < total:
+            k = min(batch_size, total - n_done)
+            if n_done < init_points:
+                batch = _random_batch(optimizer, min(k, init_points - n_done))
+            else:
+                batch = suggest_batch(optimizer, k, strategy=strategy, random_state=rng.randint(2**31))
+
+            futures = [executor.submit(f, **params) for params in batch]
+            for params, future in zip(batch, futures):
+                target = future.result()
+                optimizer.register(params=params, target=target)
+                n_done += 1
+                print(f"| {n_done:<9} | {target:<9.4g} | " + " | ".join(f"{v:<9.4g}" for v in params.values()) + " |")
+
+    return optimizer
+
+
+def batch_maximize(
+    batch_f,
+    pbounds: dict,
+    init_points: int = 30,
+    n_iter: int = 100,
+    batch_size: int = 8,
+    strategy: str = "constant_liar",
+    random_state: int = 1,
+    shared: tuple = (),
+    share_if=None,
+):
+    """批量贝叶斯优化：每轮的 batch_size 个建议点一次交给 batch_f 在当前进程中评估
+
+    Args:
+        batch_f (callable): batch_f(list[dict]) -> list[float]，如同时训练一组模型的目标函数
+        pbounds (dict): 参数范围
+        init_points (int, optional): 随机初始点数量. Defaults to 30.
+        n_iter (int, optional): 贝叶斯优化的评估次数. Defaults to 100.
+        batch_size (int, optional): 每轮的建议点数量. Defaults to 8.
+        strategy (str, optional): 批量建议策略，见 suggest_batch. Defaults to "constant_liar".
+        random_state (int, optional): 随机种子. Defaults to 1.
+        shared (tuple, optional): 同一轮建议点共用的参数名，取该轮第一个建议点的值，
+            使 batch_f 可以把它们放进同一个批量模型. Defaults to ().
+        share_if (callable, optional): share_if(该轮第一个建议点) 为假时本轮不统一 shared 中的参数，
+            各建议点保留自己的值（如批量模型不适用的参数范围）；None 时总是统一. Defaults to None.
+
+    Returns:
+        BayesianOptimization: 登记了全部观测的优化器，最优结果见 optimizer.max
+    """
+    optimizer = _new_optimizer(pbounds, random_state)
+    rng = np.random.RandomState(random_state)
+
+    n_done = 0
+    total = init_points + n_iter
+    while n_done < total:
+        k = min(batch_size, total - n_done)
+        if n_done < init_points:
+            batch = _random_batch(optimizer, min(k, init_points - n_done))
+        else:
+            batch = suggest_batch(optimizer, k, strategy=strategy, random_state=rng.randint(2**31))
+        if share_if is None or share_if(batch[0]):
+            batch = [{**params, **{key: batch[0][key] for key in shared}} for params in batch]
+
+        for params, target in zip(batch, batch_f(batch)):
+            optimizer.register(params=params, target=target)
+            n_done += 1
+            print(f"| {n_done:<9} | {target:<9.4g} | " + " | ".join(f"{v:<9.4g}" for v in params.values()) + " |")
+
+    return optimizer
@@ -0,0 +1,256 @@
+# 分组训练：隐藏层大小与层数相同的多组超参数堆叠成一个批量模型同时训练，用于贝叶斯优化
+import numpy as np
+import torch
+from .QWLSTMModel import LSTMModel, QWLSTMModel
+
+# 隐藏层不小于该值时手写的批量 LSTM 比逐个训练 nn.LSTM 更慢（单线程 CPU 上 4 个模型：
+# hs=4 时 0.52s 对 1.63s，hs=8 时持平，hs=16 时 0.69s 对 0.63s，hs=32 时 0.94s 对 0.81s），应改为逐个训练
+MAX_HIDDEN_SIZE = 16
+
+
+class QWLSTMPopulation:
+
+    def __init__(
+        self,
+        size: int,
+        hs: int = 64,
+        quantile=0.05,
+        dropout=0.1,
+        num_layers: int = 3,
+        device="cpu",
+    ):
+        """K 个相互独立的 QWLSTM 模型，参数按模型维度堆叠
+
+        nn.LSTM 不支持 torch.func.vmap，这里按 nn.LSTM 的参数布局与门顺序（i, f, g, o）
+        手写 LSTM，每个时间步用一次批量矩阵乘法同时计算所有模型。
+        各模型有自己的 dropout、学习率、batch 大小、迭代次数与收敛阈值，参数与优化器状态互不影响。
+
+        Args:
+            size (int): 模型个数 K
+            hs (int, optional): 隐藏层. Defaults to 64.
+            quantile (float | list, optional): 分位数，为列表时每个分位数一个输出. Defaults to 0.05.
+            dropout (float | list, optional): 每个模型的 dropout，长度为 K. Defaults to 0.1.
+            num_layers (int, optional): lstm隐藏层数量. Defaults to 3.
+            device (str, optional): 设备. Defaults to "cpu".
+        """
+        self.size = size
+        self.hs = hs
+        self.quantile = quantile
+        self.quantiles = np.atleast_1d(quantile).astype(float)
+        self.num_layers = num_layers
+        self.device = device
+        self.dropout = torch.as_tensor(
+            np.broadcast_to(dropout, (size,)).astype(np.float32), device=device
+        )
+
+    def _init_params(self, input_size):
+
+        # 逐个构造 LSTMModel，初始化方式与单个模型相同
+        models = [
+            LSTMModel(input_size, self.hs, self.num_layers, len(self.quantiles), 0.0) for _ in range(self.size)
+        ]
+        self.params = {
+            name: torch.stack([m.state_dict()[name] for m in models]).to(self.device).requires_grad_()
+            for name in models[0].state_dict()
+        }
+
+    def _forward(self, x, train=True):
+        """x: shape (K, b, 时间步, 特征数)，返回 shape (K, b, 输出数)"""
+        K, b, T, _ = x.shape
+        hs = self.hs
+        seq = x
+
+        for layer in range(self.num_layers):
+            w_ih = self.params[f"lstm.weight_ih_l{layer}"]  # (K, 4hs, in)
+            w_hh = self.params[f"lstm.weight_hh_l{layer}"].transpose(1, 2)  # (K, hs, 4hs)
+            bias = self.params[f"lstm.bias_ih_l{layer}"] + self.params[f"lstm.bias_hh_l{layer}"]
+
+            # 所有时间步的输入变换一次算完，按时间步拆开（逐步切片在反向传播时会反复填充整块梯度）
+            gates_x = (torch.einsum("kbti,kgi->tkbg", seq, w_ih) + bias[None, :, None, :]).unbind(0)
+
+            h = x.new_zeros(K, b, hs)
+            c = x.new_zeros(K, b, hs)
+            outputs = []
+            for t in range(T):
+                gates = gates_x[t] + torch.bmm(h, w_hh)
+                i, f, g, o = gates.chunk(4, dim=-1)
+                c = torch.sigmoid(f) * c + torch.sigmoid(i) * torch.tanh(g)
+                h = torch.sigmoid(o) * torch.tanh(c)
+                outputs.append(h)
+
+            if layer < self.num_layers - 1:
+                seq = torch.stack(outputs, dim=2)
+                if train:  # 与 nn.LSTM 相同，只在层与层之间做 dropout
+                    p = self.dropout[:, None, None, None]
+                    seq = seq * (torch.rand_like(seq) >= p) / (1 - p)
+
+        return torch.bmm(h, self.params["fc.weight"].transpose(1, 2)) + self.params["fc.bias"][:, None, :]
+
+    def fit(
+        self,
+        x,
+        y,
+        lr,
+        batch_size,
+        n_iter,
+        tol,
+        tau=0.5,
+        sample_weight=None,
+        check_every=50,
+        seed=None,
+        verbose=True,
+    ):
+        """同时训练 K 个模型，单个模型的损失与收敛判据与 QWLSTMModel.fit(sample_weight=...) 相同
+
+        Args:
+            x (torch.Tensor | dataloader.WindowView): 输入，shape (n, 时间步, 特征数)，窗口视图按 batch 取出
+            y (torch.Tensor): 标签，shape (n,)
+            lr (list): 每个模型的学习率
+            batch_size (list): 每个模型的批大小
+            n_iter (list): 每个模型的迭代次数
+            tol (list): 每个模型的收敛阈值
+            tau (float, optional): 普通分位数损失所占比例，None 时只有普通分位数损失. Defaults to 0.5.
+            sample_weight (np.ndarray, optional): 每个模型的 rf_sample_weight，shape (K, n)；
+                tau 不为 None 时必须提供. Defaults to None.
+            check_every (int, optional): 每隔多少步检查一次是否所有模型都已停止. Defaults to 50.
+            seed (int, optional): 随机数生成器的种子，None 时由 np.random 生成. Defaults to None.
+            verbose (bool, optional): 是否打印各模型的训练结果. Defaults to True.
+        """
+        if tau is not None and sample_weight is None:
+            raise ValueError("sample_weight is required when tau is not None")
+
+        x, y = x.to(self.device), y.to(self.device)
+        n = x.shape[0]
+        K = self.size
+
+        def per_model(values, dtype=torch.float32):
+            return torch.as_tensor(np.broadcast_to(values, (K,)).copy(), dtype=dtype, device=self.device)
+
+        lr = per_model(lr)
+        b = per_model(np.minimum(batch_size, n))
+        n_iter = per_model(n_iter, torch.int64)
+        tol = per_model(tol)
+        if sample_weight is not None:
+            sample_weight = torch.as_tensor(np.asarray(sample_weight), dtype=torch.float32, device=self.device)
+
+        if seed is None:
+            seed = np.random.randint(np.iinfo(np.int32).max)
+        generator = torch.Generator(device=self.device)
+        generator.manual_seed(int(seed))
+        torch.manual_seed(int(seed))  # dropout
+
+        self._init_params(x.shape[2])
+        q = torch.as_tensor(1 - self.quantiles, dtype=torch.float32, device=self.device)
+
+        # Adam，学习率按模型区分；停止的模型不再更新参数与动量
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        m = {name: torch.zeros_like(p) for name, p in self.params.items()}
+        v = {name: torch.zeros_like(p) for name, p in self.params.items()}
+        step = torch.zeros(K, device=self.device)
+
+        B = int(b.max())
+        valid = (torch.arange(B, device=self.device)[None, :] < b[:, None]).float()  # 各模型 batch 的有效位置
+        max_iter = int(n_iter.max())
+        history = torch.empty(max_iter, K, device=self.device)
+        last_loss = torch.full((K,), float("inf"), device=self.device)
+        active = torch.ones(K, dtype=torch.bool, device=self.device)
+        self.converged_ = torch.zeros(K, dtype=torch.bool, device=self.device)
+        self.n_iter_ = torch.zeros(K, dtype=torch.int64, device=self.device)
+
+        i_iter = -1
+        for i_iter in range(max_iter):
+
+            # 每个模型不放回地抽取自己的 batch
+            idx = torch.rand(K, n, generator=generator, device=self.device).argsort(dim=1)[:, :B]
+            fx = self._forward(x[idx])
+            tmp_y = y[idx].unsqueeze(-1)
+            errors = fx - tmp_y
+            tmp_loss = torch.max(q * errors, (q - 1) * errors).sum(dim=-1) * valid  # (K, B)
+
+            loss = tmp_loss.sum(dim=1) / b
+            if tau is not None:
+                tmp_c = torch.gather(sample_weight, 1, idx) * (b[:, None] - 1) / (n - 1)
+                loss2 = (tmp_loss * tmp_c).sum(dim=1) / (b * b) * n / (n - 1)
+                loss = tau * loss + (1 - tau) * loss2
+            history[i_iter] = loss.detach()
+
+            # 与 QWLSTMModel.fit 相同：损失变化不超过 tol 且已训练 100 步时停止，本步不再更新
+            converged = active & ((last_loss - loss.detach()).abs() <= tol) & (i_iter >= 100)
+            self.converged_ |= converged
+            active = active & ~converged & (i_iter < n_iter)
+            last_loss = loss.detach()
+
+            grads = torch.autograd.grad((loss * active).sum(), list(self.params.values()))
+
+            with torch.no_grad():
+                step += active
+                bias1 = 1 - beta1 ** step.clamp(min=1)
+                bias2 = 1 - beta2 ** step.clamp(min=1)
+                for (name, p), grad in zip(self.params.items(), grads):
+                    shape = (K,) + (1,) * (p.ndim - 1)
+                    mask = active.view(shape)
+                    m[name] = torch.where(mask, beta1 * m[name] + (1 - beta1) * grad, m[name])
+                    v[name] = torch.where(mask, beta2 * v[name] + (1 - beta2) * grad * grad, v[name])
+                    denom = (v[name] / bias2.view(shape)).sqrt() + eps
+                    p -= mask * (lr / bias1).view(shape) * m[name] / denom
+
+            self.n_iter_ += active
+
+            if (i_iter + 1) % check_every == 0 and not bool(active.any()):
+                break
+
+        n_recorded = i_iter + 1
+        history = history[:n_recorded].cpu().numpy()
+        n_loss = (self.n_iter_ + self.converged_).clamp(max=n_recorded).cpu().numpy()
+        self.loss_count = [history[: n_loss[k], k].tolist() for k in range(K)]
+
+        if verbose:
+            for k in range(K):
+                state = "converges" if self.converged_[k] else "may not converge"
+                print(f"model {k}: {state} at iter {int(self.n_iter_[k])}, loss: {self.loss_count[k][-1]}.")
+
+    def predict(self, x_new):
+        """K 个模型的预测
+
+        与 QWLSTMModel.predict 一致（fnet 没有切换到 eval 模式），预测时同样保留层间 dropout。
+
+        Args:
+            x_new (torch.Tensor): 输入，shape (m, 时间步, 特征数)
+
+        Returns:
+            np.ndarray: shape (K, m)，多分位数时为 (K, m, 分位数个数)
+        """
+        x_new = x_new.to(self.device)
+        if not isinstance(x_new, torch.Tensor):  # 窗口视图（dataloader.WindowView）在预测时一次取出
+            x_new = x_new[:]
+
+        with torch.no_grad():
+            y_pred = self._forward(x_new.unsqueeze(0).expand(self.size, *x_new.shape))
+
+        y_pred = y_pred.cpu().numpy()
+
+        return y_pred if np.ndim(self.quantile) else y_pred[..., 0]
+
+    def to_models(self):
+        """拆分为 K 个独立的 QWLSTMModel，便于单独预测或保存
+
+        Returns:
+            list: QWLSTMModel 列表
+        """
+        models = []
+        input_size = self.params["lstm.weight_ih_l0"].shape[-1]
+        for k in range(self.size):
+            model = QWLSTMModel(
+                hs=self.hs,
+                quantile=self.quantile,
+                dropout=float(self.dropout[k]),
+                num_layers=self.num_layers,
+                device=self.device,
+            )
+            model.fnet = LSTMModel(
+                input_size, self.hs, self.num_layers, len(self.quantiles), float(self.dropout[k])
+            ).to(self.device)
+            model.fnet.load_state_dict({name: p[k].detach() for name, p in self.params.items()})
+            models.append(model)
+
+        return models
@@ -0,0 +1,141 @@
+# 随机森林缓存：贝叶斯优化中随机森林参数相同的试验共用同一次拟合与叶子编号矩阵
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+import numpy as np
+from quantile_forest import RandomForestQuantileRegressor
+from .QWLSTMModel import rf_sample_weight
+
+
+class ForestCache:
+
+    def __init__(self, cache_dir: str = "rf_cache", max_bytes: int = 512 * 2**20):
+        """两级缓存：内存中按字节预算做最近最少使用淘汰，数组同时写入磁盘 .npy，
+        内存未命中时以 mmap 方式读回
+
+        Args:
+            cache_dir (str, optional): 磁盘缓存目录. Defaults to "rf_cache".
+            max_bytes (int, optional): 内存预算（字节）. Defaults to 512MB.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()  # key -> (arrays, forest, nbytes)
+        self._bytes = 0
+
+    @staticmethod
+    def key(params: dict, seed: int, data_hash: str):
+        """缓存键：随机森林参数、随机种子与训练数据指纹
+
+        Args:
+            params (dict): 随机森林参数
+            seed (int): 随机种子
+            data_hash (str): 训练数据指纹（trial_cache.dataset_hash）
+
+        Returns:
+            str: sha1 摘要
+        """
+        payload = json.dumps([sorted(params.items()), int(seed), data_hash])
+
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _path(self, key, name):
+
+        return os.path.join(self.cache_dir, f"{key}.{name}.npy")
+
+    def get(self, key: str):
+        """读取缓存
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            tuple: (arrays, forest)，arrays 为 {名称: 数组}，仅在内存中命中时才有 forest；
+                未命中时为 None
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            arrays, forest, _ = self._memory[key]
+            return arrays, forest
+
+        index = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(index):
+            return None
+
+        with open(index, "r") as f:
+            names = json.load(f)
+        arrays = {name: np.load(self._path(key, name), mmap_mode="r") for name in names}
+        self._remember(key, arrays, None)
+
+        return arrays, None
+
+    def put(self, key: str, arrays: dict, forest=None):
+        """写入缓存：数组写入磁盘，数组与森林放入内存，超出预算时淘汰最久未使用的条目
+
+        每个文件先写临时文件再改名，并行的工作进程同时写入同一个键时读到的文件总是完整的。
+
+        Args:
+            key (str): 缓存键
+            arrays (dict): {名称: 数组}，如叶子编号矩阵与样本权重
+            forest (optional): 已拟合的随机森林，只保存在内存中. Defaults to None.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for name, arr in arrays.items():
+            path = self._path(key, name)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, path)
+
+        index = os.path.join(self.cache_dir, f"{key}.json")
+        tmp = f"{index}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(list(arrays), f)
+        os.replace(tmp, index)  # 数组改名后再改名索引，读到索引即说明数组完整
+
+        self._remember(key, arrays, forest)
+
+    def _remember(self, key, arrays, forest):
+
+        nbytes = sum(arr.nbytes for arr in arrays.values())
+        if forest is not None:
+            nbytes += len(pickle.dumps(forest, protocol=pickle.HIGHEST_PROTOCOL))
+
+        if key in self._memory:
+            self._bytes -= self._memory.pop(key)[2]
+        self._memory[key] = (arrays, forest, nbytes)
+        self._bytes += nbytes
+
+        while self._bytes > self.max_bytes and len(self._memory) > 1:
+            _, (_, _, evicted) = self._memory.popitem(last=False)
+            self._bytes -= evicted
+
+    def fit_forest(self, params: dict, seed: int, X, y, data_hash: str, keep_forest: bool = False):
+        """返回随机森林在训练集上的叶子编号矩阵与样本权重，命中缓存时跳过拟合
+
+        Args:
+            params (dict): RandomForestQuantileRegressor 参数
+            seed (int): 随机种子
+            X (np.ndarray): 训练集输入，shape (n, features)
+            y (np.ndarray): 训练集标签，shape (n,)
+            data_hash (str): 训练数据指纹
+            keep_forest (bool, optional): 是否在内存中保留已拟合的森林. Defaults to False.
+
+        Returns:
+            tuple: (arrays, forest)。arrays["leaf"] 为叶子编号矩阵 (n, n_estimators)，
+                arrays["sample_weight"] 为 rf_sample_weight 的结果 (n,)；forest 未保留时为 None
+        """
+        key = self.key(params, seed, data_hash)
+        entry = self.get(key)
+
+        if entry is None:
+            rf = RandomForestQuantileRegressor(random_state=seed, **params)
+            rf.fit(X, y)
+            leaf = rf.apply(X).astype(np.int32)
+            arrays = {"leaf": leaf, "sample_weight": rf_sample_weight(leaf)}
+            forest = rf if keep_forest else None
+            self.put(key, arrays, forest)
+            return arrays, forest
+
+        return entry
@@ -0,0 +1,214 @@
+# 滚动随机森林：滚动向前预测时增量更新的分位数回归森林
+import time
+import numpy as np
+from scipy import sparse
+from sklearn.tree import DecisionTreeRegressor
+
+
+class RollingQuantileForest:
+
+    def __init__(
+        self,
+        n_estimators: int = 100,
+        n_new: int = 10,
+        max_age: int = None,
+        min_samples_split: int = 2,
+        min_samples_leaf: int = 1,
+        max_depth: int = None,
+        max_features=1.0,
+        random_state: int = None,
+        benchmark: bool = False,
+    ):
+        """滚动随机森林
+
+        维护一个树池，每棵树记录生成时所在的窗口（步数），bootstrap 样本只在生成时使用，不保存。
+        每次 update 只淘汰最老的树并在最新窗口上生成 n_new 棵新树，
+        其余树保留结构，只用最新窗口重新填充叶子，因此每步的耗时只是完整重训的一部分。
+
+        Args:
+            n_estimators (int, optional): 树池大小. Defaults to 100.
+            n_new (int, optional): 每步新生成的树的数量. Defaults to 10.
+            max_age (int, optional): 树的最大存活步数，超过即淘汰，None 表示只按树池大小淘汰. Defaults to None.
+            min_samples_split (int, optional): 同 RandomForestQuantileRegressor. Defaults to 2.
+            min_samples_leaf (int, optional): 同 RandomForestQuantileRegressor. Defaults to 1.
+            max_depth (int, optional): 同 RandomForestQuantileRegressor. Defaults to None.
+            max_features (optional): 同 RandomForestQuantileRegressor. Defaults to 1.0.
+            random_state (int, optional): 随机种子. Defaults to None.
+            benchmark (bool, optional): 每步同时在同一窗口上完整拟合一个参数相同的 RandomForestQuantileRegressor，
+                只计时、不使用，作为 report 中节省耗时的基准；会使每步的总耗时增加一次完整重训. Defaults to False.
+        """
+        self.n_estimators = n_estimators
+        self.n_new = n_new
+        self.max_age = max_age
+        self.min_samples_split = min_samples_split
+        self.min_samples_leaf = min_samples_leaf
+        self.max_depth = max_depth
+        self.max_features = max_features
+        self.random_state = np.random.RandomState(random_state)
+        self.benchmark = benchmark
+
+        self.estimators_ = []  # 树池
+        self.birth_ = []  # 每棵树生成时的步数
+        self.step_ = -1
+
+        self.fit_time_ = 0.0  # 滚动模式累计耗时
+        self.grow_time_ = 0.0  # 生成新树的累计耗时
+        self.n_grown_ = 0  # 累计生成的树的数量
+        self.refit_time_ = 0.0  # benchmark 模式下完整重训的累计实测耗时
+
+    def _grow(self, X, y):
+
+        n = X.shape[0]
+        seed = self.random_state.randint(np.iinfo(np.int32).max)
+        bootstrap = np.random.RandomState(seed).randint(0, n, n)  # 当前窗口上的 bootstrap 样本
+
+        tree = DecisionTreeRegressor(
+            min_samples_split=self.min_samples_split,
+            min_samples_leaf=self.min_samples_leaf,
+            max_depth=self.max_depth,
+            max_features=self.max_features,
+            random_state=seed,
+        )
+        tree.fit(X[bootstrap], y[bootstrap])
+
+        return tree
+
+    def update(self, X, y):
+        """滚动一步：淘汰过期的树，在最新窗口上生成新树，并用最新窗口填充叶子
+
+        Args:
+            X (np.ndarray): 当前窗口的输入，shape (n, features)
+            y (np.ndarray): 当前窗口的标签，shape (n,)
+
+        Returns:
+            RollingQuantileForest: self
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        self.step_ += 1
+
+        start = time.perf_counter()
+
+        # 淘汰超过最大存活步数的树
+        if self.max_age is not None:
+            keep = [i for i, b in enumerate(self.birth_) if self.step_ - b < self.max_age]
+            self.estimators_ = [self.estimators_[i] for i in keep]
+            self.birth_ = [self.birth_[i] for i in keep]
+
+        # 淘汰最老的树，为新树腾出位置
+        n_grow = max(min(self.n_new, self.n_estimators), self.n_estimators - len(self.estimators_))
+        n_retire = len(self.estimators_) + n_grow - self.n_estimators
+        if n_retire > 0:
+            self.estimators_ = self.estimators_[n_retire:]
+            self.birth_ = self.birth_[n_retire:]
+
+        grow_start = time.perf_counter()
+        for _ in range(n_grow):
+            self.estimators_.append(self._grow(X, y))
+            self.birth_.append(self.step_)
+        self.grow_time_ += time.perf_counter() - grow_start
+        self.n_grown_ += n_grow
+
+        # 用最新窗口重新填充所有树的叶子
+        self.X_train_leaf_ = self.apply(X)
+        self.y_train_ = y
+
+        self.fit_time_ += time.perf_counter() - start
+
+        if self.benchmark:
+            self._time_refit(X, y)
+
+        return self
+
+    def _time_refit(self, X, y):
+
+        from quantile_forest import RandomForestQuantileRegressor
+
+        rf = RandomForestQuantileRegressor(
+            n_estimators=self.n_estimators,
+            min_samples_split=self.min_samples_split,
+            min_samples_leaf=self.min_samples_leaf,
+            max_depth=self.max_depth,
+            max_features=self.max_features,
+            random_state=self.step_,  # 不占用树池的随机数，benchmark 不影响生成的树
+        )
+        start = time.perf_counter()
+        rf.fit(X, y)
+        self.refit_time_ += time.perf_counter() - start
+
+    def apply(self, X):
+        """每个样本在每棵树中所在的叶子编号，与 RandomForestRegressor.apply 相同
+
+        Args:
+            X (np.ndarray): 输入，shape (n, features)
+
+        Returns:
+            np.ndarray: shape (n, 树的数量)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        return np.column_stack([tree.apply(X) for tree in self.estimators_])
+
+    def predict(self, X, quantiles=0.5):
+        """分位数预测，样本权重为各棵树中与 X 同叶子的训练样本按叶子大小归一化后的平均
+
+        Args:
+            X (np.ndarray): 输入，shape (m, features)
+            quantiles (float | list, optional): 分位数. Defaults to 0.5.
+
+        Returns:
+            np.ndarray: quantiles 为 float 时 shape (m,)，为 list 时 shape (m, len(quantiles))
+        """
+        leaf = self.apply(X)
+        ntrees = leaf.shape[1]
+        train_leaf = self.X_train_leaf_
+
+        # 每棵树的叶子编号加偏移，变为全局编号后一次排序分组
+        offset = np.arange(ntrees, dtype=np.int64) * (int(max(leaf.max(), train_leaf.max())) + 1)
+        train_keys = train_leaf.astype(np.int64) + offset
+        keys, inverse, counts = np.unique(train_keys.ravel(), return_inverse=True, return_counts=True)
+
+        n = train_leaf.shape[0]
+        M = sparse.csr_matrix(
+            (np.ones(n * ntrees), inverse.ravel(), np.arange(0, n * ntrees + 1, ntrees)),
+            shape=(n, len(keys)),
+        )
+
+        query_keys = (leaf.astype(np.int64) + offset).ravel()
+        pos = np.minimum(np.searchsorted(keys, query_keys), len(keys) - 1)
+        found = keys[pos] == query_keys  # 最新窗口中没有样本的叶子不贡献权重
+        Q = sparse.csr_matrix(
+            (np.where(found, 1.0 / counts[pos], 0.0), pos, np.arange(0, leaf.size + 1, ntrees)),
+            shape=(leaf.shape[0], len(keys)),
+        )
+
+        weights = (Q @ M.T).toarray() / ntrees  # shape (m, n)
+
+        order = np.argsort(self.y_train_)
+        y_sorted = self.y_train_[order]
+        # 所有树中与查询样本同叶子的训练样本都不在最新窗口时权重全为 0，退化为最新窗口的经验分位数
+        weights[weights.sum(axis=1) == 0] = 1.0
+        cum_weights = np.cumsum(weights[:, order], axis=1)
+        cum_weights /= cum_weights[:, -1:]
+
+        q = np.atleast_1d(quantiles)
+        y_pred = np.empty((len(weights), len(q)))
+        for j, _q in enumerate(q):
+            idx = (cum_weights < _q).sum(axis=1)
+            y_pred[:, j] = y_sorted[np.minimum(idx, len(y_sorted) - 1)]
+
+        return y_pred if np.ndim(quantiles) else y_pred[:, 0]
+
+    def report(self):
+        """滚动模式的实测耗时；benchmark 模式下与同一窗口上完整重训的实测耗时对比
+
+        Returns:
+            str: 耗时报告
+        """
+        text = f"rolling forest fit time: {self.fit_time_:.2f}s ({self.n_grown_} trees grown in {self.grow_time_:.2f}s)"
+        if not self.benchmark:
+            return text + ", full refit not timed (benchmark=False)"
+
+        saving = 1 - self.fit_time_ / self.refit_time_ if self.refit_time_ > 0 else 0.0
+
+        return text + f", full refit time: {self.refit_time_:.2f}s, saving: {saving:.1%}"
@@ -0,0 +1,52 @@
+# 测试共用的合成市场：小规模的 csv 写在 tmp_path 中，各种缓存目录也都落在 tmp_path，不读取 data/ 的真实数据
+import numpy as np
+import pandas as pd
+import pytest
+from common.market import MARKETS
+
+
+def write_prices(path, n: int = 400, seed: int = 0):
+    """写入与 sp500_history.csv 列名相同的随机游走价格
+
+    Args:
+        path (str): csv 路径
+        n (int, optional): 行数. Defaults to 400.
+        seed (int, optional): 随机种子. Defaults to 0.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(0.01 * rng.standard_normal(n)))
+    open_ = close * np.exp(0.002 * rng.standard_normal(n))
+    pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) * 1.005,
+            "Low": np.minimum(open_, close) * 0.995,
+            "Close": close,
+            "Volume": rng.integers(10**6, 10**7, n),
+        }
+    ).to_csv(path, index=False)
+
+
+@pytest.fixture
+def synthetic_market(tmp_path, monkeypatch):
+    """登记合成市场的工厂函数，当前目录切换到 tmp_path
+
+    市场名称包含测试用例的目录名，load_market、window_dataset 等进程内缓存不会在用例之间串用。
+
+    Returns:
+        callable: make(seed=0, n=400) -> 市场名称
+    """
+    monkeypatch.chdir(tmp_path)
+
+    def make(seed: int = 0, n: int = 400):
+        name = f"synthetic-{tmp_path.name}-{seed}"
+        source = tmp_path / f"{name}.csv"
+        write_prices(source, n, seed)
+        monkeypatch.setitem(
+            MARKETS,
+            name,
+            {"source": str(source), "x_columns": ["Open", "High", "Low", "Volume"], "y_column": "Close"},
+        )
+        return name
+
+    return make
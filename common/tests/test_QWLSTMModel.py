@@ -0,0 +1,174 @@
+# QWLSTMModel 的随机森林权重与各种权重输入下的训练
+import numpy as np
+import pytest
+import torch
+from quantile_forest import RandomForestQuantileRegressor
+from common.QWLSTMModel import (
+    QWLSTMModel,
+    get_rfweight,
+    leaf_block,
+    leaf_colsum,
+    leaf_keys,
+    rf_sample_weight,
+    rf_weight_kwargs,
+    weighted_quantile_loss,
+)
+
+n, step, features = 120, 5, 3
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((n, step, features)).astype(np.float32)
+    y = rng.standard_normal(n).astype(np.float32)
+    rf = RandomForestQuantileRegressor(n_estimators=10, min_samples_leaf=3, random_state=0)
+    rf.fit(x.reshape(n, -1), y)
+
+    return torch.from_numpy(x), torch.from_numpy(y), rf
+
+
+def _model(seed=0):
+    torch.manual_seed(seed)
+    return QWLSTMModel(hs=4, dropout=0.0, num_layers=1, device="cpu")
+
+
+def _weights(x, rf):
+    # fit 可接受的四种权重输入
+    x_flat = x.reshape(n, -1).numpy()
+    leaf = rf.apply(x_flat)
+    sparse_w, _ = get_rfweight(rf, x_flat)
+
+    return {
+        "dense": {"weight": sparse_w.toarray()},
+        "sparse": {"weight": sparse_w},
+        "leaf": {"leaf": leaf},
+        "sample_weight": {"sample_weight": rf_sample_weight(leaf)},
+    }
+
+
+@pytest.mark.parametrize("kind", ["dense", "sparse", "leaf", "sample_weight"])
+def test_fast_fit_accepts_each_weight_type(data, kind):
+    x, y, rf = data
+    model = _model()
+    model.fit(x, y, tau=0.5, batch_size=16, n_iter=20, tol=0, verbose=False, fast=True, seed=0, **_weights(x, rf)[kind])
+
+    assert model.n_iter_ == 20
+    assert np.all(np.isfinite(model.loss_count))
+
+
+def test_fast_fit_with_default_sparse_weight_matches_dense(data):
+    x, y, rf = data
+    weights = _weights(x, rf)
+
+    losses = []
+    for kind in ("dense", "sparse"):
+        model = _model()
+        model.fit(x, y, tau=0.5, batch_size=16, n_iter=20, tol=0, verbose=False, fast=True, seed=0, **weights[kind])
+        losses.append(model.loss_count)
+
+    np.testing.assert_allclose(losses[0], losses[1], rtol=1e-5)
+
+
+def test_batch_loss_matches_across_weight_inputs(data):
+    x, y, rf = data
+    weights = _weights(x, rf)
+    model = _model()
+    model.fit(x, y, tau=None, n_iter=1, verbose=False)
+    model.fnet.eval()
+
+    idx = torch.randperm(n, generator=torch.Generator().manual_seed(0))[:32]
+    q = model.q
+
+    def loss(**kwargs):
+        kwargs = dict(kwargs)
+        if "weight" in kwargs and isinstance(kwargs["weight"], np.ndarray):
+            kwargs["weight"] = torch.as_tensor(kwargs["weight"], dtype=torch.float32)
+        if "leaf" in kwargs:
+            kwargs["leaf"] = torch.as_tensor(leaf_keys(kwargs["leaf"]))
+        with torch.no_grad():
+            return float(model._batch_loss(x[idx], y[idx], idx, n, q, 0.5, **kwargs))
+
+    dense = loss(**weights["dense"])
+    assert loss(**weights["sparse"]) == pytest.approx(dense, rel=1e-5)
+    assert loss(**weights["leaf"]) == pytest.approx(dense, rel=1e-5)
+
+
+def test_leaf_colsum_matches_leaf_block(data):
+    x, _, rf = data
+    leaf = rf.apply(x.reshape(n, -1).numpy())
+    idx = torch.randperm(n, generator=torch.Generator().manual_seed(0))[:32]
+
+    block = leaf_block(torch.as_tensor(leaf), idx)
+    expected = block.sum(dim=0) - torch.diag(block)  # 去掉对角线后的列和
+    torch.testing.assert_close(leaf_colsum(torch.as_tensor(leaf_keys(leaf)), idx), expected)
+
+
+def test_sample_weight_approximation_gap(data):
+    # sample_weight 只在随机 batch 的期望上等于精确的 leaf 损失，单个 batch 有偏差
+    x, _, rf = data
+    leaf = rf.apply(x.reshape(n, -1).numpy())
+    generator = torch.Generator().manual_seed(0)
+    losses = torch.rand(n, generator=generator)
+
+    keys = torch.as_tensor(leaf_keys(leaf))
+    sample_weight = torch.as_tensor(rf_sample_weight(leaf), dtype=torch.float32)
+    b = 32
+    exact, approx = [], []
+    for _ in range(400):
+        idx = torch.randperm(n, generator=generator)[:b]
+        exact.append(float(weighted_quantile_loss(losses[idx], leaf_colsum(keys, idx), n)))
+        approx.append(float(weighted_quantile_loss(losses[idx], sample_weight[idx] * (b - 1) / (n - 1), n)))
+    exact, approx = np.array(exact), np.array(approx)
+
+    assert np.abs(approx - exact).max() > 1e-3 * exact.mean()
+    assert approx.mean() == pytest.approx(exact.mean(), rel=0.05)
+
+
+def test_rf_weight_kwargs(data):
+    x, _, rf = data
+    leaf = rf.apply(x.reshape(n, -1).numpy())
+
+    assert rf_weight_kwargs(leaf)["leaf"] is leaf
+    np.testing.assert_allclose(rf_weight_kwargs(leaf, "sample_weight")["sample_weight"], rf_sample_weight(leaf))
+    with pytest.raises(ValueError):
+        rf_weight_kwargs(leaf, "dense")
+
+
+def _reference_rfweight(leaf):
+    # 逐棵树构造稠密的同叶子矩阵，作为参照
+    n, ntrees = leaf.shape
+    G = np.zeros((n, n))
+    G_norm = np.zeros((n, n))
+    for t in range(ntrees):
+        same = leaf[:, t][:, None] == leaf[:, t][None, :]
+        G += same
+        G_norm += same / same.sum(axis=1, keepdims=True)
+
+    return G / ntrees, G_norm / ntrees
+
+
+def test_rfweight_sparse_dense_and_reference_agree(data):
+    x, _, rf = data
+    x_flat = x.reshape(n, -1).numpy()
+    G_ref, G_norm_ref = _reference_rfweight(rf.apply(x_flat))
+
+    G_sparse, G_norm_sparse = get_rfweight(rf, x_flat)
+    G_dense, G_norm_dense = get_rfweight(rf, x_flat, dense=True)
+    G_chunked, G_norm_chunked = get_rfweight(rf, x_flat, chunk_bytes=1)  # 每块一行
+
+    for G, G_norm in ((G_sparse.toarray(), G_norm_sparse.toarray()), (G_dense, G_norm_dense)):
+        np.testing.assert_allclose(G, G_ref)
+        np.testing.assert_allclose(G_norm, G_norm_ref)
+    np.testing.assert_allclose(G_chunked.toarray(), G_ref)
+    np.testing.assert_allclose(G_norm_chunked.toarray(), G_norm_ref)
+
+
+def test_rfweight_respects_memory_cap(data):
+    x, _, rf = data
+    x_flat = x.reshape(n, -1).numpy()
+
+    with pytest.raises(MemoryError):
+        get_rfweight(rf, x_flat, max_bytes=1000)
+    with pytest.raises(MemoryError):
+        get_rfweight(rf, x_flat, dense=True, max_bytes=1000)
@@ -0,0 +1,76 @@
+# ASHAScheduler 的晋级配额
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import pytest
+from common.asha import ASHAScheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return ASHAScheduler(min_iter=10, max_iter=100, eta=3, path=str(tmp_path / "asha.sqlite"))
+
+
+def test_budgets(scheduler):
+    assert scheduler.budgets(100) == [10, 30, 90, 100]
+    assert scheduler.budgets(500) == [10, 30, 90, 100]
+    assert scheduler.budgets(5) == [5]
+
+
+def test_promotion_quota(scheduler):
+    # 每个试验在登记时按 (损失, 登记顺序) 排名，排在前 max(n // eta, 1) 的晋级
+    losses = np.random.default_rng(0).integers(0, 5, size=30).astype(float)  # 含大量相同损失
+    promoted = [scheduler.report(0, loss) for loss in losses]
+
+    for i, loss in enumerate(losses):
+        rank = np.sum(losses[:i] <= loss)  # 先登记的相同损失排在前面
+        assert promoted[i] == (rank < max((i + 1) // 3, 1))
+    assert scheduler.report(1, 0.0)  # 各级分别排名
+
+
+def test_ties_respect_quota(scheduler):
+    # 损失全部相同时先登记的排在前面，之后的试验都在前 1/eta 之外
+    promoted = [scheduler.report(0, 1.0) for _ in range(9)]
+
+    assert promoted == [True] + [False] * 8
+
+    # 更小的损失仍然晋级，且不计入相同损失的配额
+    assert scheduler.report(0, 0.5)
+    assert not scheduler.report(0, 1.0)
+
+
+def test_worst(scheduler):
+    assert scheduler.worst(0) is None
+    for loss in (0.3, 0.1, 0.5):
+        scheduler.report(0, loss)
+
+    assert scheduler.worst(0) == 0.5
+    assert scheduler.worst(1) is None
+
+
+def _report(asha, rung, loss):
+    return asha.report(rung, loss)
+
+
+def test_scheduler_is_shared_with_spawned_workers(scheduler):
+    # 调度器随参数传给 spawn 启动的进程，各进程登记到同一份记录
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        assert executor.submit(_report, scheduler, 0, 0.2).result()
+        assert not executor.submit(_report, scheduler, 0, 0.3).result()
+
+    assert scheduler.worst(0) == 0.3
+
+
+def test_remove_deletes_the_study():
+    asha = ASHAScheduler()
+    asha.report(0, 0.1)
+    asha.remove()
+    assert not os.path.exists(asha.path)
+
+    # 新的调度器不沿用上一次调优的记录
+    fresh = ASHAScheduler()
+    try:
+        assert fresh.worst(0) is None
+    finally:
+        fresh.remove()
@@ -0,0 +1,64 @@
+# 滚动向前预测的下标对齐：训练窗口、查询样本与标签按时间顺序一一对应
+from functools import partial
+import numpy as np
+import pytest
+from common.backtest import block_indices, retrain_blocks, walk_forward
+from common.dataloader import WindowDataset
+
+T, step, input_size = 200, 5, 120
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    # 特征与标签都是时间下标，窗口的内容直接反映它在序列中的位置
+    features = np.repeat(np.arange(T, dtype=np.float32)[:, None], 2, axis=1)
+    return WindowDataset(features, np.arange(T, dtype=np.float32), step)
+
+
+@pytest.mark.parametrize("block_size", [1, 7])
+def test_block_indices_cover_each_step_once(dataset, block_size):
+    n_steps = len(dataset) - input_size
+    queries = []
+    for block in retrain_blocks(n_steps, block_size):
+        train, query = block_indices(block, input_size)
+
+        np.testing.assert_array_equal(train, np.arange(block.start, block.start + input_size))
+        assert query[0] == train[-1] + 1  # 查询样本紧随训练窗口
+        assert len(query) == len(block)
+        queries.append(query)
+
+    # 第 k 步预测第 k + input_size 个样本，全部测试样本恰好各预测一次
+    np.testing.assert_array_equal(np.concatenate(queries), np.arange(input_size, len(dataset)))
+
+
+@pytest.mark.parametrize("block_size", [1, 7])
+def test_windows_never_see_the_future(dataset, block_size):
+    for block in retrain_blocks(len(dataset) - input_size, block_size):
+        train, query = block_indices(block, input_size)
+
+        # 训练窗口的标签都早于任何查询样本的标签
+        assert dataset.y(train).max() < dataset.y(query).min()
+        # 查询窗口的特征只包含标签之前的时刻
+        x, y = dataset.x(query), dataset.y(query)
+        assert np.all(x[:, -1, 0] == y - 1)
+        np.testing.assert_array_equal(y, query + step)
+
+
+def _target_of_queries(X, Y, block, seed, input_size, step):
+    # 返回查询样本的标签，用于检查并行引擎按下标放回结果
+    _, query = block_indices(block, input_size)
+    return WindowDataset(X, Y, step).y(query)
+
+
+def test_walk_forward_aligns_predictions(dataset):
+    n_steps = len(dataset) - input_size
+    Y_pred = walk_forward(
+        partial(_target_of_queries, input_size=input_size, step=step),
+        dataset.features,
+        dataset.targets,
+        n_steps,
+        n_workers=2,
+        block_size=7,
+    )
+
+    np.testing.assert_array_equal(Y_pred, dataset.y(np.arange(input_size, len(dataset))))
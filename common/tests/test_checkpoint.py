@@ -0,0 +1,113 @@
+# 模型检查点：保存后加载的模型、归一化器、随机森林与 GARCH 状态与原对象的结果相同，并能继续训练
+import json
+import os
+import numpy as np
+import pytest
+import torch
+from quantile_forest import RandomForestQuantileRegressor
+from sklearn.preprocessing import MinMaxScaler
+from common.checkpoint import load_checkpoint, save_checkpoint, VERSION
+from common.garch import OnlineGarch
+from common.QWLSTMModel import QWLSTMModel
+
+n, T, features = 150, 5, 3
+
+
+def make_data():
+    rng = np.random.default_rng(0)
+    x = torch.from_numpy(rng.random((n, T, features)).astype(np.float32))
+    y = torch.from_numpy(rng.random(n).astype(np.float32))
+    return x, y
+
+
+def fit_model(quantile, x, y):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    model = QWLSTMModel(hs=4, quantile=quantile, dropout=0.0, num_layers=1, device="cpu")
+    model.fit(x, y, tau=None, batch_size=32, n_iter=10, lr=1e-2, verbose=False)
+    return model
+
+
+@pytest.mark.parametrize("quantile", [0.05, [0.025, 0.05, 0.1]])
+def test_round_trip(tmp_path, quantile):
+    x, y = make_data()
+    model = fit_model(quantile, x, y)
+
+    raw = np.random.default_rng(1).random((50, features)) * 100
+    scaler_x = MinMaxScaler().fit(raw)
+    scaler_y = MinMaxScaler().fit(raw[:, :1])
+    flat = x.reshape(n, -1).numpy()
+    forest = RandomForestQuantileRegressor(n_estimators=5, max_depth=3, random_state=0).fit(flat, y.numpy())
+    garch = OnlineGarch(refit_every=None)
+    garch.fit(np.random.default_rng(2).standard_normal(500) * 0.01)
+
+    save_checkpoint(
+        str(tmp_path), model, scaler_x=scaler_x, scaler_y=scaler_y, garch=garch, forest=forest,
+        leaf=forest.apply(flat), metadata={"market": "test"},
+    )
+    loaded = load_checkpoint(str(tmp_path))
+
+    np.testing.assert_array_equal(loaded["model"].predict(x), model.predict(x))
+    np.testing.assert_array_equal(loaded["scaler_x"].transform(raw), scaler_x.transform(raw))
+    np.testing.assert_array_equal(
+        loaded["scaler_y"].inverse_transform(raw[:, :1]), scaler_y.inverse_transform(raw[:, :1])
+    )
+    np.testing.assert_array_equal(
+        loaded["forest"].predict(flat, quantiles=[0.05]), forest.predict(flat, quantiles=[0.05])
+    )
+    np.testing.assert_array_equal(loaded["leaf"], forest.apply(flat))
+    assert OnlineGarch.from_state(loaded["garch"]).forecast() == pytest.approx(garch.forecast())
+    assert loaded["metadata"] == {"market": "test"}
+
+
+def test_warm_start_after_load_continues_training(tmp_path):
+    x, y = make_data()
+    model = fit_model(0.05, x, y)
+    save_checkpoint(str(tmp_path), model)
+    loaded = load_checkpoint(str(tmp_path))["model"]
+
+    # 同样的随机数下，加载后的模型与原模型的微调结果相同（优化器的动量也被恢复）
+    predictions = []
+    for m in (model, loaded):
+        torch.manual_seed(1)
+        np.random.seed(1)
+        m.fit(x, y, tau=None, batch_size=32, n_iter=5, lr=1e-2, verbose=False, warm_start=True)
+        predictions.append(m.predict(x))
+
+    np.testing.assert_allclose(predictions[1], predictions[0], rtol=1e-6)
+
+
+def test_checkpoint_without_optimizer_state(tmp_path):
+    x, y = make_data()
+    model = fit_model(0.05, x, y)
+    save_checkpoint(str(tmp_path), model)
+
+    # 没有登记 optimizer.pt 的检查点（如旧版本）从新的 Adam 开始
+    with open(tmp_path / "meta.json") as f:
+        meta = json.load(f)
+    meta["files"].remove("optimizer.pt")
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump(meta, f)
+
+    loaded = load_checkpoint(str(tmp_path))["model"]
+    assert loaded.optimizer.state_dict()["state"] == {}
+    loaded.fit(x, y, tau=None, batch_size=32, n_iter=3, lr=1e-2, verbose=False, warm_start=True)
+
+
+def test_rejects_newer_version_and_other_formats(tmp_path):
+    x, y = make_data()
+    save_checkpoint(str(tmp_path), fit_model(0.05, x, y))
+    path = os.path.join(tmp_path, "meta.json")
+    with open(path) as f:
+        meta = json.load(f)
+
+    for change in ({"version": VERSION + 1}, {"format": "something-else"}):
+        with open(path, "w") as f:
+            json.dump({**meta, **change}, f)
+        with pytest.raises(ValueError):
+            load_checkpoint(str(tmp_path))
+
+
+def test_unfitted_model_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        save_checkpoint(str(tmp_path), QWLSTMModel(hs=4, device="cpu"))
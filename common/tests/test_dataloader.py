@@ -0,0 +1,61 @@
+# 滑动窗口数据集：内存映射的 WindowDataset 与按下标取窗口的 WindowView 应与直接展开窗口的结果一致
+import numpy as np
+import torch
+from common.dataloader import WindowDataset, sliding_window, split_dataset
+from common.QWLSTMModel import QWLSTMModel
+
+T, step = 300, 7
+
+
+def make_arrays(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((T, 3)).astype(np.float32), rng.random((T, 1)).astype(np.float32)
+
+
+def test_open_and_split_match_split_dataset(tmp_path):
+    X, Y = make_arrays()
+    path = str(tmp_path / "windows.npy")
+    WindowDataset.save(path, X, Y)
+    dataset = WindowDataset.open(path, step)
+
+    expected = split_dataset(*sliding_window(X, Y, step))
+    assert len(dataset) == T - step
+    for name, idx in dataset.split().items():
+        np.testing.assert_array_equal(dataset.x(idx), expected[f"X_{name}"])
+        np.testing.assert_array_equal(dataset.y(idx), expected[f"Y_{name}"])
+
+        # 视图按下标取出的窗口与整组取出的相同
+        view = dataset.view(idx)
+        assert view.shape == expected[f"X_{name}"].shape
+        np.testing.assert_array_equal(view[:].numpy(), expected[f"X_{name}"])
+        batch = np.array([3, 0, 5])
+        np.testing.assert_array_equal(view[batch].numpy(), expected[f"X_{name}"][batch])
+        grid = torch.tensor([[1, 2], [4, 0]])
+        assert view[grid].shape == (2, 2, step, 3)
+
+
+def test_save_is_atomic(tmp_path):
+    X, Y = make_arrays()
+    path = str(tmp_path / "windows.npy")
+    WindowDataset.save(path, X, Y)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["windows.npy"]  # 临时文件已改名
+    np.testing.assert_array_equal(np.load(path), np.hstack([X, Y]))
+
+
+def test_fit_on_view_matches_fit_on_tensor():
+    X, Y = make_arrays()
+    dataset = WindowDataset(X, Y[:, 0], step)
+    idx = dataset.split()["train"]
+    x_val = torch.from_numpy(dataset.x(dataset.split()["val"]))
+
+    predictions = []
+    for x in (torch.from_numpy(dataset.x(idx)), dataset.view(idx)):
+        np.random.seed(0)
+        torch.manual_seed(0)
+        model = QWLSTMModel(hs=4, quantile=0.05, device="cpu")
+        model.fit(x, torch.from_numpy(dataset.y(idx)), tau=None, batch_size=16, n_iter=20, verbose=False)
+        predictions.append(model.predict(x_val))
+
+    # 同样的随机数下，按 batch 取窗口与先展开全部窗口的训练结果相同
+    np.testing.assert_allclose(predictions[0], predictions[1])
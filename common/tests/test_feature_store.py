@@ -0,0 +1,63 @@
+# 特征仓库：键随源数据内容与预处理配置变化，写入是原子的，load_market 命中时不再拟合 GARCH 与归一化
+import os
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+from common import market as market_module
+from common.feature_store import FeatureStore, load_scaler, scaler_arrays
+from common.market import load_market
+from common.tests.conftest import write_prices
+
+config = {"x_columns": ["Open"], "y_column": "Close", "feature_range": [0, 1]}
+
+
+def test_key_tracks_content_and_config(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    source = tmp_path / "prices.csv"
+    write_prices(source)
+    key = store.key(str(source), config)
+
+    os.utime(source, (0, 0))  # 只修改时间，内容不变
+    assert store.key(str(source), config) == key
+    assert store.key(str(source), {**config, "feature_range": [-1, 1]}) != key
+
+    write_prices(source, seed=1)
+    assert store.key(str(source), config) != key
+
+
+def test_save_load_round_trip(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    raw = np.random.default_rng(0).random((20, 3)) * 50
+    scaler = MinMaxScaler(feature_range=(-1, 1)).fit(raw)
+
+    assert store.load("missing") is None
+    store.save("k", {"X": raw, **scaler_arrays("scaler_x", scaler)})
+    assert sorted(os.listdir(tmp_path)) == ["k.npz"]  # 临时文件已改名
+
+    arrays = store.load("k")
+    np.testing.assert_array_equal(arrays["X"], raw)
+    restored = load_scaler(arrays, "scaler_x")
+    np.testing.assert_array_equal(restored.transform(raw), scaler.transform(raw))
+    np.testing.assert_array_equal(restored.inverse_transform(raw), scaler.inverse_transform(raw))
+
+
+def test_load_market_reuses_the_store(synthetic_market, monkeypatch):
+    name = synthetic_market()
+    first = load_market.__wrapped__(name)
+
+    # 源数据与配置都不变时直接读取特征仓库，不再拟合 GARCH
+    def no_fit(*args, **kwargs):
+        raise AssertionError("GARCH refitted on a feature store hit")
+
+    monkeypatch.setattr(market_module, "fit_volatility", no_fit)
+    second = load_market.__wrapped__(name)
+    for key in ("X", "Y", "log_return", "volatility"):
+        np.testing.assert_array_equal(second[key], first[key])
+    np.testing.assert_array_equal(
+        second["scaler_y"].inverse_transform(second["Y"]), first["scaler_y"].inverse_transform(first["Y"])
+    )
+
+    # 源数据变化后重新计算
+    write_prices(market_module.MARKETS[name]["source"], seed=5)
+    with pytest.raises(AssertionError):
+        load_market.__wrapped__(name)
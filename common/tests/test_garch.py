@@ -0,0 +1,39 @@
+# 在线 GARCH 不使用未来数据
+import numpy as np
+import pytest
+from common.garch import OnlineGarch, online_volatility
+
+
+@pytest.fixture(scope="module")
+def returns():
+    # GARCH(1,1) 模拟的收益率，量级与日收益率的百分数相近
+    rng = np.random.default_rng(0)
+    r, sigma2 = np.empty(600), 1.0
+    for t in range(len(r)):
+        r[t] = np.sqrt(sigma2) * rng.standard_normal()
+        sigma2 = 0.1 + 0.1 * r[t] ** 2 + 0.8 * sigma2
+    return r
+
+
+@pytest.mark.parametrize("t", [300, 420, 599])
+def test_online_volatility_ignores_the_future(returns, t):
+    initial, refit_every = 300, 50
+    base = online_volatility(returns, initial, refit_every=refit_every)
+
+    changed = returns.copy()
+    changed[t:] = np.random.default_rng(t).standard_normal(len(returns) - t) * 5
+    other = online_volatility(changed, initial, refit_every=refit_every)
+
+    # sigma[t] 只依赖 t-1 及以前的收益率
+    np.testing.assert_array_equal(base[: t + 1], other[: t + 1])
+    assert not np.allclose(base[t + 1 :], other[t + 1 :]) or t + 1 == len(returns)
+
+
+def test_state_round_trip(returns):
+    garch = OnlineGarch(refit_every=None)
+    garch.fit(returns[:400])
+    restored = OnlineGarch.from_state(garch.state())
+
+    for r in returns[400:450]:
+        assert restored.update(r) == pytest.approx(garch.update(r))
+    assert restored.forecast() == pytest.approx(garch.forecast())
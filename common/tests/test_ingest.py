@@ -0,0 +1,64 @@
+# 列式缓存：源文件不变时复用缓存，只被 touch 时不重建，内容变化时重建；不同的列选择互不覆盖
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from common import ingest
+from common.ingest import read_columns
+from common.tests.conftest import write_prices
+
+columns = {"Open": "open", "Close": "close"}
+
+
+def no_read(*args, **kwargs):
+    raise AssertionError("source file read again")
+
+
+def test_reads_selected_columns_with_dtypes(tmp_path):
+    source = tmp_path / "prices.csv"
+    write_prices(source)
+    data = read_columns(str(source), columns, dtypes={"close": np.float64}, cache_dir=str(tmp_path / "cache"))
+
+    expected = pd.read_csv(source)
+    assert list(data.columns) == ["open", "close"]
+    assert data["open"].dtype == np.float32 and data["close"].dtype == np.float64
+    np.testing.assert_array_equal(data["close"], expected["Close"])
+    np.testing.assert_allclose(data["open"], expected["Open"], rtol=1e-6)
+
+
+def test_cache_reuse_touch_and_invalidation(tmp_path, monkeypatch):
+    source = tmp_path / "prices.csv"
+    cache_dir = str(tmp_path / "cache")
+    write_prices(source)
+    first = read_columns(str(source), columns, cache_dir=cache_dir)
+    (cache,) = os.listdir(cache_dir)
+
+    monkeypatch.setattr(ingest, "_read_source", no_read)
+    pd.testing.assert_frame_equal(read_columns(str(source), columns, cache_dir=cache_dir), first)
+
+    # 只修改时间：比对内容摘要后更新记录的修改时间，不重新读取源文件
+    os.utime(source, ns=(10**18, 10**18))
+    pd.testing.assert_frame_equal(read_columns(str(source), columns, cache_dir=cache_dir), first)
+    with np.load(os.path.join(cache_dir, cache)) as f:
+        assert int(f["_mtime_ns"]) == 10**18
+
+    # 内容变化：重新读取
+    write_prices(source, seed=1)
+    with pytest.raises(AssertionError):
+        read_columns(str(source), columns, cache_dir=cache_dir)
+    monkeypatch.undo()
+    changed = read_columns(str(source), columns, cache_dir=cache_dir)
+    np.testing.assert_array_equal(changed["close"], pd.read_csv(source)["Close"].astype(np.float32))
+
+
+def test_column_selections_use_separate_files(tmp_path):
+    source = tmp_path / "prices.csv"
+    cache_dir = tmp_path / "cache"
+    write_prices(source)
+
+    read_columns(str(source), columns, cache_dir=str(cache_dir))
+    read_columns(str(source), {"Volume": "volume"}, cache_dir=str(cache_dir))
+    read_columns(str(source), columns, dtypes={"close": np.float64}, cache_dir=str(cache_dir))
+
+    assert len(os.listdir(cache_dir)) == 3
+    assert not [p for p in os.listdir(cache_dir) if p.endswith(".tmp")]
@@ -0,0 +1,74 @@
+# 面板训练的端到端测试：两个合成资产共用一个带资产嵌入的模型
+import numpy as np
+import pytest
+import torch
+from common.panel import panel_leaf, panel_sample_weight, train_panel
+from common.QWLSTMModel import leaf_colsum, leaf_keys, rf_sample_weight
+
+params = dict(
+    hidden_size=4,
+    dropout=0.0,
+    num_layers=1,
+    batch_size=32,
+    n_iter=5,
+    lr=1e-2,
+    tol=0,
+    n_estimators=5,
+    min_samples_split=5,
+    min_samples_leaf=5,
+    max_depth=4,
+)
+rf_params = dict(n_estimators=5, min_samples_leaf=5)
+
+
+@pytest.mark.parametrize("weighting", ["leaf", "sample_weight"])
+@pytest.mark.parametrize("per_asset_rf", [False, True])
+def test_train_panel_end_to_end(synthetic_market, tmp_path, per_asset_rf, weighting):
+    markets = (synthetic_market(seed=0), synthetic_market(seed=1))
+    model, report = train_panel(
+        markets, params, tau=0.5, per_asset_rf=per_asset_rf, weighting=weighting, verbose=False
+    )
+
+    assert model.n_iter_ == params["n_iter"]
+    assert set(report) == set(markets)
+    for res in report.values():
+        assert 0 <= res["violations"] <= res["n"]
+        assert res["loss"] == pytest.approx(abs(res["rate"] - 0.05))
+
+    # 缓存都写在 tmp_path 中
+    assert {"feature_store", "ingest_cache", "window_store"} <= {p.name for p in tmp_path.iterdir()}
+
+
+def make_panel():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((80, 3))
+    y = rng.standard_normal(80)
+    assets = np.repeat([0, 1], 40)
+    return x, y, assets
+
+
+def test_panel_sample_weight_per_asset():
+    x, y, assets = make_panel()
+
+    pooled = panel_sample_weight(x, y, assets, rf_params)
+    per_asset = panel_sample_weight(x, y, assets, rf_params, per_asset=True)
+
+    assert pooled.shape == per_asset.shape == (80,)
+    # 按资产计算时每个样本的列和只来自本资产的 40 个样本
+    assert np.all(per_asset <= 39) and np.all(per_asset >= 0)
+    for a in (0, 1):
+        mask = assets == a
+        alone = rf_sample_weight(panel_leaf(x[mask], y[mask], assets[mask], rf_params))
+        np.testing.assert_allclose(per_asset[mask], alone)
+
+
+def test_panel_leaf_per_asset_is_block_diagonal():
+    x, y, assets = make_panel()
+    keys = torch.as_tensor(leaf_keys(panel_leaf(x, y, assets, rf_params, per_asset=True)))
+
+    # 混合两个资产的 batch，列和等于各资产部分分别计算的列和
+    idx = np.array([0, 5, 41, 7, 60, 79, 12])
+    colsum = leaf_colsum(keys, idx)
+    for a in (0, 1):
+        part = assets[idx] == a
+        torch.testing.assert_close(colsum[torch.as_tensor(part)], leaf_colsum(keys, idx[part]))
@@ -0,0 +1,94 @@
+# 分组训练：QWLSTMPopulation 应与用相同初始参数、相同 batch 分别训练的 K 个 LSTMModel 一致
+import numpy as np
+import torch
+from common.parallel_tuner import batch_maximize
+from common.population import QWLSTMPopulation
+from common.QWLSTMModel import LSTMModel, QWLSTMModel
+
+n, T, features, hs, num_layers = 120, 6, 3, 5, 2
+seed = 3
+
+
+def make_data():
+    rng = np.random.default_rng(0)
+    x = torch.from_numpy(rng.random((n, T, features)).astype(np.float32))
+    y = torch.from_numpy(rng.random(n).astype(np.float32))
+    sample_weight = rng.random((3, n)).astype(np.float32)
+    return x, y, sample_weight
+
+
+def reference(x, y, lr, batch_size, n_iter, tau, sample_weight):
+    """按 QWLSTMPopulation.fit 的随机数顺序逐个训练：初始参数来自全局种子，batch 来自独立的生成器"""
+    K = len(lr)
+    torch.manual_seed(seed)
+    models = [LSTMModel(features, hs, num_layers, 1, 0.0) for _ in range(K)]
+
+    generator = torch.Generator()
+    generator.manual_seed(seed)
+    B = max(batch_size)
+    batches = [torch.rand(K, n, generator=generator).argsort(dim=1)[:, :B] for _ in range(max(n_iter))]
+
+    predictions = []
+    for k, fnet in enumerate(models):
+        model = QWLSTMModel(hs=hs, quantile=0.05, dropout=0.0, num_layers=num_layers, device="cpu")
+        model.fnet = fnet
+        optimizer = torch.optim.Adam(fnet.parameters(), lr=lr[k])
+        weight = torch.as_tensor(sample_weight[k])
+        for i in range(n_iter[k]):
+            idx = batches[i][k, : batch_size[k]]
+            loss = model._batch_loss(x[idx], y[idx], idx, n, model.q, tau, sample_weight=weight)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        predictions.append(model.predict(x))
+
+    return np.stack(predictions)
+
+
+def test_forward_matches_lstm_model():
+    x, _, _ = make_data()
+    population = QWLSTMPopulation(3, hs=hs, num_layers=num_layers, dropout=0.0)
+    torch.manual_seed(seed)
+    population._init_params(features)
+
+    # 拆分出的单个模型与批量前向的输出相同
+    expected = np.stack([model.predict(x) for model in population.to_models()])
+    np.testing.assert_allclose(population.predict(x), expected, atol=1e-6)
+
+
+def test_fit_matches_separate_models():
+    x, y, sample_weight = make_data()
+    lr, batch_size, n_iter = [0.01, 0.03, 0.005], [16, 32, 8], [30, 20, 40]
+
+    population = QWLSTMPopulation(3, hs=hs, num_layers=num_layers, dropout=0.0)
+    population.fit(
+        x, y, lr=lr, batch_size=batch_size, n_iter=n_iter, tol=0.0, tau=0.5,
+        sample_weight=sample_weight, seed=seed, verbose=False,
+    )
+
+    np.testing.assert_array_equal(population.n_iter_.numpy(), n_iter)
+    np.testing.assert_allclose(
+        population.predict(x), reference(x, y, lr, batch_size, n_iter, 0.5, sample_weight), atol=1e-4
+    )
+
+
+def test_batch_maximize_shares_only_when_allowed():
+    pbounds = {"hidden_size": (4, 128), "num_layers": (1, 4), "lr": (1e-4, 1e-1)}
+    batches = []
+
+    def batch_f(batch):
+        batches.append(batch)
+        return [-params["lr"] for params in batch]
+
+    allowed = [True, False, True]
+    batch_maximize(
+        batch_f, pbounds, init_points=12, n_iter=0, batch_size=4, random_state=0,
+        shared=("hidden_size", "num_layers"), share_if=lambda params: allowed[len(batches)],
+    )
+
+    for batch, share in zip(batches, allowed):
+        sizes = {(params["hidden_size"], params["num_layers"]) for params in batch}
+        if share:
+            assert len(sizes) == 1
+        else:  # 不统一时保留各自的随机建议
+            assert len(sizes) == len(batch)
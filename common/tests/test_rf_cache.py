@@ -0,0 +1,86 @@
+# 随机森林缓存：键随参数、种子与数据指纹变化，命中时不重新拟合，磁盘写入是原子的，内存按字节预算淘汰
+import json
+import os
+import numpy as np
+import pytest
+from common import rf_cache as rf_cache_module
+from common.rf_cache import ForestCache
+
+params = dict(n_estimators=5, max_depth=3)
+
+
+def make_data():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((60, 4)), rng.standard_normal(60)
+
+
+def test_key_depends_on_params_seed_and_data():
+    key = ForestCache.key(params, 0, "abc")
+
+    assert key == ForestCache.key(dict(reversed(list(params.items()))), 0, "abc")
+    assert key != ForestCache.key({**params, "max_depth": 4}, 0, "abc")
+    assert key != ForestCache.key(params, 1, "abc")
+    assert key != ForestCache.key(params, 0, "abd")
+
+
+def test_fit_forest_hits_memory_and_disk(tmp_path, monkeypatch):
+    X, y = make_data()
+    cache = ForestCache(str(tmp_path))
+    arrays, _ = cache.fit_forest(params, 0, X, y, "abc")
+    assert arrays["leaf"].shape == (60, 5) and arrays["sample_weight"].shape == (60,)
+
+    # 命中缓存时不再拟合
+    def no_fit(*args, **kwargs):
+        raise AssertionError("forest refitted on a cache hit")
+
+    monkeypatch.setattr(rf_cache_module, "RandomForestQuantileRegressor", no_fit)
+    again, _ = cache.fit_forest(params, 0, None, None, "abc")
+    np.testing.assert_array_equal(again["leaf"], arrays["leaf"])
+
+    # 新的实例（另一个进程）从磁盘以内存映射方式读回
+    reloaded, forest = ForestCache(str(tmp_path)).fit_forest(params, 0, None, None, "abc")
+    assert isinstance(reloaded["leaf"], np.memmap) and forest is None
+    np.testing.assert_array_equal(reloaded["leaf"], arrays["leaf"])
+    np.testing.assert_array_equal(reloaded["sample_weight"], arrays["sample_weight"])
+
+    # 数据指纹变化时重新拟合
+    with pytest.raises(AssertionError):
+        cache.fit_forest(params, 0, X, y, "other")
+
+
+def test_put_is_atomic(tmp_path, monkeypatch):
+    cache = ForestCache(str(tmp_path))
+    arrays = {"leaf": np.arange(6).reshape(3, 2), "sample_weight": np.ones(3)}
+    cache.put("done", arrays)
+    assert sorted(os.listdir(tmp_path)) == ["done.json", "done.leaf.npy", "done.sample_weight.npy"]
+
+    # 写索引之前中断：数组已经改名，但没有索引的条目不会被读到
+    def fail(*args, **kwargs):
+        raise OSError("interrupted")
+
+    monkeypatch.setattr(json, "dump", fail)
+    with pytest.raises(OSError):
+        cache.put("broken", arrays)
+    monkeypatch.undo()
+
+    assert ForestCache(str(tmp_path)).get("broken") is None
+    assert ForestCache(str(tmp_path)).get("done") is not None
+
+
+def entry(value):
+    return {"leaf": np.full(100, value, dtype=np.int64)}  # 800 字节
+
+
+def test_memory_lru_eviction(tmp_path):
+    cache = ForestCache(str(tmp_path), max_bytes=2000)
+
+    cache.put("a", entry(1))
+    cache.put("b", entry(2))
+    cache.get("a")  # a 最近被使用
+    cache.put("c", entry(3))
+
+    assert list(cache._memory) == ["a", "c"]
+    assert cache._bytes == 1600
+    # 被淘汰的条目仍可从磁盘读回
+    arrays, _ = cache.get("b")
+    np.testing.assert_array_equal(arrays["leaf"], 2)
@@ -0,0 +1,85 @@
+# 滚动随机森林：过期的树按 max_age 淘汰；max_age=0 时每步完整重训，分位数与 RandomForestQuantileRegressor 接近
+import numpy as np
+import pytest
+from quantile_forest import RandomForestQuantileRegressor
+from common.rolling_forest import RollingQuantileForest
+
+rf_params = dict(n_estimators=40, min_samples_leaf=5, max_depth=6)
+
+
+def make_windows(n_steps=6, n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n + n_steps, 3))
+    y = X[:, 0] + 0.5 * rng.standard_normal(n + n_steps)
+    return [(X[i : i + n], y[i : i + n]) for i in range(n_steps)]
+
+
+@pytest.mark.parametrize("max_age", [1, 2, 3])
+def test_trees_retire_after_max_age(max_age):
+    forest = RollingQuantileForest(n_new=10, max_age=max_age, random_state=0, **rf_params)
+
+    for step, (X, y) in enumerate(make_windows()):
+        forest.update(X, y)
+
+        assert all(step - birth < max_age for birth in forest.birth_)
+        # 淘汰后空出的位置都在本步补齐，树池保持满员
+        assert len(forest.estimators_) == rf_params["n_estimators"]
+    if max_age == 1:  # 上一步的树全部过期，每步都完整重训
+        assert forest.birth_ == [step] * rf_params["n_estimators"]
+
+
+def test_pool_retires_oldest_without_max_age():
+    forest = RollingQuantileForest(n_new=10, random_state=0, **rf_params)
+
+    for step, (X, y) in enumerate(make_windows()):
+        forest.update(X, y)
+
+    # 每步生成 10 棵，40 棵的树池只保留最近 4 步生成的树
+    assert sorted(set(forest.birth_)) == [2, 3, 4, 5]
+    assert forest.n_grown_ == 40 + 10 * 5
+
+
+def test_max_age_zero_matches_full_refit():
+    windows = make_windows(n_steps=3)
+    forest = RollingQuantileForest(n_new=10, max_age=0, random_state=0, **rf_params)
+    for X, y in windows:
+        forest.update(X, y)
+    assert forest.birth_ == [2] * rf_params["n_estimators"]  # 每步都完整重训
+
+    X, y = windows[-1]
+    X_new = np.random.default_rng(1).standard_normal((200, 3))
+    quantiles = [0.1, 0.5, 0.9]
+    full = [
+        RandomForestQuantileRegressor(random_state=seed, **rf_params).fit(X, y).predict(X_new, quantiles=quantiles)
+        for seed in (0, 1)
+    ]
+
+    # 随机数不同，分位数不会完全相同：与完整重训的差距不应明显大于两次完整重训之间的差距
+    diff = np.abs(forest.predict(X_new, quantiles) - full[0]).mean()
+    assert diff < 1.25 * np.abs(full[1] - full[0]).mean()
+
+
+def test_predict_with_no_matching_training_leaf():
+    X, y = make_windows(n_steps=1)[0]
+    forest = RollingQuantileForest(n_new=10, random_state=0, **rf_params).update(X, y)
+    # 查询样本的叶子在最新窗口中都没有样本时退化为最新窗口的经验分位数
+    forest.X_train_leaf_ = np.full_like(forest.X_train_leaf_, forest.apply(X).max() + 1)
+
+    with np.errstate(all="raise"):
+        y_pred = forest.predict(X[:5], [0.5])
+
+    np.testing.assert_allclose(y_pred[:, 0], np.quantile(y, 0.5, method="inverted_cdf"))
+
+
+def test_benchmark_times_a_full_refit():
+    forest = RollingQuantileForest(n_new=10, random_state=0, benchmark=True, **rf_params)
+    plain = RollingQuantileForest(n_new=10, random_state=0, **rf_params)
+    for X, y in make_windows(n_steps=3):
+        forest.update(X, y)
+        plain.update(X, y)
+
+    assert forest.refit_time_ > 0 and plain.refit_time_ == 0
+    assert "saving" in forest.report() and "not timed" in plain.report()
+    # 基准的计时不影响树池中的树
+    X, _ = make_windows(n_steps=1)[0]
+    np.testing.assert_array_equal(forest.apply(X), plain.apply(X))
@@ -0,0 +1,68 @@
+# 试验缓存：键的稳定性、数据集指纹、跨进程持久化与最近最少使用淘汰
+import numpy as np
+import torch
+from common import trial_cache as trial_cache_module
+from common.trial_cache import canonical_params, dataset_hash, TrialCache
+
+params = dict(hidden_size=8, num_layers=2, lr=0.0123456, dropout=0.1)
+
+
+class FakeClock:
+    # 每次调用前进 1 秒，最近使用时间不会相同
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+
+def test_key_is_stable(tmp_path):
+    cache = TrialCache(str(tmp_path / "trials.sqlite"))
+
+    same = dict(hidden_size=np.int64(8), num_layers=2, lr=0.0123449, dropout=0.1)  # 3 位有效数字相同
+    assert cache.key(params, "abc", 0.05) == cache.key(same, "abc", 0.05)
+    assert cache.key(params, "abc", 0.05) == cache.key(dict(reversed(list(params.items()))), "abc", 0.05)
+
+    assert cache.key(params, "abc", 0.05) != cache.key({**params, "lr": 0.0124}, "abc", 0.05)
+    assert cache.key(params, "abc", 0.05) != cache.key(params, "abd", 0.05)
+    assert cache.key(params, "abc", 0.05) != cache.key(params, "abc", 0.1)
+    assert canonical_params(params) == (("dropout", 0.1), ("hidden_size", 8), ("lr", 0.0123), ("num_layers", 2))
+
+
+def test_dataset_hash_tracks_content():
+    x = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    assert dataset_hash(x) == dataset_hash(torch.from_numpy(x)) == dataset_hash(x.copy())
+    changed = x.copy()
+    changed[1, 2] += 1
+    assert dataset_hash(changed) != dataset_hash(x)
+    assert dataset_hash(x.reshape(4, 3)) != dataset_hash(x)  # 形状也是指纹的一部分
+    assert dataset_hash(x.astype(np.float64)) != dataset_hash(x)
+
+
+def test_put_get_persists_across_instances(tmp_path):
+    path = str(tmp_path / "trials.sqlite")
+    cache = TrialCache(path)
+    key = cache.key(params, "abc", 0.05)
+
+    assert cache.get(key) is None
+    cache.put(key, -0.25)
+    assert cache.get(key) == -0.25
+    assert TrialCache(path).get(key) == -0.25  # 另一个进程打开同一个文件
+
+    cache.put(key, -0.5)  # 同一个键覆盖
+    assert cache.get(key) == -0.5
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(trial_cache_module, "time", FakeClock())
+    cache = TrialCache(str(tmp_path / "trials.sqlite"), max_entries=2)
+
+    cache.put("a", 1.0)
+    cache.put("b", 2.0)
+    assert cache.get("a") == 1.0  # a 最近被使用，b 最久未使用
+    cache.put("c", 3.0)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1.0 and cache.get("c") == 3.0
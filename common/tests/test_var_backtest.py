@@ -0,0 +1,168 @@
+# VaR 回测检验与手算的似然比、普通最小二乘回归以及逐个序列的循环对照；CoverageMonitor 与每个前缀上的整体检验对照
+import math
+import warnings
+import numpy as np
+import pytest
+from scipy.stats import chi2
+from common.var_backtest import (
+    backtest,
+    christoffersen,
+    conditional_coverage,
+    CoverageMonitor,
+    dq_test,
+    hits,
+    kupiec_pof,
+)
+
+q = 0.05
+
+
+def make_series(S=3, K=2, T=250, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = rng.standard_normal((S, T))
+    y_pred = -1.6 + 0.3 * rng.standard_normal((S, K, T))
+    return y_true, y_pred
+
+
+def kupiec_by_hand(x, n, p):
+    # LR = -2 ln[(1 - p)^(n - x) p^x / ((1 - x/n)^(n - x) (x/n)^x)]
+    rate = x / n
+    null = (n - x) * math.log(1 - p) + x * math.log(p)
+    alt = (n - x) * math.log(1 - rate) + x * math.log(rate)
+    return -2 * (null - alt)
+
+
+def christoffersen_by_hand(hit):
+    n = {(i, j): 0 for i in (0, 1) for j in (0, 1)}
+    for prev, curr in zip(hit[:-1], hit[1:]):
+        n[int(prev), int(curr)] += 1
+    pi0 = n[0, 1] / (n[0, 0] + n[0, 1])
+    pi1 = n[1, 1] / (n[1, 0] + n[1, 1])
+    pi = (n[0, 1] + n[1, 1]) / sum(n.values())
+    null = (n[0, 0] + n[1, 0]) * math.log(1 - pi) + (n[0, 1] + n[1, 1]) * math.log(pi)
+    alt = (
+        n[0, 0] * math.log(1 - pi0) + n[0, 1] * math.log(pi0) + n[1, 0] * math.log(1 - pi1) + n[1, 1] * math.log(pi1)
+    )
+    return -2 * (null - alt)
+
+
+@pytest.mark.parametrize("x, n", [(3, 100), (12, 250), (5, 100)])
+def test_kupiec_matches_hand_computation(x, n):
+    lr, p = kupiec_pof(x, n, q)
+
+    assert lr == pytest.approx(kupiec_by_hand(x, n, q))
+    assert p == pytest.approx(math.erfc(math.sqrt(lr / 2)))  # 自由度为 1 的卡方分布的尾概率
+
+
+def test_kupiec_edge_cases():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert kupiec_pof(0, 0, q) == (0.0, 1.0)
+        lr, _ = kupiec_pof(0, 100, q)  # 没有违约：LR = -2 * 100 * ln(0.95)
+
+    assert lr == pytest.approx(-2 * 100 * math.log(1 - q))
+
+
+def test_christoffersen_and_cc_match_hand_computation():
+    hit = np.zeros(60, dtype=bool)
+    hit[[3, 4, 5, 20, 33, 34, 50]] = True  # 带有聚集的违约
+
+    ind, ind_p = christoffersen(hit)
+    assert ind == pytest.approx(christoffersen_by_hand(hit))
+    assert ind_p == pytest.approx(math.erfc(math.sqrt(ind / 2)))
+
+    cc, cc_p = conditional_coverage(hit, q)
+    assert cc == pytest.approx(kupiec_by_hand(hit.sum(), len(hit), q) + christoffersen_by_hand(hit))
+    assert cc_p == pytest.approx(math.exp(-cc / 2))  # 自由度为 2 的卡方分布的尾概率
+
+
+def test_dq_matches_least_squares():
+    y_true, y_pred = make_series(S=1, K=1)
+    y_true, y_pred = y_true[0], y_pred[0, 0]
+    lags = 4
+    hit = hits(y_true, y_pred)
+
+    h = hit - q
+    lagged = [h[lags - k : len(h) - k] for k in range(1, lags + 1)]
+    X = np.column_stack([np.ones(len(h) - lags)] + lagged + [y_pred[lags:]])
+    beta, *_ = np.linalg.lstsq(X, h[lags:], rcond=None)
+    fitted = X @ beta
+    expected = fitted @ fitted / (q * (1 - q))
+
+    dq, _ = dq_test(hit, y_pred, q, lags)
+    assert dq == pytest.approx(expected)
+
+
+def test_batched_matches_per_series():
+    y_true, y_pred = make_series()
+    quantiles = np.array([0.05, 0.1])
+
+    result = backtest(y_true[:, None], y_pred, quantiles)
+    assert result["pof"].shape == result["dq"].shape == (3, 2)
+
+    for s in range(3):
+        for k in range(2):
+            single = backtest(y_true[s], y_pred[s, k], quantiles[k])
+            for name in ("violations", "pof", "ind", "cc", "dq", "dq_pvalue", "cc_pvalue"):
+                assert result[name][s, k] == pytest.approx(single[name]), name
+
+
+def test_monitor_empty():
+    monitor = CoverageMonitor(q, horizon=100, abort_alpha=0.05)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        summary = monitor.summary()
+
+    assert summary["n"] == 0 and summary["rate"] == 0.0
+    assert (summary["kupiec"], summary["kupiec_pvalue"]) == (0.0, 1.0)
+    assert (summary["ind"], summary["ind_pvalue"]) == (0.0, 1.0)
+
+
+def test_monitor_matches_backtest_on_each_prefix():
+    y_true, y_pred = make_series(S=1, K=1, T=120)
+    y_true, y_pred = y_true[0], y_pred[0, 0]
+    monitor = CoverageMonitor(q, window=20)
+
+    for t in range(1, len(y_true) + 1):
+        monitor.update(y_true[t - 1], y_pred[t - 1])
+        summary = monitor.summary()
+        hit = hits(y_true[:t], y_pred[:t])
+
+        assert summary["n"] == t
+        assert summary["violations"] == hit.sum()
+        assert summary["rolling_rate"] == pytest.approx(hit[-20:].mean())
+        pof, pof_p = kupiec_pof(hit.sum(), t, q)
+        assert (summary["kupiec"], summary["kupiec_pvalue"]) == (pytest.approx(pof), pytest.approx(pof_p))
+        ind, ind_p = christoffersen(hit)
+        assert (summary["ind"], summary["ind_pvalue"]) == (pytest.approx(ind), pytest.approx(ind_p))
+        if t > 10:  # DQ 的回归需要足够的样本，只在较长的前缀上对照整体回测
+            result = backtest(y_true[:t], y_pred[:t], q)
+            assert summary["kupiec"] == pytest.approx(result["pof"])
+            assert summary["ind"] == pytest.approx(result["ind"])
+
+        # 连续违约的段数与最长长度
+        edges = np.diff(np.concatenate([[0], hit.astype(int), [0]]))
+        runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        assert summary["clusters"] == len(runs)
+        assert summary["max_run"] == (runs.max() if len(runs) else 0)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_unrecoverable_exactly_when_best_count_fails(seed):
+    horizon, alpha = 80, 0.05
+    critical = chi2.isf(alpha, 1)
+    rng = np.random.default_rng(seed)
+    hit = rng.random(horizon) < 0.15  # 违约率明显偏高，中途变为无法通过
+    monitor = CoverageMonitor(q, horizon=horizon, abort_alpha=alpha)
+
+    states = []
+    for t in range(horizon):
+        monitor.update(0.0, 1.0 if hit[t] else -1.0)
+        # 枚举剩余步数所有可能的违约次数，最终 Kupiec 检验都拒绝时才无法恢复
+        reachable = monitor.violations + np.arange(horizon - monitor.n + 1)
+        lr, _ = kupiec_pof(reachable, horizon, q)
+        assert monitor.unrecoverable == bool(lr.min() > critical)
+        states.append(monitor.unrecoverable)
+
+    assert states[0] is False and states[-1] is True  # 确实在中途发生了切换
@@ -0,0 +1,125 @@
+# 贝叶斯优化的试验缓存：取整后相同的超参数组合直接返回已有的目标值
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+import numpy as np
+import torch
+
+
+def dataset_hash(*arrays):
+    """数据集指纹，由各数组的形状、类型与内容计算
+
+    Args:
+        *arrays (np.ndarray | torch.Tensor): 训练集、验证集等
+
+    Returns:
+        str: sha1 摘要
+    """
+    h = hashlib.sha1()
+    for arr in arrays:
+        if isinstance(arr, torch.Tensor):
+            arr = arr.detach().cpu().numpy()
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.shape}{arr.dtype.str}".encode())
+        h.update(arr.tobytes())
+
+    return h.hexdigest()
+
+
+def canonical_params(params: dict, digits: int = 3):
+    """规范化超参数：整数保持不变，浮点数保留 digits 位有效数字，使相近的点映射到同一个键
+
+    Args:
+        params (dict): 超参数（整数参数应已按 calculate_loss 的方式取整）
+        digits (int, optional): 浮点数有效数字位数. Defaults to 3.
+
+    Returns:
+        tuple: 按参数名排序的 (name, value) 元组
+    """
+    items = []
+    for name in sorted(params):
+        value = params[name]
+        if isinstance(value, (int, np.integer)):
+            value = int(value)
+        else:
+            value = float(f"{float(value):.{digits}g}")
+        items.append((name, value))
+
+    return tuple(items)
+
+
+class TrialCache:
+
+    def __init__(self, path: str = "trial_cache.sqlite", max_entries: int = 10000, digits: int = 3):
+        """基于 SQLite 的持久化试验缓存，超过 max_entries 时按最近最少使用淘汰
+
+        每次读写都新建连接，多个进程（如并行贝叶斯优化的工作进程）可以共用同一个文件。
+
+        Args:
+            path (str, optional): 数据库文件路径. Defaults to "trial_cache.sqlite".
+            max_entries (int, optional): 最大条目数. Defaults to 10000.
+            digits (int, optional): 浮点参数保留的有效数字位数. Defaults to 3.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.digits = digits
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trials (key TEXT PRIMARY KEY, target REAL, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS trials_last_used ON trials (last_used)")
+
+    def _connect(self):
+
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, params: dict, dataset: str, quantile: float):
+        """缓存键：规范化的超参数、数据集指纹与分位数
+
+        Args:
+            params (dict): 超参数
+            dataset (str): dataset_hash 的结果
+            quantile (float): 分位数
+
+        Returns:
+            str: 缓存键
+        """
+        return json.dumps([canonical_params(params, self.digits), dataset, float(quantile)])
+
+    def get(self, key: str):
+        """读取缓存，命中时刷新最近使用时间
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            float: 目标值，未命中时为 None
+        """
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT target FROM trials WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE trials SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        return row[0]
+
+    def put(self, key: str, target: float):
+        """写入缓存，并淘汰超出容量的最久未使用条目
+
+        Args:
+            key (str): 缓存键
+            target (float): 目标值
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO trials (key, target, last_used) VALUES (?, ?, ?)",
+                (key, float(target), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM trials WHERE key IN "
+                "(SELECT key FROM trials ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
@@ -0,0 +1,316 @@
+# VaR 回测检验：Kupiec POF、Christoffersen 独立性、条件覆盖与 Engle-Manganelli DQ 检验
+# 全部在对数空间中计算，时间为最后一个维度，前面的维度可以是任意多个序列与分位数，一次向量化完成；
+# CoverageMonitor 在滚动预测过程中逐条累计同样的统计量
+from collections import deque
+import numpy as np
+from scipy.special import xlogy
+from scipy.stats import chi2
+
+
+def hits(y_true, y_pred):
+    """违约序列：实际值低于 VaR 预测值时为 1
+
+    Args:
+        y_true (np.ndarray): 实际值，shape (..., T)
+        y_pred (np.ndarray): 预测值，可与 y_true 广播
+
+    Returns:
+        np.ndarray: bool 数组，shape 为广播后的形状
+    """
+    return np.asarray(y_true) < np.asarray(y_pred)
+
+
+def _bernoulli_loglik(x, n, p):
+    # n 次试验中 x 次违约、违约概率为 p 的对数似然，0 * log(0) 记为 0
+    return xlogy(x, p) + xlogy(n - x, 1 - p)
+
+
+def kupiec_pof(violations, n, quantile):
+    """Kupiec 失败比例（POF）检验
+
+    LR = 2 * [log L(x / n) - log L(quantile)]，原假设下服从自由度为 1 的卡方分布。
+    在对数空间中计算，T 很大时也不会下溢。
+
+    Args:
+        violations (int | np.ndarray): 违约次数
+        n (int | np.ndarray): 观测数
+        quantile (float | np.ndarray): 分位数（期望违约率），三者可以互相广播；n 为 0 时统计量为 0
+
+    Returns:
+        tuple: (统计量, p 值)
+    """
+    x = np.asarray(violations, dtype=float)
+    n = np.asarray(n, dtype=float)
+
+    # 没有观测时两个似然都为 0，统计量为 0、p 值为 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(n > 0, x / n, 0.0)
+    lr = 2 * (_bernoulli_loglik(x, n, rate) - _bernoulli_loglik(x, n, quantile))
+    lr = np.maximum(lr, 0.0)  # 消除舍入误差带来的负值
+
+    return lr, chi2.sf(lr, 1)
+
+
+def christoffersen(hit):
+    """Christoffersen 独立性检验：违约是否聚集
+
+    由相邻两期的转移次数 n00、n01、n10、n11 比较一阶马尔可夫链与独立违约的似然，
+    统计量服从自由度为 1 的卡方分布。
+
+    Args:
+        hit (np.ndarray): 违约序列，shape (..., T)
+
+    Returns:
+        tuple: (统计量, p 值)
+    """
+    hit = np.asarray(hit, dtype=bool)
+    prev, curr = hit[..., :-1], hit[..., 1:]
+
+    n01 = np.sum(~prev & curr, axis=-1, dtype=float)
+    n11 = np.sum(prev & curr, axis=-1, dtype=float)
+    n0 = np.sum(~prev, axis=-1, dtype=float)  # n00 + n01
+    n1 = prev.shape[-1] - n0  # n10 + n11
+
+    lr = _independence_lr(n01, n0, n11, n1)
+
+    return lr, chi2.sf(lr, 1)
+
+
+def _independence_lr(n01, n0, n11, n1):
+    # 由转移次数计算 Christoffersen 独立性统计量，n0 = n00 + n01，n1 = n10 + n11
+    n01, n0, n11, n1 = (np.asarray(v, dtype=float) for v in (n01, n0, n11, n1))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pi01 = np.where(n0 > 0, n01 / n0, 0.0)
+        pi11 = np.where(n1 > 0, n11 / n1, 0.0)
+        pi = np.where(n0 + n1 > 0, (n01 + n11) / (n0 + n1), 0.0)
+
+    lr = 2 * (
+        _bernoulli_loglik(n01, n0, pi01) + _bernoulli_loglik(n11, n1, pi11) - _bernoulli_loglik(n01 + n11, n0 + n1, pi)
+    )
+
+    return np.maximum(lr, 0.0)
+
+
+def conditional_coverage(hit, quantile):
+    """Christoffersen 条件覆盖检验：LR_cc = LR_pof + LR_ind，服从自由度为 2 的卡方分布
+
+    Args:
+        hit (np.ndarray): 违约序列，shape (..., T)
+        quantile (float | np.ndarray): 分位数，可与 hit 的前面的维度广播
+
+    Returns:
+        tuple: (统计量, p 值)
+    """
+    hit = np.asarray(hit, dtype=bool)
+    pof, _ = kupiec_pof(hit.sum(axis=-1), hit.shape[-1], quantile)
+    ind, _ = christoffersen(hit)
+    lr = pof + ind
+
+    return lr, chi2.sf(lr, 2)
+
+
+def dq_test(hit, y_pred, quantile, lags: int = 4):
+    """Engle-Manganelli 动态分位数（DQ）检验
+
+    Hit_t = I(y_t < VaR_t) - quantile 对常数项、Hit_{t-1}, ..., Hit_{t-lags} 与 VaR_t 回归，
+    DQ = Hit' X (X'X)^-1 X' Hit / (quantile * (1 - quantile))，服从自由度为 lags + 2 的卡方分布。
+    所有序列的回归用批量矩阵运算一次完成；X'X 奇异（如没有违约）时使用伪逆。
+
+    Args:
+        hit (np.ndarray): 违约序列，shape (..., T)
+        y_pred (np.ndarray): VaR 预测值，可与 hit 广播
+        quantile (float | np.ndarray): 分位数，可与 hit 的前面的维度广播
+        lags (int, optional): 违约的滞后阶数. Defaults to 4.
+
+    Returns:
+        tuple: (统计量, p 值)
+    """
+    hit, y_pred = np.broadcast_arrays(np.asarray(hit, dtype=float), np.asarray(y_pred, dtype=float))
+    q = np.asarray(quantile, dtype=float)[..., None]
+    T = hit.shape[-1]
+
+    h = hit - q
+    y = h[..., lags:]  # (..., T - lags)
+    X = np.stack(
+        [np.ones_like(y)] + [h[..., lags - k : T - k] for k in range(1, lags + 1)] + [y_pred[..., lags:]],
+        axis=-1,
+    )  # (..., T - lags, lags + 2)
+
+    Xty = np.einsum("...tk,...t->...k", X, y)
+    XtX = np.einsum("...tk,...tl->...kl", X, X)
+    beta = np.einsum("...kl,...l->...k", np.linalg.pinv(XtX), Xty)
+
+    q = q[..., 0]
+    dq = np.einsum("...k,...k->...", beta, Xty) / (q * (1 - q))
+
+    return dq, chi2.sf(dq, lags + 2)
+
+
+def backtest(y_true, y_pred, quantile, lags: int = 4):
+    """一次计算所有回测统计量
+
+    y_true 与 y_pred 的最后一个维度为时间，前面的维度（序列、分位数等）与 quantile 广播，
+    例如 y_true (S, T)、y_pred (S, K, T) 需写成 y_true[:, None]，quantile 为 shape (K,) 的数组。
+
+    Args:
+        y_true (np.ndarray): 实际值，shape (..., T)
+        y_pred (np.ndarray): VaR 预测值，shape (..., T)
+        quantile (float | np.ndarray): 分位数
+        lags (int, optional): DQ 检验的滞后阶数. Defaults to 4.
+
+    Returns:
+        dict: violations、n、rate，以及 pof、ind、cc、dq 的统计量与对应的 *_pvalue，均为数组
+    """
+    hit = hits(y_true, y_pred)
+    quantile = np.broadcast_to(np.asarray(quantile, dtype=float), hit.shape[:-1])
+    violations = hit.sum(axis=-1)
+    n = hit.shape[-1]
+
+    pof, pof_p = kupiec_pof(violations, n, quantile)
+    ind, ind_p = christoffersen(hit)
+    cc = pof + ind
+    dq, dq_p = dq_test(hit, y_pred, quantile, lags)
+
+    return {
+        "violations": violations,
+        "n": n,
+        "rate": violations / n,
+        "pof": pof,
+        "pof_pvalue": pof_p,
+        "ind": ind,
+        "ind_pvalue": ind_p,
+        "cc": cc,
+        "cc_pvalue": chi2.sf(cc, 2),
+        "dq": dq,
+        "dq_pvalue": dq_p,
+    }
+
+
+class CoverageMonitor:
+
+    def __init__(self, quantile: float, horizon: int = None, window: int = 50, abort_alpha: float = None):
+        """滚动预测的在线覆盖率监控，每来一个预测值 O(1) 更新
+
+        累计违约次数、最近 window 步的违约率、Kupiec 与 Christoffersen 统计量以及违约聚集
+        （连续违约的段数与最长长度），结果与整段序列上的 kupiec_pof、christoffersen 相同。
+
+        设置 abort_alpha 与 horizon 后，若剩余 horizon - n 步无论怎样违约，
+        最终的 Kupiec 检验都会在 abort_alpha 水平拒绝原假设，unrecoverable 为 True，可以提前终止。
+
+        Args:
+            quantile (float): 分位数
+            horizon (int, optional): 计划的预测总步数. Defaults to None.
+            window (int, optional): 滚动违约率的窗口长度. Defaults to 50.
+            abort_alpha (float, optional): 提前终止的显著性水平，None 表示不提前终止. Defaults to None.
+        """
+        self.quantile = quantile
+        self.horizon = horizon
+        self.abort_alpha = abort_alpha
+        self._critical = None if abort_alpha is None else chi2.isf(abort_alpha, 1)
+
+        self.n = 0
+        self.violations = 0
+        self.transitions = np.zeros((2, 2), dtype=int)  # transitions[i, j]：上一期为 i、本期为 j 的次数
+        self.clusters = 0  # 连续违约的段数
+        self.run = 0  # 当前连续违约的长度
+        self.max_run = 0
+        self._last = None
+        self._window = deque(maxlen=window)
+        self._window_hits = 0
+
+    def update(self, y_true: float, y_pred: float):
+        """登记一个预测值
+
+        Args:
+            y_true (float): 实际值
+            y_pred (float): VaR 预测值
+
+        Returns:
+            bool: 本期是否违约
+        """
+        hit = bool(y_true < y_pred)
+
+        self.n += 1
+        self.violations += hit
+        if self._last is not None:
+            self.transitions[int(self._last), int(hit)] += 1
+        self._last = hit
+
+        if hit:
+            self.clusters += self.run == 0
+            self.run += 1
+            self.max_run = max(self.max_run, self.run)
+        else:
+            self.run = 0
+
+        if len(self._window) == self._window.maxlen:
+            self._window_hits -= self._window[0]
+        self._window.append(hit)
+        self._window_hits += hit
+
+        return hit
+
+    @property
+    def rate(self):
+        """累计违约率"""
+        return self.violations / self.n if self.n else 0.0
+
+    @property
+    def rolling_rate(self):
+        """最近 window 步的违约率"""
+        return self._window_hits / len(self._window) if self._window else 0.0
+
+    def kupiec(self):
+        """当前的 Kupiec POF 统计量与 p 值，同 kupiec_pof；还没有观测时为 (0.0, 1.0)"""
+        if self.n == 0:
+            return 0.0, 1.0
+
+        lr, p = kupiec_pof(self.violations, self.n, self.quantile)
+
+        return float(lr), float(p)
+
+    def christoffersen(self):
+        """当前的 Christoffersen 独立性统计量与 p 值，同 christoffersen"""
+        (n00, n01), (n10, n11) = self.transitions
+        lr = _independence_lr(n01, n00 + n01, n11, n10 + n11)
+
+        return float(lr), float(chi2.sf(lr, 1))
+
+    @property
+    def unrecoverable(self):
+        """剩余步数中最有利的违约次数也无法让最终的 Kupiec 检验通过"""
+        if self._critical is None or self.horizon is None:
+            return False
+
+        remaining = max(self.horizon - self.n, 0)
+        # 最终统计量是违约次数的凸函数，在 quantile * horizon 处最小，最有利的次数为其在可达范围内的取整
+        target = self.quantile * self.horizon
+        best = [
+            min(max(x, self.violations), self.violations + remaining) for x in (np.floor(target), np.ceil(target))
+        ]
+        lr, _ = kupiec_pof(best, self.horizon, self.quantile)
+
+        return bool(np.min(lr) > self._critical)
+
+    def summary(self):
+        """当前的全部统计量
+
+        Returns:
+            dict: n、violations、rate、rolling_rate、kupiec、kupiec_pvalue、ind、ind_pvalue、clusters、max_run
+        """
+        pof, pof_p = self.kupiec()
+        ind, ind_p = self.christoffersen()
+
+        return {
+            "n": self.n,
+            "violations": self.violations,
+            "rate": self.rate,
+            "rolling_rate": self.rolling_rate,
+            "kupiec": pof,
+            "kupiec_pvalue": pof_p,
+            "ind": ind,
+            "ind_pvalue": ind_p,
+            "clusters": self.clusters,
+            "max_run": self.max_run,
+        }
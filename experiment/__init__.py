@@ -0,0 +1,6 @@
+# 对比实验运行器：市场 × 分位数 × 模型 的阶段依赖图，共用的预处理阶段只执行一次
+# 数据与模型模块（market、dataloader、QWLSTMModel 等）来自 common
+from .dag import DAG
+from .runner import build_dag, run
+
+__all__ = ["DAG", "build_dag", "run"]
@@ -0,0 +1,4 @@
+# python -m experiment --market sp500 shangzheng --models qlstm lstm qrf --quantiles 0.025 0.05 0.1
+from .runner import main
+
+main()
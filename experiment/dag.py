@@ -0,0 +1,84 @@
+# 阶段依赖图：同一个键的阶段只登记、执行一次，依赖都完成的阶段并行执行
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import time
+
+
+class DAG:
+
+    def __init__(self):
+        """由阶段组成的有向无环图
+
+        每个阶段以一个可哈希的键标识，如 ("split", "sp500")。重复登记同一个键时直接复用已有的阶段，
+        因此多个模型、分位数共用的预处理阶段只执行一次。
+        """
+        self.stages = {}  # key -> (fn, deps, kwargs)
+
+    def add(self, key, fn, deps=(), **kwargs):
+        """登记阶段，执行时调用 fn(*依赖阶段的结果, **kwargs)
+
+        Args:
+            key (hashable): 阶段的键
+            fn (callable): 阶段函数，并行执行时必须是模块级函数
+            deps (tuple, optional): 依赖阶段的键. Defaults to ().
+            **kwargs: 传给 fn 的参数
+
+        Returns:
+            hashable: key，便于作为后续阶段的依赖
+        """
+        if key in self.stages:
+            return key
+
+        for dep in deps:
+            if dep not in self.stages:
+                raise KeyError(f"Unknown dependency {dep!r} of stage {key!r}")
+        self.stages[key] = (fn, tuple(deps), kwargs)
+
+        return key
+
+    def run(self, n_workers: int = 1, executor: str = "process", verbose: bool = True):
+        """按依赖顺序执行所有阶段
+
+        Args:
+            n_workers (int, optional): 并行数，1 时在当前进程中依次执行. Defaults to 1.
+            executor (str, optional): "process" 或 "thread". Defaults to "process".
+            verbose (bool, optional): 是否打印每个阶段的耗时. Defaults to True.
+
+        Returns:
+            dict: {键: 结果}
+        """
+        if executor not in ("process", "thread"):
+            raise ValueError("Invalid executor, must be process or thread")
+
+        results = {}
+        pending = dict(self.stages)
+
+        def ready():
+            return [key for key, (_, deps, _) in pending.items() if all(dep in results for dep in deps)]
+
+        if n_workers == 1:
+            while pending:
+                for key in ready():
+                    fn, deps, kwargs = pending.pop(key)
+                    start = time.perf_counter()
+                    results[key] = fn(*(results[dep] for dep in deps), **kwargs)
+                    if verbose:
+                        print(f"{key} finished in {time.perf_counter() - start:.2f}s")
+            return results
+
+        pool = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool(max_workers=n_workers) as ex:
+            running = {}  # future -> (key, start)
+            while pending or running:
+                for key in ready():
+                    fn, deps, kwargs = pending.pop(key)
+                    future = ex.submit(fn, *(results[dep] for dep in deps), **kwargs)
+                    running[future] = (key, time.perf_counter())
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, start = running.pop(future)
+                    results[key] = future.result()
+                    if verbose:
+                        print(f"{key} finished in {time.perf_counter() - start:.2f}s")
+
+        return results
@@ -0,0 +1,131 @@
+# 构建并执行实验的阶段依赖图，汇总各市场、模型、分位数的测试集结果
+import argparse
+import json
+import os
+from . import stages
+from .dag import DAG
+
+
+def build_dag(
+    markets,
+    models=stages.MODELS,
+    quantiles=(0.025, 0.05, 0.1),
+    params: dict = None,
+    online_garch: dict = None,
+    step: int = 30,
+    seed: int = 0,
+):
+    """构建阶段依赖图
+
+    每个市场的 load → garch → scale → window → split 与随机森林只登记一次，
+    各模型与分位数的 model → evaluate 叶子共用它们。
+
+    Args:
+        markets (list): 数据集名称
+        models (tuple, optional): 模型，"qlstm"、"lstm"、"qrf". Defaults to stages.MODELS.
+        quantiles (tuple, optional): 分位数. Defaults to (0.025, 0.05, 0.1).
+        params (dict, optional): 覆盖默认超参数，{"forest" | 模型名: {参数: 值}}. Defaults to None.
+        online_garch (dict, optional): 在线 GARCH 参数，见 market.fit_volatility. Defaults to None.
+        step (int, optional): 窗口长度. Defaults to 30.
+        seed (int, optional): 随机种子. Defaults to 0.
+
+    Returns:
+        DAG: 阶段依赖图，评估阶段的键为 ("evaluate", market, model, quantile)
+    """
+    params = {name: {**value, **(params or {}).get(name, {})} for name, value in stages.DEFAULT_PARAMS.items()}
+
+    dag = DAG()
+    for market in markets:
+        raw = dag.add(("load", market), stages.load, market=market)
+        volatility = dag.add(("garch", market), stages.garch, (raw,), online_garch=online_garch)
+        scaled = dag.add(("scale", market), stages.scale, (raw, volatility))
+        windows = dag.add(("window", market), stages.window, (scaled,), step=step)
+        splits = dag.add(("split", market), stages.split, (windows,))
+
+        for kind in models:
+            deps = (splits,)
+            if kind != "lstm":  # lstm 只用普通分位数损失，不需要随机森林
+                deps += (dag.add(("forest", market), stages.forest, (splits,), params=params["forest"], seed=seed),)
+
+            for quantile in quantiles:
+                pred = dag.add(
+                    ("model", market, kind, quantile),
+                    stages.model,
+                    deps,
+                    kind=kind,
+                    quantile=quantile,
+                    params=params[kind],
+                    seed=seed,
+                )
+                dag.add(("evaluate", market, kind, quantile), stages.evaluate, (splits, pred), quantile=quantile)
+
+    return dag
+
+
+def run(
+    markets,
+    models=stages.MODELS,
+    quantiles=(0.025, 0.05, 0.1),
+    params: dict = None,
+    online_garch: dict = None,
+    n_workers: int = None,
+    executor: str = "process",
+    seed: int = 0,
+):
+    """执行对比实验
+
+    Args:
+        markets (list): 数据集名称
+        models (tuple, optional): 模型. Defaults to stages.MODELS.
+        quantiles (tuple, optional): 分位数. Defaults to (0.025, 0.05, 0.1).
+        params (dict, optional): 覆盖默认超参数. Defaults to None.
+        online_garch (dict, optional): 在线 GARCH 参数. Defaults to None.
+        n_workers (int, optional): 并行数. Defaults to os.cpu_count().
+        executor (str, optional): "process" 或 "thread". Defaults to "process".
+        seed (int, optional): 随机种子. Defaults to 0.
+
+    Returns:
+        dict: {(market, model, quantile): 评估结果}
+    """
+    dag = build_dag(markets, models, quantiles, params=params, online_garch=online_garch, seed=seed)
+    results = dag.run(n_workers=n_workers or os.cpu_count(), executor=executor)
+
+    return {key[1:]: value for key, value in results.items() if key[0] == "evaluate"}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="QLSTM / LSTM / QRF VaR comparison")
+    parser.add_argument("--market", nargs="+", default=["sp500"], choices=["sp500", "shangzheng"])
+    parser.add_argument("--models", nargs="+", default=list(stages.MODELS), choices=stages.MODELS)
+    parser.add_argument("--quantiles", nargs="+", type=float, default=[0.025, 0.05, 0.1])
+    parser.add_argument("--params", help="JSON file overriding default hyperparameters")
+    parser.add_argument("--online-garch", type=int, default=None, help="initial sample size of the online GARCH")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--executor", default="process", choices=["process", "thread"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    params = None
+    if args.params:
+        with open(args.params, "r") as f:
+            params = json.load(f)
+
+    online_garch = None if args.online_garch is None else {"initial": args.online_garch}
+    results = run(
+        args.market,
+        args.models,
+        args.quantiles,
+        params=params,
+        online_garch=online_garch,
+        n_workers=args.workers,
+        executor=args.executor,
+        seed=args.seed,
+    )
+
+    print(f"{'market':<12} {'model':<6} {'quantile':>8} {'violations':>10} {'rate':>8} {'loss':>8} {'kupiec p':>9}")
+    for (market, kind, quantile), res in sorted(results.items()):
+        print(
+            f"{market:<12} {kind:<6} {quantile:>8} {res['violations']:>10} {res['rate']:>8.4f} {res['loss']:>8.4f} "
+            f"{res['kupiec_pvalue']:>9.4f}"
+        )
@@ -0,0 +1,159 @@
+# 实验的各个阶段：load → GARCH → scale → window → split → RF → model → evaluate
+# 阶段之间只通过返回值传递数据，均为模块级函数，可以交给进程池执行
+import numpy as np
+
+# 默认超参数，取自 LSTM/best_params0.05.txt 与 QLSTM 的调优日志
+DEFAULT_PARAMS = {
+    "forest": {"n_estimators": 101, "min_samples_split": 5, "min_samples_leaf": 2, "max_depth": 8},
+    "lstm": {
+        "hidden_size": 4,
+        "num_layers": 2,
+        "dropout": 0.36,
+        "lr": 0.03,
+        "batch_size": 109,
+        "n_iter": 1095,
+        "tol": 6.9e-05,
+        "tau": 1.0,
+    },
+    "qlstm": {
+        "hidden_size": 4,
+        "num_layers": 2,
+        "dropout": 0.36,
+        "lr": 0.03,
+        "batch_size": 109,
+        "n_iter": 1095,
+        "tol": 6.9e-05,
+        "tau": 0.49,
+    },
+    "qrf": {},
+}
+MODELS = ("qlstm", "lstm", "qrf")
+
+
+def load(market: str):
+    """读取原始数据与对数收益率，见 market.read_market"""
+    from common.market import read_market
+
+    return read_market(market)
+
+
+def garch(raw: dict, online_garch: dict = None):
+    """GARCH 条件波动率，见 market.fit_volatility"""
+    from common.market import fit_volatility
+
+    return fit_volatility(raw["Y"], online_garch=online_garch)
+
+
+def scale(raw: dict, volatility):
+    """加入波动率并归一化，见 market.scale_features"""
+    from common.market import scale_features
+
+    return scale_features(raw["X"], raw["Y"], volatility)
+
+
+def window(scaled: dict, step: int = 30):
+    """滑动窗口样本"""
+    from common.dataloader import sliding_window
+
+    return sliding_window(scaled["X"], scaled["Y"], step)
+
+
+def split(windows: tuple):
+    """7:2:1 拆分为训练集、测试集、验证集，转为连续的 float32 数组"""
+    from common.dataloader import split_dataset
+
+    splits = split_dataset(*windows)
+
+    return {name: np.ascontiguousarray(arr, dtype=np.float32) for name, arr in splits.items()}
+
+
+def forest(splits: dict, params: dict, seed: int = 0):
+    """在展平的训练集上拟合分位数回归森林，qlstm 的样本权重与 qrf 的预测共用这一次拟合"""
+    from quantile_forest import RandomForestQuantileRegressor
+
+    rf = RandomForestQuantileRegressor(random_state=seed, **params)
+    rf.fit(splits["X_train"].reshape(len(splits["X_train"]), -1), splits["Y_train"])
+
+    return rf
+
+
+def model(splits: dict, rf=None, kind: str = "qlstm", quantile: float = 0.05, params: dict = None, seed: int = 0):
+    """训练一个模型并在测试集上预测分位数
+
+    Args:
+        splits (dict): split 阶段的结果
+        rf (RandomForestQuantileRegressor, optional): forest 阶段的结果，lstm 不需要. Defaults to None.
+        kind (str, optional): "qlstm"、"lstm" 或 "qrf". Defaults to "qlstm".
+        quantile (float, optional): 分位数. Defaults to 0.05.
+        params (dict, optional): 模型超参数. Defaults to DEFAULT_PARAMS[kind].
+        seed (int, optional): 随机种子. Defaults to 0.
+
+    Returns:
+        np.ndarray: 测试集上的预测值，shape (n_test,)
+    """
+    import torch
+    from common.QWLSTMModel import QWLSTMModel
+
+    if kind not in MODELS:
+        raise ValueError(f"Invalid model {kind!r}, must be one of {MODELS}")
+
+    params = DEFAULT_PARAMS[kind] if params is None else params
+    X_test = splits["X_test"]
+
+    if kind == "qrf":
+        return np.ravel(rf.predict(X_test.reshape(len(X_test), -1), quantiles=[quantile]))
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    torch.set_num_threads(1)  # 叶子阶段并行执行，每个进程一个线程
+
+    X_train = torch.from_numpy(splits["X_train"])
+    leaf = None
+    if kind == "qlstm":
+        leaf = rf.apply(splits["X_train"].reshape(len(X_train), -1))
+
+    qwlstm_model = QWLSTMModel(
+        hs=params["hidden_size"],
+        quantile=quantile,
+        dropout=params["dropout"],
+        num_layers=params["num_layers"],
+        device="cpu",
+    )
+    qwlstm_model.fit(
+        X_train,
+        torch.from_numpy(splits["Y_train"]),
+        leaf=leaf if params["tau"] < 1 else None,
+        tau=params["tau"] if params["tau"] < 1 else None,
+        batch_size=params["batch_size"],
+        n_iter=params["n_iter"],
+        lr=params["lr"],
+        tol=params["tol"],
+        verbose=False,
+    )
+
+    return qwlstm_model.predict(torch.from_numpy(X_test))
+
+
+def evaluate(splits: dict, y_pred, quantile: float):
+    """测试集上的违约次数、违约率、目标损失 |违约率 - 分位数| 与 Kupiec 检验
+
+    测试集由随机拆分得到，不是时间顺序，因此不做 Christoffersen 与 DQ 这类依赖顺序的检验。
+
+    Returns:
+        dict: violations、n、rate、loss、kupiec（统计量）、kupiec_pvalue
+    """
+    from common.var_backtest import kupiec_pof
+
+    y_true = splits["Y_test"]
+    violations = int(np.sum(y_true < y_pred))
+    rate = violations / len(y_true)
+    statistic, p_value = kupiec_pof(violations, len(y_true), quantile)
+
+    return {
+        "violations": violations,
+        "n": len(y_true),
+        "rate": rate,
+        "loss": abs(rate - quantile),
+        "kupiec": float(statistic),
+        "kupiec_pvalue": float(p_value),
+    }